@@ -1,2 +1,3 @@
 from .launcher import Launcher
 from .mass_launcher import MassLauncher
+from .streaming import StreamingMassLauncher
@@ -0,0 +1,130 @@
+from .base import BaseUtility
+from .output_parser import is_completed
+import asyncio
+import logging
+
+
+# Tools used to drive many calculations from a single asyncio event loop.
+
+
+class CoreBudget:
+    """Asynchronous counterpart of a semaphore where each job acquires as
+    many units (cores) as it uses.
+    """
+
+    def __init__(self, ncores):
+        self.ncores = int(ncores)
+        self.free = self.ncores
+        self._condition = asyncio.Condition()
+
+    async def acquire(self, ncores):
+        ncores = min(ncores, self.ncores)
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.free >= ncores)
+            self.free -= ncores
+        return ncores
+
+    async def release(self, ncores):
+        async with self._condition:
+            self.free += ncores
+            self._condition.notify_all()
+
+
+class JobWatcher(BaseUtility):
+    """Class that waits for submitted jobs without blocking the event loop.
+    All the watched jobs are polled together with a single scheduler status
+    command per interval, no matter how many jobs are watched.
+    """
+    _loggername = "JobWatcher"
+
+    def __init__(self, scheduler, poll_interval=30, max_failures=3,
+                 max_unknown=3, loglevel=logging.INFO):
+        """
+        Parameters
+        ----------
+        scheduler : Scheduler
+                    The scheduler to which the jobs were submitted.
+        poll_interval : float, optional
+                        Time (in seconds) between two status queries.
+        max_failures : int, optional
+                       Number of consecutive failed status queries (retried
+                       with a doubling interval) after which the error is
+                       raised by all the pending 'wait' calls.
+        max_unknown : int, optional
+                      Number of consecutive polls after which a job whose
+                      state is unknown to the scheduler (e.g.: purged) is
+                      considered finished.
+        """
+        super().__init__(loglevel=loglevel)
+        self.scheduler = scheduler
+        self.poll_interval = poll_interval
+        self.max_failures = max_failures
+        self.max_unknown = max_unknown
+        self._waiters = {}
+        # job id: number of consecutive polls in the UNKNOWN state
+        self._unknown = {}
+        self._poller = None
+
+    async def wait(self, job_id, output_path=None):
+        """Wait for a job to finish. If 'output_path' is given, the job is
+        also considered finished as soon as this abinit output file is
+        complete.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(job_id, []).append((future, output_path))
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.ensure_future(self._poll())
+        await future
+
+    async def _poll(self):
+        try:
+            await self._poll_states()
+        except Exception as e:
+            # the waiters would otherwise never be woken up
+            self._logger.error(f"Could not get the state of the jobs: {e}")
+            for waiters in self._waiters.values():
+                for future, path in waiters:
+                    if not future.done():
+                        future.set_exception(e)
+            self._waiters.clear()
+
+    async def _poll_states(self):
+        failures = 0
+        while self._waiters:
+            await asyncio.sleep(self.poll_interval * 2 ** failures)
+            try:
+                states = await self.scheduler.astatus(list(self._waiters))
+            except (RuntimeError, OSError) as e:
+                failures += 1
+                if failures >= self.max_failures:
+                    raise
+                self._logger.warning(f"Status query failed, retrying: {e}")
+                continue
+            failures = 0
+            for job_id, state in states.items():
+                waiters = self._waiters[job_id]
+                done = state == self.scheduler.DONE
+                if not done:
+                    done = any(path is not None and is_completed(path)
+                               for future, path in waiters)
+                if not done:
+                    done = self._is_lost(job_id, state)
+                if not done:
+                    continue
+                self._logger.debug(f"Job {job_id} is finished.")
+                self._unknown.pop(job_id, None)
+                for future, path in self._waiters.pop(job_id):
+                    if not future.done():
+                        future.set_result(state)
+
+    def _is_lost(self, job_id, state):
+        # a job which stays unknown to the scheduler is not coming back
+        if state != self.scheduler.UNKNOWN:
+            self._unknown.pop(job_id, None)
+            return False
+        self._unknown[job_id] = self._unknown.get(job_id, 0) + 1
+        if self._unknown[job_id] < self.max_unknown:
+            return False
+        self._logger.warning(f"Job {job_id} is unknown to the scheduler:"
+                             " considered finished.")
+        return True
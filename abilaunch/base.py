@@ -12,6 +12,5 @@ class BaseUtility:
         self._logger.setLevel(loglevel)
 
 
-
 class DevError(Exception):
     pass
@@ -13,10 +13,44 @@ class ConfigFileParser:
         self.abinit_path = self._config[D]["abinit_path"]
         dpd = "default_pseudos_dir"
         self.default_pseudos_dir = os.path.abspath(self._config[D][dpd])
+        self.pseudos_dirs = self._get_pseudos_dirs(self._config[D][dpd])
+        # optional file where the pseudos index is persisted
+        self.pseudos_index = self._get_optional_path("pseudos_index")
         self.qsub = self._get_qsub(self._config)
+        # batch scheduler used for job arrays ('pbs' or 'slurm')
+        self.scheduler = self._config[D].get("scheduler", "pbs").lower()
+
+    def _get_optional_path(self, key):
+        path = self._config["DEFAULT"].get(key, "none")
+        if path.lower() == "none":
+            return None
+        return os.path.abspath(os.path.expanduser(path))
+
+    def _get_pseudos_dirs(self, string):
+        # many pseudos libraries can be given, separated like in $PATH
+        dirs = []
+        for path in string.split(os.pathsep):
+            path = path.strip()
+            if not path or path.lower() == "none":
+                continue
+            dirs.append(os.path.abspath(os.path.expanduser(path)))
+        return dirs
 
     def _get_qsub(self, config):
         string = self._config["DEFAULT"]["qsub"]
         if string.lower() == "true":
             return True
         return False
+
+
+_USER_CONFIG = None
+
+
+def get_user_config():
+    """Return the user configuration. The config file is only read on the
+    first call.
+    """
+    global _USER_CONFIG
+    if _USER_CONFIG is None:
+        _USER_CONFIG = ConfigFileParser()
+    return _USER_CONFIG
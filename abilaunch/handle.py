@@ -0,0 +1,40 @@
+import os
+
+
+class CalculationHandle:
+    """Lightweight reference to a calculation whose files are already
+    written. It only keeps what is needed to find the calculation back and
+    follow it: its working directory, name, variables hash (same as in the
+    Registry), job id and status (one of the Registry statuses).
+    """
+    __slots__ = ("workdir", "name", "vars_hash", "job_id", "status")
+
+    def __init__(self, workdir, name, vars_hash=None, job_id=None,
+                 status=None):
+        self.workdir = workdir
+        self.name = name
+        self.vars_hash = vars_hash
+        self.job_id = job_id
+        self.status = status
+
+    def __repr__(self):
+        return (f"CalculationHandle({self.workdir!r}, job_id={self.job_id!r},"
+                f" status={self.status!r})")
+
+    @property
+    def output_path(self):
+        """The absolute path of the abinit output file."""
+        # same as abipy's: in the real working directory
+        return os.path.join(os.path.realpath(self.workdir),
+                            self.name + ".out")
+
+    @property
+    def jobfile_path(self):
+        """The absolute path of the jobfile executing the calculation."""
+        return os.path.join(os.path.realpath(self.workdir), "run",
+                            self.name + ".sh")
+
+    @property
+    def log_path(self):
+        """The absolute path of the abinit log file."""
+        return os.path.join(self.workdir, self.name + ".log")
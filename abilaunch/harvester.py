@@ -0,0 +1,221 @@
+from .base import BaseUtility
+from .output_parser import COMPLETED_TAG
+import concurrent.futures
+import logging
+import math
+import numpy as np
+import os
+import re
+
+
+# suffixes of the abinit output files found when scanning directories
+OUTPUT_SUFFIXES = (".out", ".abo")
+# below this number of files to parse, no process pool is started
+MIN_PARALLEL = 16
+# columns of the harvested table: name: (dtype, value when not found)
+COLUMNS = {"mtime": (np.int64, 0),
+           "size": (np.int64, 0),
+           "completed": (np.bool_, False),
+           "converged": (np.bool_, False),
+           "scf_steps": (np.int32, 0),
+           "etotal": (np.float64, math.nan),
+           "max_force": (np.float64, math.nan),
+           "stress": ((np.float64, 6), math.nan),
+           "cpu_time": (np.float64, math.nan),
+           "walltime": (np.float64, math.nan)}
+# variables echoed after the computation which are harvested
+_OUTVARS = {"etotal", "fcart", "strten"}
+_OUTVARS_START = "-outvars: echo values of variables after computation"
+_OUTVAR = re.compile(r"^([a-z]+)\d*$")
+_TIMES = re.compile(r"Overall time at end \(sec\) : cpu=\s*([0-9.Ee+-]+)\s+"
+                    r"wall=\s*([0-9.Ee+-]+)")
+
+
+class Harvester(BaseUtility):
+    """Class that extracts the energies, forces, stresses, timings and
+    convergence of many abinit output files into a single columnar table
+    saved as a numpy '.npz' file. The 'path' column indexes the rows.
+    Files are parsed concurrently, line by line, and only the files whose
+    size or mtime changed since the last harvest are parsed again.
+    """
+    _loggername = "Harvester"
+
+    def __init__(self, path, workers=None, loglevel=logging.INFO):
+        """
+        Parameters
+        ----------
+        path : str
+               Path of the table ('.npz' file).
+        workers : int, optional
+                  Number of processes parsing the files. By default, the
+                  number of CPUs.
+        """
+        super().__init__(loglevel=loglevel)
+        path = os.path.abspath(os.path.expanduser(path))
+        if not path.endswith(".npz"):
+            path += ".npz"
+        self.path = path
+        self.workers = workers if workers is not None else os.cpu_count()
+        # number of files parsed by the last harvest
+        self.parsed = 0
+
+    def load(self):
+        """Return the table of the last harvest (dict of arrays) or None."""
+        if not os.path.isfile(self.path):
+            return None
+        with np.load(self.path) as table:
+            return {name: table[name] for name in table.files}
+
+    def harvest(self, sources):
+        """Harvest output files and save the table. Returns the table.
+
+        Parameters
+        ----------
+        sources : list, str
+                  Output files or directories scanned (recursively) for
+                  output files.
+        """
+        paths = _find_outputs(sources)
+        previous = self.load()
+        known = {}
+        if previous is not None:
+            known = {path: i for i, path in enumerate(previous["path"])}
+        stats = [os.stat(path) for path in paths]
+        rows = [None] * len(paths)
+        to_parse = []
+        for i, (path, stat) in enumerate(zip(paths, stats)):
+            j = known.get(path, None)
+            if j is not None and (previous["mtime"][j],
+                                  previous["size"][j]) == (stat.st_mtime_ns,
+                                                           stat.st_size):
+                rows[i] = {name: previous[name][j] for name in COLUMNS}
+            else:
+                to_parse.append(i)
+        for i, row in zip(to_parse,
+                          self._parse([paths[i] for i in to_parse])):
+            row.update(mtime=stats[i].st_mtime_ns, size=stats[i].st_size)
+            rows[i] = row
+        self.parsed = len(to_parse)
+        table = _to_table(paths, rows)
+        self._save(table)
+        self._logger.info(f"{len(paths)} outputs harvested ({self.parsed}"
+                          f" parsed) in {self.path}.")
+        return table
+
+    def _parse(self, paths):
+        if self.workers <= 1 or len(paths) < MIN_PARALLEL:
+            return [parse_output(path) for path in paths]
+        chunksize = max(len(paths) // (4 * self.workers), 1)
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.workers) as pool:
+            return list(pool.map(parse_output, paths, chunksize=chunksize))
+
+    def _save(self, table):
+        # written next to the table then renamed such that a reader never
+        # sees a partial file
+        dirname = os.path.dirname(self.path)
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        partial = self.path + ".partial"
+        with open(partial, "wb") as f:
+            np.savez(f, **table)
+        os.replace(partial, self.path)
+
+
+def parse_output(path):
+    """Parse an abinit output file line by line. Returns the dict of the
+    harvested values (see COLUMNS). For multi dataset outputs, the values
+    of the last dataset are returned.
+    """
+    row = {name: default for name, (_, default) in COLUMNS.items()}
+    outvars = {}
+    current = None
+    in_outvars = False
+    with open(path, "r", errors="ignore") as f:
+        for line in f:
+            if in_outvars:
+                current = _parse_outvar(line, current, outvars)
+                if line.startswith("="):
+                    in_outvars = False
+            elif _OUTVARS_START in line:
+                in_outvars = True
+            elif line.startswith(" ETOT"):
+                row["scf_steps"] += 1
+            elif line.startswith("== DATASET"):
+                row["scf_steps"] = 0
+            elif line.startswith(" At SCF step") and "converged" in line:
+                row["converged"] = True
+            elif "SCF cycles to converge" in line:
+                row["converged"] = False
+            elif "Overall time at end" in line:
+                match = _TIMES.search(line)
+                if match:
+                    row["cpu_time"] = float(match.group(1))
+                    row["walltime"] = float(match.group(2))
+            elif COMPLETED_TAG in line:
+                row["completed"] = True
+    if "etotal" in outvars:
+        row["etotal"] = outvars["etotal"][0]
+    if "fcart" in outvars:
+        forces = outvars["fcart"]
+        row["max_force"] = max(math.sqrt(sum(x ** 2 for x in
+                                             forces[i:i + 3]))
+                               for i in range(0, len(forces), 3))
+    if len(outvars.get("strten", ())) == 6:
+        row["stress"] = outvars["strten"]
+    return row
+
+
+def _parse_outvar(line, current, outvars):
+    # parse a line of the variables echoed after the computation. Returns
+    # the variable whose values continue on the next line.
+    tokens = line.split()
+    if not tokens:
+        return None
+    match = _OUTVAR.match(tokens[0])
+    if match:
+        name = match.group(1)
+        if name not in _OUTVARS:
+            return None
+        # values of a later dataset replace the previous ones
+        outvars[name] = []
+        current = name
+        tokens = tokens[1:]
+    if current is None:
+        return None
+    try:
+        outvars[current] += [float(token.replace("D", "E"))
+                             for token in tokens]
+    except ValueError:
+        return None
+    return current
+
+
+def _find_outputs(sources):
+    # sorted absolute paths of the output files
+    if isinstance(sources, str):
+        sources = (sources, )
+    paths = set()
+    for source in sources:
+        source = os.path.abspath(os.path.expanduser(source))
+        if os.path.isfile(source):
+            paths.add(source)
+            continue
+        for dirpath, _, filenames in os.walk(source):
+            paths.update(os.path.join(dirpath, name) for name in filenames
+                         if name.endswith(OUTPUT_SUFFIXES))
+    return sorted(paths)
+
+
+def _to_table(paths, rows):
+    table = {"path": np.array(paths, dtype=str)}
+    for name, (dtype, _) in COLUMNS.items():
+        if isinstance(dtype, tuple):
+            dtype, width = dtype
+            column = np.empty((len(rows), width), dtype=dtype)
+        else:
+            column = np.empty(len(rows), dtype=dtype)
+        for i, row in enumerate(rows):
+            column[i] = row[name]
+        table[name] = column
+    return table
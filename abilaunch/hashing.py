@@ -0,0 +1,81 @@
+import hashlib
+import json
+import os
+
+
+# Stable hashes of calculations: the same variables, pseudos and linked
+# files always give the same hash, whatever the order of the variables or
+# the container types used (tuple, list, numpy array...).
+
+
+def canonical_variables(abinit_variables):
+    """Return a JSON string uniquely representing a dict of abinit
+    variables.
+    """
+    return json.dumps(_canonical(abinit_variables), sort_keys=True,
+                      separators=(",", ":"))
+
+
+def variables_hash(abinit_variables):
+    """Return the sha256 hex digest of a dict of abinit variables."""
+    return _sha256(canonical_variables(abinit_variables))
+
+
+# (path, size, mtime) -> hash such that each file is read only once
+_FILES_HASHES = {}
+
+
+def file_hash(path, blocksize=2 ** 20):
+    """Return the sha256 hex digest of a file's content. The result is
+    memoized as long as the file's size and mtime are the same.
+    """
+    path = os.path.realpath(path)
+    stat = os.stat(path)
+    key = (path, stat.st_size, stat.st_mtime_ns)
+    if key not in _FILES_HASHES:
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(blocksize), b""):
+                sha.update(block)
+        _FILES_HASHES[key] = sha.hexdigest()
+    return _FILES_HASHES[key]
+
+
+def calculation_hash(abinit_variables, pseudos=(), to_link=(),
+                     input_file=None):
+    """Return a hash identifying a calculation from its variables and the
+    content of its pseudos and linked files. If 'input_file' is given, its
+    whole content is part of the hash as well (e.g.: an existing input file
+    whose other datasets are not in the variables).
+    """
+    if isinstance(pseudos, str):
+        pseudos = (pseudos, )
+    if isinstance(to_link, str):
+        to_link = (to_link, )
+    content = {"variables": _canonical(abinit_variables),
+               "pseudos": [file_hash(p) for p in pseudos],
+               # the data type of a linked file is given by its suffix
+               "to_link": sorted((os.path.basename(p).split("_")[-1],
+                                  file_hash(p)) for p in to_link or ())}
+    if input_file is not None:
+        content["input_file"] = file_hash(input_file)
+    return _sha256(json.dumps(content, sort_keys=True))
+
+
+def _sha256(string):
+    return hashlib.sha256(string.encode()).hexdigest()
+
+
+def _canonical(value):
+    # convert a value to json-compatible types
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in value.items()}
+    if hasattr(value, "tolist"):
+        # numpy arrays and scalars
+        return _canonical(value.tolist())
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    if isinstance(value, float) and value.is_integer():
+        # 10 and 10.0 are the same for abinit
+        return int(value)
+    return value
@@ -1,4 +1,5 @@
 from .base import BaseUtility
+from itertools import chain
 import logging
 
 
@@ -7,6 +8,12 @@ import logging
 # is more passive as it does not call abinit.
 
 
+MANDATORY = ("ecut", "ntypat", "znucl", "typat", "acell")
+TOLERANCES = ("toldfe", "tolwfr", "toldff", "tolrff")
+PARAL_VARIABLES = ("nphf", "npkpt", "npspinor", "npband", "npfft")
+NSCF_ERROR = "for iscf < 0 and != -3, tolwfr  must be > 0."
+
+
 class InputApprover(BaseUtility):
     """Class that checks if a set of input variable is
      valid for an abinit calculation. The 'valid' attribute states
@@ -50,8 +57,7 @@ class InputApprover(BaseUtility):
             # check that tolwfr > 0
             tolwfr = abinit_variables.get("tolwfr", 0.0)
             if tolwfr <= 0.0:
-                self.errors.append("for iscf < 0 and != -3, tolwfr"
-                                   "  must be > 0.")
+                self.errors.append(NSCF_ERROR)
                 return False
         return True
 
@@ -66,16 +72,9 @@ class InputApprover(BaseUtility):
             # No parallelization
             return True
         if mpirun_np > ppn:
-            self.errors.append(f"npernode {mpirun_np} call uses"
-                               f" more proc than available"
-                               f" on the nodes ({ppn})!")
+            self.errors.append(_ppn_error(mpirun_np, ppn))
             return False
-        if isinstance(nodes, str):
-            if ":" in nodes:
-                # nodes = 3:m48G  for example
-                nodes = int(nodes.split(":")[0])
-            else:
-                nodes = int(nodes)
+        nodes = _nodes_to_int(nodes)
         total_ncpus = nodes * mpirun_np
         npfft = abinit_variables.get("npfft", 1)
         npband = abinit_variables.get("npband", 1)
@@ -89,25 +88,19 @@ class InputApprover(BaseUtility):
                           "npband": npband,
                           "npfft": npfft}.items():
             if int(var) > total_ncpus:
-                self.errors.append("%s is greater than the total"
-                                   " number of cpus!" % name)
+                self.errors.append(_ncpus_error(name))
                 return False
         return True
 
     def _check_basics(self, abivars):
-        mandatory = ("ecut", "ntypat", "znucl", "typat", "acell")
         keys = list(abivars.keys())
-        check1, missings = self._all_in(mandatory, keys)
-        tolerances = ("toldfe", "tolwfr", "toldff", "tolrff")
-        check2, presents = self._only_one_in(tolerances, keys)
+        check1, missings = self._all_in(MANDATORY, keys)
+        check2, presents = self._only_one_in(TOLERANCES, keys)
         if not check1:
-            self.errors.append("%s should be in the input file!" %
-                               str(missings))
+            self.errors.append(_missings_error(missings))
             return False
         if not check2:
-            self.errors.append("%s are presents in the input file but there"
-                               " should be only one from %s." %
-                               (str(presents), str(tolerances)))
+            self.errors.append(_tolerances_error(presents))
             return False
         # everything checks out
         return True
@@ -139,3 +132,157 @@ class InputApprover(BaseUtility):
                 result = False
                 missings.append(item)
         return result, missings
+
+
+class BatchInputApprover(BaseUtility):
+    """Class that checks the validity of a whole sweep of calculations at
+    once. The sweep is given as base variables common to all calculations
+    plus the specific variables of each one. The checks are the same as the
+    InputApprover ones but they are done in a single columnar pass over
+    the swept variables.
+
+    The 'valid' attribute is a boolean array (one item per calculation) and
+    the 'errors' attribute is a dict mapping the index of each invalid
+    calculation to its list of errors.
+    """
+    _loggername = "BatchInputApprover"
+
+    def __init__(self, base_variables, specific_variables, paral_params=None,
+                 loglevel=logging.INFO):
+        """
+        Parameters
+        ----------
+        base_variables : dict of the abinit variables common to all
+                         calculations.
+        specific_variables : list of dict of the variables specific to
+                             each calculation.
+        paral_params : dict, optional
+                       With the 'nodes', 'ppn' and 'mpirun_np' keys. Each
+                       value can be a single value for all calculations or
+                       a list (one item per calculation).
+        """
+        super().__init__(loglevel=loglevel)
+        if not isinstance(base_variables, dict):
+            raise TypeError("The abinit variables should be a dictionary.")
+        import numpy as np
+        self._np = np
+        self._length = len(specific_variables)
+        self._base = base_variables
+        self._columns = self._get_columns(specific_variables)
+        errors = {}
+        for i, error in chain(self._check_nscf_ok(), self._check_basics(),
+                              self._check_paral_params(paral_params)):
+            errors.setdefault(int(i), []).append(error)
+        # multidtset inputs are assumed valid as for the InputApprover
+        skip = self._column("ndtset", 1) > 1
+        self.errors = {i: errors[i] for i in sorted(errors) if not skip[i]}
+        self.valid = np.ones(self._length, dtype=bool)
+        self.valid[list(self.errors)] = False
+        if self.errors:
+            self._logger.debug(f"{len(self.errors)} invalid calculations"
+                               f" out of {self._length}.")
+
+    def _get_columns(self, specific_variables):
+        # gather the swept variables: name -> (indices, values)
+        columns = {}
+        for i, specifics in enumerate(specific_variables):
+            for name, value in specifics.items():
+                indices, values = columns.setdefault(name, ([], []))
+                indices.append(i)
+                values.append(value)
+        return columns
+
+    def _present(self, name):
+        # boolean array stating if a variable is defined in each calculation
+        np = self._np
+        present = np.full(self._length, name in self._base)
+        if name in self._columns:
+            present[self._columns[name][0]] = True
+        return present
+
+    def _column(self, name, default, dtype=float):
+        # array of the values of a scalar variable for each calculation
+        np = self._np
+        column = np.full(self._length, self._base.get(name, default),
+                         dtype=dtype)
+        if name in self._columns:
+            indices, values = self._columns[name]
+            column[indices] = values
+        return column
+
+    def _check_nscf_ok(self):
+        iscf = self._column("iscf", 0)
+        tolwfr = self._column("tolwfr", 0.0)
+        bad = (iscf < 0) & (iscf != -3) & (tolwfr <= 0.0)
+        for i in self._np.flatnonzero(bad):
+            yield i, NSCF_ERROR
+
+    def _check_basics(self):
+        np = self._np
+        missing = np.array([~self._present(name) for name in MANDATORY])
+        presents = np.array([self._present(name) for name in TOLERANCES])
+        bad_missing = missing.any(axis=0)
+        bad_tolerances = (presents.sum(axis=0) > 1) & ~bad_missing
+        for i in np.flatnonzero(bad_missing):
+            missings = [n for n, m in zip(MANDATORY, missing[:, i]) if m]
+            yield i, _missings_error(missings)
+        for i in np.flatnonzero(bad_tolerances):
+            tols = [n for n, p in zip(TOLERANCES, presents[:, i]) if p]
+            yield i, _tolerances_error(tols)
+
+    def _check_paral_params(self, paral_params):
+        if paral_params is None:
+            return
+        np = self._np
+        params = {}
+        for name in ("nodes", "ppn", "mpirun_np"):
+            value = paral_params.get(name, None)
+            if not isinstance(value, (list, tuple, np.ndarray)):
+                value = [value] * self._length
+            params[name] = value
+        # calculations without parallelization are not checked
+        # (nan for missing values such that comparisons are always False)
+        mpirun_np = np.array([np.nan if v is None else v
+                              for v in params["mpirun_np"]], dtype=float)
+        ppn = np.array([np.nan if v is None else v for v in params["ppn"]],
+                       dtype=float)
+        nodes = np.array([np.nan if v is None else _nodes_to_int(v)
+                          for v in params["nodes"]], dtype=float)
+        bad_ppn = mpirun_np > ppn
+        for i in np.flatnonzero(bad_ppn):
+            yield i, _ppn_error(params["mpirun_np"][i], params["ppn"][i])
+        total_ncpus = nodes * mpirun_np
+        checked = ~np.isnan(mpirun_np) & ~bad_ppn
+        for name in PARAL_VARIABLES:
+            bad = checked & (self._column(name, 1) > total_ncpus)
+            for i in np.flatnonzero(bad):
+                yield i, _ncpus_error(name)
+            # only the first error is reported as for the InputApprover
+            checked &= ~bad
+
+
+def _nodes_to_int(nodes):
+    if isinstance(nodes, str):
+        if ":" in nodes:
+            # nodes = 3:m48G  for example
+            return int(nodes.split(":")[0])
+        return int(nodes)
+    return nodes
+
+
+def _ppn_error(mpirun_np, ppn):
+    return (f"npernode {mpirun_np} call uses more proc than available"
+            f" on the nodes ({ppn})!")
+
+
+def _ncpus_error(name):
+    return "%s is greater than the total number of cpus!" % name
+
+
+def _missings_error(missings):
+    return "%s should be in the input file!" % str(missings)
+
+
+def _tolerances_error(presents):
+    return ("%s are presents in the input file but there should be only"
+            " one from %s." % (str(presents), str(TOLERANCES)))
@@ -0,0 +1,262 @@
+import string
+import sys
+
+
+# Renders abinit input files exactly as abipy's htc InputFile does, without
+# going through one InputVariable object per variable. Each variable is
+# formatted into its own line(s) and the lines are then gathered in blocks:
+#
+#   #== Basis set ==#
+#    ecut 10.0
+#
+# An InputRenderer keeps the lines of the variables common to a sweep such
+# that only the variables specific to each calculation are formatted.
+
+
+# blocks of variables, in the order they appear in the input file (same
+# as abipy). Variables not registered in any block go in the 'Other' one.
+BLOCKS = (
+    ("Datasets", "ndtset jdtset udtset"),
+    ("Basis set", "ecut ecutsm"),
+    ("Bands", "nband nbdbuf"),
+    ("k-point grid", "kptopt nkpt kpt ngkpt kptrlatt nshiftk shiftk "
+                     "kptbounds kptns"),
+    ("Models", "ixc ppmodel ppmfreq usepawu upawu jpawu"),
+    ("PAW options", "bxctmindg dmatpawu dmatpuopt dmatudiag iboxcut jpawu "
+                    "lpawu lexexch mqgriddg ngfftdg pawcpxocc pawcross "
+                    "pawecutdg pawfatbnd pawlcutd pawlmix pawmixdg "
+                    "pawnhatxc pawnphi pawntheta pawnzlm pawoptmix pawovlp "
+                    "pawprtden pawprtdos pawprtvol pawprtwf pawspnorb "
+                    "pawstgylm pawsushat pawusecp pawxcdev prtcs prtefg "
+                    "prtfc prtnabla ptcharge quadmom spnorbscl usedmatpu "
+                    "upawu useexexch usepawu usexcnhat"),
+    ("SCF procedure", "iscf nstep nline tolvrs tolwfr toldfe toldff tolimg "
+                      "tolmxf tolrff"),
+    ("KSS generation", "kssform nbandkss"),
+    ("GW procedure", "optdriver gwcalctyp spmeth nkptgw kptgw bdgw nqptdm "
+                     "qptdm"),
+    ("GW param", "ecuteps ecutsigx ecutwfn nomegasf nfreqim nfreqre "
+                 "freqremax npweps rhoqpmix"),
+    ("GW options", "userre awtr symchi gwpara symsigma gwmem fftgw"),
+    ("Structural optimization", "amu bmass delayperm diismemory dilatmx "
+                                "dtion dynimage ecutsm friction "
+                                "fxcartfactor getcell getxcart getxred "
+                                "goprecon goprecprm iatcon iatfix iatfixx "
+                                "iatfixy iatfixz imgmov ionmov istatimg "
+                                "mdtemp mdwall natfix natfixx natfixy "
+                                "natfixz natcon nconeq nimage nnos "
+                                "noseinert ntime ntimimage optcell pimass "
+                                "pitransform prtatlist qmass random_atpos "
+                                "restartxf signperm strfact strprecon "
+                                "strtarget tolimg tolmxf vel vis wtatcon"),
+    ("Response function", "bdeigrf elph2_imagden esmear frzfermi ieig2rf "
+                          "mkqmem mk1mem prepanl prepgkk prtbbb rfasr "
+                          "rfatpol rfddk rfdir rfelfd rfmeth rfphon rfstrs "
+                          "rfuser rf1atpol rf1dir rf1elfd rf1phon rf2atpol "
+                          "rf2dir rf2elfd rf2phon rf3atpol rf3dir rf3elfd "
+                          "rf3phon sciss smdelta td_maxene td_mexcit"),
+    ("Wannier 90", "w90iniprj w90prtunk"),
+    ("Parallelisation", "gwpara localrdwf ngroup_rf npband npfft npimage "
+                        "npkpt npspinor paral_kgb paral_rf use_gpu_cuda"),
+    ("Unit cell", "acell angdeg rprim ntypat znucl natom typat xred xcart"),
+    ("Printing", "prtvol enunit"),
+    ("Files", "irdddk irdden ird1den irdqps irdkss irdscr irdsuscep irdwfk "
+              "irdwfq ird1wf getcell getddk getden getgam_eig2nkq getkss "
+              "getocc getqps getscr getsuscep getvel getwfk getwfq "
+              "getxcart getxred get1den get1wf"),
+    ("Other", ""),
+)
+UNITS = ("bohr", "angstrom", "hartree", "Ha", "eV")
+_DATASET_INDICES = string.digits + ":+?"
+_SORTING = str.maketrans(_DATASET_INDICES, string.ascii_letters[:13])
+# basename: index of its block (the first one registering it)
+_BLOCK_INDEX = {}
+for _index, (_, _register) in enumerate(BLOCKS):
+    for _basename in _register.split():
+        _BLOCK_INDEX.setdefault(_basename, _index)
+_OTHER = len(BLOCKS) - 1
+
+
+class InputRenderer:
+    """Renders abinit input files. The lines of the base variables are
+    formatted once and reused for each calculation whose variables are the
+    same objects (e.g.: a copy of the base variables updated with specific
+    ones). Base variables must thus not be modified in place.
+    """
+
+    def __init__(self, base_variables=None):
+        """
+        Parameters
+        ----------
+        base_variables : dict, optional
+                         The variables common to all the calculations.
+        """
+        self._base = {}
+        for name, value in (base_variables or {}).items():
+            self._base[name] = (value, render_variable(name, value))
+
+    def render(self, abinit_variables):
+        """Return the content of the input file."""
+        lines = {}
+        for name, value in abinit_variables.items():
+            base = self._base.get(name, None)
+            if base is not None and base[0] is value:
+                lines[name] = base[1]
+            else:
+                lines[name] = render_variable(name, value)
+        return render_lines(lines)
+
+
+def render_input(abinit_variables):
+    """Return the content of the input file of a dict of variables."""
+    return render_lines({name: render_variable(name, value)
+                         for name, value in abinit_variables.items()})
+
+
+def render_lines(lines):
+    """Gather the lines of each variable (dict name: line) in blocks and
+    return the content of the input file.
+    """
+    blocks = [[] for _ in BLOCKS]
+    for name, line in lines.items():
+        basename = name.rstrip(_DATASET_INDICES)
+        dataset = name.split(basename)[-1].translate(_SORTING)
+        blocks[_BLOCK_INDEX.get(basename, _OTHER)].append(
+                (basename + "_" + dataset, line))
+    content = []
+    for (title, _), block in zip(BLOCKS, blocks):
+        # a block is written even if all its variables are unset
+        if not block:
+            continue
+        content.append("#== %s ==#" % title)
+        content += [line for _, line in sorted(block) if line]
+        content.append("")
+    return "\n".join(content)
+
+
+def render_variable(name, value):
+    """Return the declaration of a variable in the input file ('' if the
+    variable is unset).
+    """
+    units = ""
+    if (hasattr(value, "__iter__") and isinstance(value[-1], str) and
+            value[-1] in UNITS):
+        value = list(value)
+        units = value.pop(-1)
+    if value is None or not str(value):
+        return ""
+    line = " " + name
+    # number of decimals imposed for some variables
+    floatdecimal = 0
+    if any(var in name for var in ("xred", "xcart", "rprim", "qpt", "kpt")):
+        floatdecimal = 16
+    if any(var in name for var in ("ngkpt", "kptrlatt", "ngqpt", "ng2qpt")):
+        floatdecimal = 0
+    if "numpy" in sys.modules and isinstance(value,
+                                             sys.modules["numpy"].ndarray):
+        # all values in a single list
+        value = value.reshape(-1)
+        value = value.tolist() if value.dtype.kind in "biuf" else list(value)
+    if isinstance(value, (list, tuple)):
+        if all(isinstance(v, (list, tuple)) for v in value):
+            line += _format_list2d(value, floatdecimal)
+        else:
+            valperline = 2 if name == "bdgw" else 3
+            line += _format_list(value, floatdecimal, valperline)
+    else:
+        line += " " + str(value)
+    if units:
+        line += " " + units
+    return line
+
+
+def _format_list(values, floatdecimal, valperline):
+    # values on lines of 'valperline' values
+    formatted = _format_scalars(values, floatdecimal)
+    lines = [" " + " ".join(formatted[i:i + valperline])
+             for i in range(0, len(formatted), valperline)]
+    if len(lines) > 1:
+        return "\n" + "\n".join(lines)
+    return "".join(lines)
+
+
+def _format_scalars(values, floatdecimal):
+    # same as formatting each value with _format_scalar but values which
+    # appear many times (e.g.: typat, zeros) are formatted once
+    cache = {}
+    formatted = []
+    for value in values:
+        key = (type(value), value) if _hashable(value) else None
+        if key is None or (value == 0 and isinstance(value, float)):
+            # 0.0 and -0.0 are equal but formatted differently
+            formatted.append(_format_scalar(value, floatdecimal))
+            continue
+        if key not in cache:
+            cache[key] = _format_scalar(value, floatdecimal)
+        formatted.append(cache[key])
+    return formatted
+
+
+def _format_scalar(value, floatdecimal):
+    svalue = str(value)
+    if svalue.lstrip("-").lstrip("+").isdigit() and floatdecimal == 0:
+        return svalue
+    try:
+        fvalue = float(value)
+    except Exception:
+        return svalue
+    if fvalue == 0 or (abs(fvalue) > 1e-3 and abs(fvalue) < 1e4):
+        form, addlen = "f", 5
+    else:
+        form, addlen = "e", 8
+    ndec = max(len(str(fvalue - int(fvalue))) - 2, floatdecimal)
+    ndec = min(ndec, 10)
+    svalue = "{v:>{l}.{p}{f}}".format(v=fvalue, l=ndec + addlen, p=ndec,
+                                      f=form)
+    return svalue.replace("e", "d")
+
+
+def _format_list2d(values, floatdecimal):
+    # one line per sublist, all values with the same format
+    flat = _flatten(values)
+    if all(isinstance(v, int) for v in flat):
+        kind = int
+    else:
+        try:
+            for v in flat:
+                float(v)
+            kind = float
+        except Exception:
+            kind = str
+    width = max(len(str(v)) for v in flat)
+    if kind == int:
+        spec = ">%dd" % width
+    elif kind == str:
+        spec = ">%d" % width
+    else:
+        maxdec = max(len(str(v - int(v))) - 2 for v in flat)
+        ndec = min(max(maxdec, floatdecimal), 10)
+        if all(v == 0 or (abs(v) > 1e-3 and abs(v) < 1e4) for v in flat):
+            spec = ">%d.%df" % (ndec + 5, ndec)
+        else:
+            spec = ">%d.%de" % (ndec + 8, ndec)
+    lines = ["".join(" " + format(v, spec) for v in row) for row in values]
+    return "\n" + "\n".join(lines)
+
+
+def _flatten(values):
+    flat = []
+    for value in values:
+        if not isinstance(value, str) and hasattr(value, "__iter__"):
+            flat += _flatten(value)
+        else:
+            flat.append(value)
+    return flat
+
+
+def _hashable(value):
+    try:
+        hash(value)
+    except TypeError:
+        return False
+    return True
@@ -0,0 +1,121 @@
+from contextlib import contextmanager
+from timeit import default_timer as timer
+import json
+
+
+# phases of a calculation, in order
+PHASES = ("approve_input", "check_pseudos", "process_to_link", "make",
+          "submit", "run")
+
+
+class Instrumentation:
+    """Collects the durations of each phase of many calculations and
+    aggregates them per phase. Hooks are callables called with
+    (calculation, phase, duration) for each recorded phase, where
+    calculation is the calculation's working directory.
+    """
+
+    def __init__(self, hooks=None):
+        """
+        Parameters
+        ----------
+        hooks : list, optional
+                The callables called each time a phase is recorded.
+        """
+        self.hooks = list(hooks) if hooks is not None else []
+        self.calculations = set()
+        # phase -> [count, total, min, max]
+        self._stats = {}
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    @contextmanager
+    def phase(self, calculation, name):
+        """Context manager recording the duration of its block."""
+        start = timer()
+        try:
+            yield
+        finally:
+            self.record(calculation, name, timer() - start)
+
+    def record(self, calculation, phase, duration):
+        """Record the duration (in seconds) of a phase of a calculation."""
+        self.calculations.add(calculation)
+        stats = self._stats.get(phase, None)
+        if stats is None:
+            self._stats[phase] = [1, duration, duration, duration]
+        else:
+            stats[0] += 1
+            stats[1] += duration
+            stats[2] = min(stats[2], duration)
+            stats[3] = max(stats[3], duration)
+        for hook in self.hooks:
+            hook(calculation, phase, duration)
+
+    def record_all(self, calculation, timings):
+        """Record a dict of phase: duration of a calculation."""
+        for phase, duration in timings.items():
+            self.record(calculation, phase, duration)
+
+    def summary(self):
+        """Return a dict of the statistics of each phase."""
+        phases = {}
+        for phase in sorted(self._stats, key=_phase_order):
+            count, total, minimum, maximum = self._stats[phase]
+            phases[phase] = {"count": count, "total": total,
+                             "mean": total / count,
+                             "min": minimum, "max": maximum}
+        return {"calculations": len(self.calculations), "phases": phases}
+
+    def to_json(self, path=None):
+        """Return the summary as a JSON string, written to 'path' if
+        given.
+        """
+        string = json.dumps(self.summary(), indent=2)
+        if path is not None:
+            with open(path, "w") as f:
+                f.write(string)
+        return string
+
+    def to_prometheus(self, path=None, prefix="abilaunch", labels=None):
+        """Return the summary in the Prometheus text exposition format,
+        written to 'path' if given. 'labels' is a dict of labels added to
+        each sample (e.g.: {"sweep": "ecut"}).
+        """
+        labels = labels or {}
+        metric = prefix + "_phase_seconds"
+        lines = [f"# HELP {prefix}_calculations Number of calculations.",
+                 f"# TYPE {prefix}_calculations gauge",
+                 f"{prefix}_calculations{_labels(labels)} "
+                 f"{len(self.calculations)}",
+                 f"# HELP {metric} Time spent in each phase of the "
+                 f"calculations.",
+                 f"# TYPE {metric} summary"]
+        maxima = [f"# HELP {metric}_max Longest duration of each phase.",
+                  f"# TYPE {metric}_max gauge"]
+        for phase, stats in self.summary()["phases"].items():
+            here = _labels(dict(labels, phase=phase))
+            lines.append(f"{metric}_sum{here} {stats['total']!r}")
+            lines.append(f"{metric}_count{here} {stats['count']}")
+            maxima.append(f"{metric}_max{here} {stats['max']!r}")
+        string = "\n".join(lines + maxima) + "\n"
+        if path is not None:
+            with open(path, "w") as f:
+                f.write(string)
+        return string
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"')
+               for v in labels.values())
+    return "{" + ",".join(f'{k}="{v}"'
+                          for k, v in zip(labels, escaped)) + "}"
+
+
+def _phase_order(phase):
+    if phase in PHASES:
+        return (PHASES.index(phase), phase)
+    return (len(PHASES), phase)
@@ -0,0 +1,89 @@
+from .base import BaseUtility
+from .scheduler import get_scheduler
+import logging
+import os
+
+
+class JobArray(BaseUtility):
+    """Class that writes and submits a single job array script running many
+    calculations. Each item of the array goes to the directory of one
+    calculation's jobfile and executes it.
+    """
+    _loggername = "JobArray"
+
+    def __init__(self, path, jobfiles, scheduler=None, jobname=None,
+                 nodes=None, ppn=None, runtime=None, memory=None,
+                 max_running=None, lines_before=None,
+                 loglevel=logging.INFO):
+        """
+        Parameters
+        ----------
+        path : str
+               Path where the job array script is written.
+        jobfiles : list
+                   The list of the jobfiles to execute. The array index
+                   follows the order of this list.
+        scheduler : str, Scheduler, optional
+                    The scheduler ('pbs' or 'slurm'). By default, the one
+                    of the user config.
+        jobname, nodes, ppn, runtime, memory : optional
+                    Resources requested for each item of the array.
+        max_running : int, optional
+                      Maximal number of items running at the same time.
+        lines_before : list, optional
+                       Lines executed before dispatching to the jobfile
+                       (e.g.: module loads).
+        """
+        super().__init__(loglevel=loglevel)
+        if not len(jobfiles):
+            raise ValueError("No jobfiles given.")
+        self.path = os.path.abspath(os.path.expanduser(path))
+        self.jobfiles = [os.path.abspath(j) for j in jobfiles]
+        self.scheduler = get_scheduler(scheduler)
+        self.resources = {"jobname": jobname, "nodes": nodes, "ppn": ppn,
+                          "runtime": runtime, "memory": memory}
+        self.max_running = max_running
+        if lines_before is None:
+            lines_before = []
+        elif isinstance(lines_before, str):
+            lines_before = [lines_before]
+        self.lines_before = list(lines_before)
+        self.job_id = None
+
+    def __len__(self):
+        return len(self.jobfiles)
+
+    def __str__(self):
+        lines = ["#!/bin/bash", ""]
+        lines += self.scheduler.header_lines(**self.resources)
+        lines.append(self.scheduler.array_directive(len(self),
+                                                    self.max_running))
+        lines.append("")
+        lines += self.lines_before
+        lines.append("JOBFILES=(")
+        lines += ['"%s"' % jobfile for jobfile in self.jobfiles]
+        lines.append(")")
+        index = self.scheduler.array_index_variable
+        lines.append('JOBFILE="${JOBFILES[$%s]}"' % index)
+        lines.append('cd "$(dirname "$JOBFILE")"')
+        lines.append('bash "$JOBFILE"')
+        lines.append("")
+        return "\n".join(lines)
+
+    def write(self):
+        """Write the job array script."""
+        dirname = os.path.dirname(self.path)
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        with open(self.path, "w") as f:
+            f.write(str(self))
+        self._logger.debug(f"Job array of {len(self)} items written in"
+                           f" {self.path}.")
+
+    def submit(self):
+        """Write and submit the job array script. Returns the job id."""
+        self.write()
+        self.job_id = self.scheduler.submit(self.path)
+        self._logger.info(f"Job array {self.job_id} submitted with"
+                          f" {len(self)} calculations.")
+        return self.job_id
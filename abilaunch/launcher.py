@@ -1,17 +1,31 @@
-from abipy.htc.launcher import Launcher as AbiLauncher
-from abipy.abio.abivars import AbinitInputFile
 from .base import BaseUtility
-from .config import ConfigFileParser
-from .input_approver import InputApprover
+from .config import get_user_config
+from .handle import CalculationHandle
+from .hashing import calculation_hash, variables_hash
+from .input_approver import InputApprover, _nodes_to_int
+from .input_renderer import InputRenderer
+from .local_executor import JobResult, LocalJob
+from .output_parser import is_completed, parse_memory, parse_walltime
+from .paral_tuner import ParalTuner
+from .pseudos import ELEMENTS, get_pseudo_index
+from .result_cache import ResultCache
+from .scheduler import get_scheduler
+from contextlib import contextmanager
 from timeit import default_timer as timer
+import concurrent.futures
+import glob
 import logging
 import os
 import shutil
-import tempfile
-import traceback
 
 
-USER_CONFIG = ConfigFileParser()
+# abipy (and thus pymatgen, matplotlib, pandas...) is heavy to import and
+# the user config requires to read a file. Both are only loaded when needed
+# such that a plain 'import abilaunch' stays fast.
+def __getattr__(name):
+    if name == "USER_CONFIG":
+        return get_user_config()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 class Launcher(BaseUtility):
@@ -19,12 +33,20 @@ class Launcher(BaseUtility):
     """
     _loggername = "Launcher"
 
-    def __init__(self, workdir, pseudos, run=False,
+    def __init__(self, workdir, pseudos=None, run=False,
                  input_name=None,
                  overwrite=False,
                  abinit_variables=None,
                  abinit_path=None,
                  to_link=None,
+                 allow_missing_links=False,
+                 result_cache=None,
+                 instrumentation=None,
+                 tune_paral=False,
+                 resource_estimator=None,
+                 registry=None,
+                 input_renderer=None,
+                 input_in_place=False,
                  loglevel=logging.INFO,
                  **kwargs):
         """Launcher class init method.
@@ -33,9 +55,12 @@ class Launcher(BaseUtility):
         ----------
         workdir : str
                   Path (can be relative to home) to working directory.
-        pseudos : list, str
+        pseudos : list, str, optional
                   The list of path to the pseudos. If only one pseudo, this do
-                  not need to be a list.
+                  not need to be a list. Pseudos not found are looked up
+                  in the pseudos libraries by filename or element symbol.
+                  If None, the pseudos are chosen in the libraries from
+                  the 'znucl' variable.
         run : bool, optional
               If True, the Launcher will launch the
               calculation on instantiation.
@@ -50,14 +75,66 @@ class Launcher(BaseUtility):
                            Each key represents the name of a variable.
         to_link : list, str
                   A list of input files to link.
+        allow_missing_links : bool, optional
+                              If True, the files to link may not exist yet
+                              (e.g.: outputs of a calculation which is not
+                              finished). They must exist when the
+                              calculation starts.
+        result_cache : ResultCache, str, optional
+                       A result cache (or its directory). If the same
+                       calculation (same variables, pseudos and linked
+                       files) was already computed, its results are
+                       restored instead of running abinit.
+        instrumentation : Instrumentation, optional
+                          Receives the duration of each phase (input
+                          approval, pseudos check, linking, writing,
+                          submission and run) of the calculation. The
+                          durations are also kept in the 'timings' dict.
+        tune_paral : bool, optional
+                     If True, the npkpt, npband and npfft variables are
+                     chosen to get the best predicted parallel efficiency
+                     on the cores given by the 'nodes' and 'mpirun'
+                     kwargs (see ParalTuner).
+        resource_estimator : ResourceEstimator, str, optional
+                             A resource estimator (or the path of its
+                             history database). The 'runtime' and 'memory'
+                             kwargs are predicted when omitted and the
+                             local runs are added to its history.
+        registry : Registry, str, optional
+                   A registry (or the path of its database) where the
+                   calculation is recorded and its submission and status
+                   are kept up to date.
+        input_renderer : InputRenderer, optional
+                         Renders the input file. A renderer shared by many
+                         calculations only formats once the variables
+                         common to all of them.
+        input_in_place : bool, optional
+                         If True, the input file already exists in the
+                         working directory (with the input name): it is
+                         left untouched and the calculation is set up
+                         around it.
         kwargs : other attributes given to the jobfile.
         """
         super().__init__(loglevel=loglevel)
         if abinit_variables is None:
             raise ValueError("No abinit variables given...")
-        self._approve_input(abinit_variables, **kwargs)
-
         workdir = os.path.abspath(os.path.expanduser(workdir))
+        self.workdir = workdir
+        self.instrumentation = instrumentation
+        # phase: duration (in seconds)
+        self.timings = {}
+        if tune_paral:
+            abinit_variables = self._tune_paral(abinit_variables, **kwargs)
+        with self._phase("approve_input"):
+            self._approve_input(abinit_variables, **kwargs)
+        # number of MPI processes (None if not using mpirun)
+        self.mpirun_np = self._get_mpirun_np(**kwargs)
+        self._ncores = self._get_ncores(**kwargs)
+        # id of the job once submitted
+        self.job_id = None
+        # True once the calculation ended (run, restored or awaited)
+        self._ended = False
+
         # create calculation
         if input_name is not None:
             if input_name.endswith(".in"):
@@ -65,16 +142,24 @@ class Launcher(BaseUtility):
         else:
             # input file name is the same as working directory
             input_name = os.path.basename(workdir)
+        self.input_name = input_name
         calcname = os.path.join(workdir, input_name)
+        from abipy.htc.launcher import Launcher as AbiLauncher
         self._abilauncher = AbiLauncher(calcname)
+        if input_in_place and not os.path.isfile(
+                self._abilauncher.input_name):
+            raise FileNotFoundError("Input file not found: %s" %
+                                    self._abilauncher.input_name)
 
         # set executable if custom one is used
         if abinit_path is None or not len(str(abinit_path)):
-            abinit_path = USER_CONFIG.abinit_path
+            abinit_path = get_user_config().abinit_path
         self._abilauncher.set_executable(abinit_path)
 
         # set pseudos
-        pseudo_dir, pseudos = self._check_pseudos(pseudos)
+        with self._phase("check_pseudos"):
+            pseudo_dir, pseudos = self._check_pseudos(pseudos,
+                                                      abinit_variables)
         self._abilauncher.set_pseudodir(pseudo_dir)
         self._abilauncher.set_pseudos(pseudos)
 
@@ -84,30 +169,293 @@ class Launcher(BaseUtility):
         # samething for logfile
         logname = os.path.basename(self._abilauncher.jobfile.log)
         self._abilauncher.jobfile.set_log(os.path.join(workdir, logname))
-        # set input variables
-        for varname, varvalue in abinit_variables.items():
-            setattr(self._abilauncher, varname, varvalue)
+        # the input file is rendered by abilaunch (same format as abipy)
+        # instead of setting each variable in abipy
+        if input_renderer is None:
+            input_renderer = InputRenderer()
 
         # link input files
-        self._process_to_link(to_link)
+        with self._phase("process_to_link"):
+            to_link = self._process_to_link(to_link, allow_missing_links)
+
+        if isinstance(result_cache, str):
+            result_cache = ResultCache(result_cache, loglevel=loglevel)
+        if result_cache is not None and not all(os.path.exists(path)
+                                                for path in to_link):
+            # the hash of the calculation requires the linked files
+            self._logger.warning(f"Files to link of {workdir} do not exist"
+                                 f" yet: the result cache is not used.")
+            result_cache = None
+        self._result_cache = result_cache
+        self._cache_key = None
+        if result_cache is not None:
+            # an existing input file may have more datasets than the
+            # variables (the first one): its whole content is hashed
+            self._cache_key = calculation_hash(
+                    abinit_variables,
+                    [os.path.join(pseudo_dir, p) for p in pseudos],
+                    to_link,
+                    input_file=(self._abilauncher.input_name
+                                if input_in_place else None))
+
+        if isinstance(resource_estimator, str):
+            from .resource_estimator import ResourceEstimator
+            resource_estimator = ResourceEstimator(resource_estimator,
+                                                   loglevel=loglevel)
+        self._resource_estimator = resource_estimator
+        self._abinit_variables = abinit_variables
+        if resource_estimator is not None:
+            kwargs = self._estimate_resources(kwargs)
 
         kwargs = self._process_jobfile(workdir, **kwargs)
         if kwargs:
             raise ValueError("These variables were not used: %s" % str(kwargs))
         # write files
-        self._abilauncher.make(verbose=1, force=overwrite)
+        with self._phase("make"):
+            input_path = self._abilauncher.input_name
+            # abipy does not overwrite existing files unless forced
+            write_input = not input_in_place and (
+                    overwrite or not os.path.exists(input_path))
+            if input_in_place:
+                # abipy writes the other files but also its (empty) input
+                # file: the user's one is put back untouched
+                backup = input_path + ".orig"
+                shutil.copy2(input_path, backup)
+            try:
+                self._abilauncher.make(verbose=1,
+                                       force=overwrite or input_in_place)
+            finally:
+                if input_in_place:
+                    os.replace(backup, input_path)
+            if write_input:
+                # replaces the input file written by abipy (no variables
+                # are set in abipy)
+                with open(input_path, "w") as f:
+                    f.write(input_renderer.render(abinit_variables))
+        if isinstance(registry, str):
+            from .registry import Registry
+            registry = Registry(registry, loglevel=loglevel)
+        self.registry = registry
+        if registry is not None:
+            registry.register(**self.registry_entry())
         # run calculation
         if run:
             self.run()
 
     def run(self, submit=None):
-        if (USER_CONFIG.qsub and submit is None) or submit:
-            self._abilauncher.submit(verbose=1)
-        else:
+        if self._use_qsub(submit):
+            self.submit()
+            return
+        if not self._restore_from_cache():
             start = timer()
-            self._abilauncher.run(verbose=1)
+            with self._phase("run"):
+                self._abilauncher.run(verbose=1)
             end = timer()
             print("Computation finished in %ss." % str(end - start))
+            self._record_resources(end - start)
+            self.cache_results()
+        self._set_registry_status()
+
+    def submit(self, scheduler=None, after=None):
+        """Submit the calculation to the scheduler. Returns the job id (None
+        if the results were restored from the result cache).
+
+        Parameters
+        ----------
+        scheduler : str, Scheduler, optional
+                    The scheduler used for submission.
+        after : list, optional
+                Job ids which must end successfully before this calculation
+                starts (None ids are ignored).
+        """
+        if self._restore_from_cache():
+            self._set_registry_status()
+            return None
+        scheduler = get_scheduler(scheduler)
+        options = scheduler.dependency_options(after or ())
+        with self._phase("submit"):
+            self.job_id = scheduler.submit(self.jobfile_path,
+                                           options=options)
+        if self.registry is not None:
+            self.registry.set_submitted(self.workdir, self.job_id)
+        self._logger.info(f"{self.workdir} submitted as {self.job_id}.")
+        return self.job_id
+
+    async def asubmit(self, scheduler=None, after=None):
+        """Awaitable version of 'submit'."""
+        scheduler = get_scheduler(scheduler)
+        options = scheduler.dependency_options(after or ())
+        with self._phase("submit"):
+            self.job_id = await scheduler.asubmit(self.jobfile_path,
+                                                  options=options)
+        if self.registry is not None:
+            self.registry.set_submitted(self.workdir, self.job_id)
+        self._logger.info(f"{self.workdir} submitted as {self.job_id}.")
+        return self.job_id
+
+    async def arun(self, submit=None, scheduler=None, watcher=None,
+                   poll_interval=30):
+        """Awaitable version of 'run' which waits for the end of the
+        calculation, either run locally as an asyncio subprocess or
+        submitted to the scheduler. Returns a JobResult.
+
+        Parameters
+        ----------
+        submit : bool, optional
+                 Same as for 'run'.
+        scheduler : str, Scheduler, optional
+                    The scheduler used for submission.
+        watcher : JobWatcher, optional
+                  The watcher polling the scheduler. It should be shared
+                  between many calculations such that they are all polled
+                  at once.
+        poll_interval : float, optional
+                        Time (in seconds) between two scheduler polls if no
+                        watcher is given.
+        """
+        start = timer()
+        if self._restore_from_cache():
+            self._set_registry_status()
+            return self._job_result(0, timer() - start)
+        if self._use_qsub(submit):
+            if watcher is None:
+                from .aio import JobWatcher
+                watcher = JobWatcher(get_scheduler(scheduler),
+                                     poll_interval=poll_interval)
+            await self.asubmit(watcher.scheduler)
+            returncode = await self.await_submitted(watcher)
+        else:
+            import asyncio
+            jobfile = self._abilauncher.jobfile
+            with self._phase("run"):
+                process = await asyncio.create_subprocess_exec(
+                        jobfile.shell, jobfile.absname, cwd=jobfile.absdir)
+                returncode = await process.wait()
+            self._record_resources(self.timings["run"])
+            self.cache_results()
+        self._set_registry_status()
+        return self._job_result(returncode, timer() - start)
+
+    async def await_submitted(self, watcher):
+        """Wait for the submitted job to finish. Returns 0 if the abinit
+        output is complete, 1 otherwise.
+        """
+        if self.job_id is None:
+            raise ValueError("Calculation has not been submitted.")
+        await watcher.wait(self.job_id, self.output_path)
+        if not is_completed(self.output_path):
+            return 1
+        self._record_resources()
+        self.cache_results()
+        return 0
+
+    def cache_results(self):
+        """Store the results in the result cache (if any) once the
+        calculation is completed. Returns True if they were stored.
+        """
+        if self._result_cache is None:
+            return False
+        if not is_completed(self.output_path):
+            return False
+        abilauncher = self._abilauncher
+        files = list(abilauncher.output_files()) + abilauncher.odat_files()
+        if os.path.isfile(abilauncher.jobfile.log):
+            files.append(abilauncher.jobfile.log)
+        self._result_cache.store(self._cache_key, self.workdir,
+                                 self.input_name, files)
+        return True
+
+    def _restore_from_cache(self):
+        if self._result_cache is None:
+            return False
+        restored = self._result_cache.restore(self._cache_key, self.workdir,
+                                              self.input_name)
+        if restored:
+            self._logger.info(f"Results of {self.workdir} restored from"
+                              f" cache.")
+        return restored
+
+    def _job_result(self, returncode, walltime):
+        ncores = self.mpirun_np if self.mpirun_np is not None else 1
+        return JobResult(os.path.basename(self.workdir), self.workdir,
+                         ncores, returncode, walltime)
+
+    @contextmanager
+    def _phase(self, name):
+        # time a phase of the calculation
+        start = timer()
+        try:
+            yield
+        finally:
+            duration = timer() - start
+            self.timings[name] = self.timings.get(name, 0.0) + duration
+            if self.instrumentation is not None:
+                self.instrumentation.record(self.workdir, name, duration)
+
+    def _use_qsub(self, submit):
+        return (get_user_config().qsub and submit is None) or submit
+
+    def registry_entry(self, sweep=None):
+        """Return the dict describing this calculation in a Registry."""
+        return {"workdir": self.workdir, "name": self.input_name,
+                "abinit_variables": self._abinit_variables,
+                "output": self.output_path, "sweep": sweep,
+                "job_id": self.job_id, "status": self._status()}
+
+    def _status(self):
+        # the registry status of the calculation
+        from .registry import COMPLETED, FAILED, SUBMITTED, WRITTEN
+        if self._ended:
+            return COMPLETED if is_completed(self.output_path) else FAILED
+        if self.job_id is not None:
+            return SUBMITTED
+        return WRITTEN
+
+    def _set_registry_status(self):
+        # status of a calculation run locally, awaited or restored from the
+        # cache
+        self._ended = True
+        if self.registry is None:
+            return
+        self.registry.set_status(self.workdir, self._status())
+
+    def handle(self):
+        """Return a lightweight CalculationHandle of this calculation."""
+        return CalculationHandle(self.workdir, self.input_name,
+                                 vars_hash=variables_hash(
+                                     self._abinit_variables),
+                                 job_id=self.job_id, status=self._status())
+
+    def local_job(self):
+        """Return the LocalJob running this calculation. Its cost is the
+        number of MPI processes.
+        """
+        jobfile = self._abilauncher.jobfile
+        ncores = self.mpirun_np if self.mpirun_np is not None else 1
+        return LocalJob(os.path.basename(self.workdir),
+                        (jobfile.shell, jobfile.absname),
+                        workdir=jobfile.absdir, ncores=ncores)
+
+    @property
+    def jobfile_path(self):
+        """The absolute path of the jobfile executing the calculation."""
+        return self._abilauncher.jobfile.absname
+
+    @property
+    def output_path(self):
+        """The absolute path of the abinit output file."""
+        return self._abilauncher.output_name
+
+    @property
+    def log_path(self):
+        """The absolute path of the abinit log file."""
+        return os.path.abspath(self._abilauncher.jobfile.log)
+
+    def odat_path(self, datatype, dtset=0):
+        """Return the absolute path of an output data file (e.g.: 'DEN' or
+        'WFK') of the calculation. It may not exist yet.
+        """
+        return os.path.abspath(self._abilauncher.get_odat(datatype, dtset))
 
     def _process_jobfile(self, workdir, **kwargs):
         # Add MPI lines to jobfile if needed
@@ -117,7 +465,7 @@ class Launcher(BaseUtility):
             if len(jobname) > 16:
                 self._logger.warning("jobname: %s is longer than 16 char."
                                      " It will be crop." % jobname)
-        if jobname is None and USER_CONFIG.qsub:
+        if jobname is None and get_user_config().qsub:
             # automaticaly choose workdir name
             jobname = os.path.basename(workdir)
             if len(jobname) > 16:
@@ -143,21 +491,27 @@ class Launcher(BaseUtility):
         # return rest of kwargs
         return kwargs
 
-    def _process_to_link(self, to_link):
+    def _process_to_link(self, to_link, allow_missing=False):
+        # returns the list of linked paths
         if to_link is None:
-            return
+            return []
         if isinstance(to_link, str):
             to_link = (to_link, )
+        paths = []
         for filename in to_link:
             path = os.path.abspath(os.path.expanduser(filename))
-            if not os.path.exists(path):
+            if not allow_missing and not os.path.exists(path):
                 raise FileNotFoundError("File to link not found: %s" %
                                         filename)
             self._abilauncher.link_idat(path)
+            paths.append(path)
+        return paths
 
-    def _check_pseudos(self, pseudos):
+    def _check_pseudos(self, pseudos, abinit_variables):
         pseudo_dir = set()
         pseudos_list = []
+        if pseudos is None:
+            pseudos = self._get_pseudos_from_znucl(abinit_variables)
         if isinstance(pseudos, str):
             pseudos = (pseudos, )
         for pseudo in pseudos:
@@ -168,24 +522,62 @@ class Launcher(BaseUtility):
             raise ValueError("Pseudos must all come from the same directory.")
         return pseudo_dir.pop(), pseudos_list
 
-    def _check_pseudo_exists(self, pseudo):
-        # check is a pseudo exists if not, try to locate it under
-        # the default pseudo dir
+    def _get_pseudos_from_znucl(self, abinit_variables):
+        # choose a pseudo for each element in the pseudos libraries
+        znucl = abinit_variables.get("znucl", None)
+        if znucl is None:
+            raise ValueError("No pseudos given and no 'znucl' variable.")
+        if not isinstance(znucl, (list, tuple)):
+            znucl = (znucl, )
+        index = get_pseudo_index()
+        pseudos = []
+        for z in znucl:
+            candidates = index.find_element(z)
+            if not candidates:
+                raise FileNotFoundError("Could not locate a pseudo for Z=%s"
+                                        % str(z))
+            # prefer pseudos from the same directory as the previous ones
+            dirs = set(os.path.dirname(p) for p in pseudos)
+            same_dir = [c for c in candidates if os.path.dirname(c) in dirs]
+            if same_dir:
+                candidates = same_dir
+            if len(candidates) > 1:
+                self._logger.warning(f"Many pseudos found for Z={z}. Using"
+                                     f" {candidates[0]}.")
+            pseudos.append(candidates[0])
+        return pseudos
+
+    @staticmethod
+    def _check_pseudo_exists(pseudo):
+        # check is a pseudo exists if not, try to locate it in the pseudos
+        # libraries using the index (by filename then by element symbol)
         # once it is found, return the full path to it
         error = FileNotFoundError("Could not locate pseudo %s" % pseudo)
         pseudo = os.path.expanduser(pseudo)  # get rid of "~"
+        index = get_pseudo_index()
+        path = os.path.abspath(pseudo)
+        if path in index:
+            # already known, no need to ask the filesystem
+            return path
         if os.path.exists(pseudo):
-            return os.path.abspath(pseudo)
-        if USER_CONFIG.default_pseudos_dir == "none":  # pragma: nocover
-            raise error
-        indefault = os.path.join(USER_CONFIG.default_pseudos_dir, pseudo)
-        if os.path.exists(indefault):  # pragma: nocover
-            return os.path.abspath(indefault)
+            return path
+        for directory in index.directories:
+            indefault = os.path.join(directory, pseudo)
+            if indefault in index:
+                return indefault
+        found = index.find(pseudo)
+        if found is not None:
+            return found
+        if pseudo.capitalize() in ELEMENTS:
+            candidates = index.find_element(pseudo)
+            if candidates:
+                return candidates[0]
         # if we are here, raise same error
         raise error
 
     @classmethod
     def from_files(cls, input_file_path, *args, **kwargs):
+        from abipy.abio.abivars import AbinitInputFile
         inputs = AbinitInputFile(input_file_path)
         input_name = kwargs.pop("input_name", None)
         if input_name is None:
@@ -197,39 +589,59 @@ class Launcher(BaseUtility):
 
     @classmethod
     def from_inplace_input(cls, inputfilename, *args, **kwargs):
-        # use inplace inputfile
-        # to make it work with abipy, we need to erase it temporarily such that
-        # abipy is able to create the rest of files
-        tempdir = tempfile.TemporaryDirectory()
-        filename = os.path.basename(inputfilename)
-        shutil.copy2(inputfilename, os.path.join(tempdir.name, filename))
-        os.remove(inputfilename)
-        newpath = os.path.join(tempdir.name, filename)
-        run = kwargs.pop("run", False)
-        try:
-            success = True
-            l = Launcher.from_files(newpath, *args, run=False, **kwargs)
-        except Exception as e:  # pragma: nocover
-            success = False
-            print("An error occured. Full Traceback:")
-            tb = traceback.format_exc()
-            print(tb)
+        """Set up a calculation around an existing input file, which is
+        left untouched. The working directory must be the one of the file.
+        """
+        return cls.from_files(inputfilename, *args, input_in_place=True,
+                              **kwargs)
+
+    @classmethod
+    def from_glob(cls, pattern, *args, workers=None, **kwargs):
+        """Set up a calculation around each existing input file matching a
+        glob pattern ('**' matches subdirectories). The input files are
+        left untouched and each working directory is the one of its input
+        file. Files whose calculation is already set up are skipped.
+        Returns the list of Launcher.
+
+        Parameters
+        ----------
+        pattern : str
+                  The glob pattern of the input files.
+        workers : int, optional
+                  If not None, the input files are parsed concurrently by
+                  this number of processes.
+        Other args and kwargs are given to each Launcher.
+        """
+        paths = sorted(os.path.abspath(path) for path in glob.glob(
+                os.path.expanduser(pattern), recursive=True))
+        todo = [path for path in paths if not _is_set_up(path)]
+        if len(todo) < len(paths):
+            logging.getLogger(cls._loggername).info(
+                    f"{len(paths) - len(todo)} input files already set up"
+                    f" are skipped.")
+        if workers is None:
+            all_variables = [_parse_input(path) for path in todo]
         else:
-            # delete input file created by abipy
-            os.remove(inputfilename)
-        finally:
-            # once all is created, restore input file
-            shutil.copy2(newpath, os.path.abspath(inputfilename))
-            # cleanup temporary dir
-            tempdir.cleanup()
-            del tempdir
-            if success:
-                if run:
-                    # run abinit if specified
-                    l.run()
-                return l
-
-    def _get_mpirun_np(self, **kwargs):
+            with concurrent.futures.ProcessPoolExecutor(
+                    max_workers=workers) as pool:
+                all_variables = list(pool.map(_parse_input, todo))
+        return [cls(os.path.dirname(path), *args,
+                    input_name=os.path.basename(path),
+                    abinit_variables=abinit_variables,
+                    input_in_place=True, **kwargs)
+                for path, abinit_variables in zip(todo, all_variables)]
+
+    @classmethod
+    def from_directory(cls, directory, *args, pattern="*.in", **kwargs):
+        """Same as 'from_glob' for the input files of a directory (use
+        pattern='**/*.in' to include subdirectories).
+        """
+        directory = os.path.expanduser(directory)
+        return cls.from_glob(os.path.join(directory, pattern), *args,
+                             **kwargs)
+
+    @staticmethod
+    def _get_mpirun_np(**kwargs):
         mpirun = kwargs.get("mpirun", None)
         if mpirun is None:
             return None
@@ -243,6 +655,53 @@ class Launcher(BaseUtility):
         else:
             return i
 
+    def _estimate_resources(self, kwargs):
+        # fill the runtime and memory kwargs if they are not given
+        missings = [name for name in ("runtime", "memory")
+                    if kwargs.get(name, None) is None]
+        if not missings:
+            return kwargs
+        estimated = self._resource_estimator.jobfile_kwargs(
+                self._abinit_variables, self._ncores)
+        for name in missings:
+            kwargs[name] = estimated[name]
+        self._logger.debug(f"Estimated resources: {estimated}.")
+        return kwargs
+
+    def _record_resources(self, walltime=None):
+        # add a run to the history of the resource estimator (with the wall
+        # time reported by abinit if not measured), crashed runs would
+        # spoil the estimates
+        if self._resource_estimator is None:
+            return
+        if not is_completed(self.output_path):
+            return
+        if walltime is None:
+            walltime = parse_walltime(self.output_path)
+        self._resource_estimator.record(self._abinit_variables,
+                                        self._ncores, walltime=walltime,
+                                        memory=parse_memory(self.output_path))
+
+    @staticmethod
+    def _get_ncores(**kwargs):
+        # total number of MPI processes
+        mpirun_np = Launcher._get_mpirun_np(**kwargs)
+        if mpirun_np is None:
+            return 1
+        nodes = kwargs.get("nodes", None)
+        return mpirun_np * (_nodes_to_int(nodes) if nodes else 1)
+
+    def _tune_paral(self, abinit_variables, **kwargs):
+        # returns the abinit variables with the best paral variables
+        if self._get_mpirun_np(**kwargs) is None:
+            self._logger.warning("No mpirun given: nothing to tune.")
+            return abinit_variables
+        tuner = ParalTuner(abinit_variables, self._get_ncores(**kwargs),
+                           loglevel=self._logger.level)
+        self._logger.info(f"Using {tuner.variables} (predicted efficiency"
+                          f" of {tuner.efficiency:.0%}).")
+        return tuner.apply(abinit_variables)
+
     def _approve_input(self, abinit_variables, **kwargs):
         # check the input variables
         paral_vars = {"nodes": kwargs.get("nodes", None),
@@ -257,3 +716,19 @@ class Launcher(BaseUtility):
         approver = InputApprover(abinit_variables, useparal)
         if not approver.valid:
             raise ValueError("Input file errors: %s" % str(approver.errors))
+
+
+def _parse_input(path):
+    # abinit variables of the first dataset of an input file (module level
+    # such that it can be sent to a process pool)
+    from abipy.abio.abivars import AbinitInputFile
+    return dict(AbinitInputFile(path).datasets[0])
+
+
+def _is_set_up(input_path):
+    # abipy writes the files file and the job script of 'dir/root.in' in
+    # 'dir/run/root.files' and 'dir/run/root.sh'
+    root = os.path.splitext(os.path.basename(input_path))[0]
+    run = os.path.join(os.path.dirname(input_path), "run")
+    return all(os.path.isfile(os.path.join(run, root + suffix))
+               for suffix in (".files", ".sh"))
@@ -0,0 +1,106 @@
+from .base import BaseUtility
+from collections import namedtuple
+from timeit import default_timer as timer
+import logging
+import os
+import subprocess
+import time
+
+
+JobResult = namedtuple("JobResult",
+                       ("name", "workdir", "ncores", "returncode",
+                        "walltime"))
+
+
+class LocalJob:
+    """A command to execute locally using a given number of cores."""
+
+    def __init__(self, name, command, workdir=None, ncores=1):
+        """
+        Parameters
+        ----------
+        name : str
+               Name of the job.
+        command : list
+                  The command to execute.
+        workdir : str, optional
+                  Directory where the command is executed.
+        ncores : int, optional
+                 Number of cores used by the command.
+        """
+        self.name = name
+        self.command = list(command)
+        self.workdir = workdir
+        self.ncores = max(int(ncores), 1)
+
+    def __repr__(self):
+        return f"LocalJob({self.name!r}, ncores={self.ncores})"
+
+
+class LocalExecutor(BaseUtility):
+    """Class that runs many local jobs concurrently without using more than a
+    total number of cores. Jobs are packed such that as many cores as
+    possible are busy at any time.
+    """
+    _loggername = "LocalExecutor"
+
+    def __init__(self, ncores=None, poll_interval=0.1, loglevel=logging.INFO):
+        """
+        Parameters
+        ----------
+        ncores : int, optional
+                 Total number of cores available. By default, all the cores
+                 of the machine.
+        poll_interval : float, optional
+                        Time (in seconds) between two checks of the running
+                        jobs.
+        """
+        super().__init__(loglevel=loglevel)
+        if ncores is None:
+            ncores = os.cpu_count()
+        self.ncores = int(ncores)
+        self.poll_interval = poll_interval
+
+    def run(self, jobs):
+        """Run all the jobs and return their JobResult in the same order."""
+        jobs = list(jobs)
+        for job in jobs:
+            if job.ncores > self.ncores:
+                raise ValueError(f"{job.name} requires {job.ncores} cores"
+                                 f" but only {self.ncores} are available.")
+        # biggest jobs first, it gives a better packing
+        pending = sorted(range(len(jobs)), key=lambda i: -jobs[i].ncores)
+        running = {}
+        results = [None] * len(jobs)
+        free = self.ncores
+        while pending or running:
+            # start every pending job which fits in the free cores
+            for i in list(pending):
+                if jobs[i].ncores <= free:
+                    pending.remove(i)
+                    running[i] = self._start(jobs[i])
+                    free -= jobs[i].ncores
+            time.sleep(self.poll_interval)
+            for i, (process, start) in list(running.items()):
+                returncode = process.poll()
+                if returncode is None:
+                    continue
+                del running[i]
+                free += jobs[i].ncores
+                results[i] = self._result(jobs[i], returncode,
+                                          timer() - start)
+        return results
+
+    def _start(self, job):
+        self._logger.debug(f"Starting {job.name} on {job.ncores} cores.")
+        process = subprocess.Popen(job.command, cwd=job.workdir)
+        return process, timer()
+
+    def _result(self, job, returncode, walltime):
+        if returncode:
+            self._logger.error(f"{job.name} failed with exit status"
+                               f" {returncode} after {walltime:.1f}s.")
+        else:
+            self._logger.info(f"{job.name} finished in {walltime:.1f}s.")
+        return JobResult(job.name, job.workdir, job.ncores, returncode,
+                         walltime)
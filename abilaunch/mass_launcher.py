@@ -1,8 +1,22 @@
 from .launcher import Launcher
 from .base import BaseUtility
+from .hashing import calculation_hash
+from .input_approver import BatchInputApprover
+from .input_renderer import InputRenderer
+from .instrumentation import Instrumentation
+from .job_array import JobArray
+from .local_executor import LocalExecutor
+from .result_cache import ResultCache
+from .scheduler import get_scheduler
+from .shared_assets import SharedAssets
+from .task_farm import TaskFarm, make_bundles, runtime_to_seconds
+from collections import deque
+from collections.abc import Sequence
+from timeit import default_timer as timer
+import concurrent.futures
 import logging
-import numpy as np
 import os
+import sys
 
 
 class MassLauncher(BaseUtility):
@@ -17,7 +31,14 @@ class MassLauncher(BaseUtility):
                  specific_pseudos=None,
                  loglevel=logging.INFO,
                  jobnames=None,
-                 to_link=None, **kwargs):
+                 to_link=None,
+                 workers=None,
+                 executor="process",
+                 instrumentation=None,
+                 shared_assets=None,
+                 registry=None,
+                 compact=False,
+                 deduplicate=False, **kwargs):
         """Mass launcher input parameters.
 
         Parameters
@@ -44,10 +65,55 @@ class MassLauncher(BaseUtility):
                    Sets the logging level.
         jobnames : list, optional
                    The list of jobnames for each job.
+        workers : int, optional
+                  If not None, the calculations are built and written
+                  concurrently using this number of workers. In that case,
+                  errors are collected per calculation in the 'errors'
+                  attribute instead of aborting the whole sweep. The
+                  calculations in error are left out of 'handles' (and of
+                  the lists returned by the methods, which follow its
+                  order): match them by name (see CalculationHandle.name
+                  and 'launcher'), not by position in 'input_names'.
+        executor : str, optional
+                   The kind of pool used when 'workers' is given. Either
+                   'process' (default) or 'thread'.
+        instrumentation : Instrumentation, optional
+                          Aggregates the duration of each phase of all the
+                          calculations. A new one is created by default and
+                          is available as the 'instrumentation' attribute.
+        shared_assets : str, optional
+                        If 'hardlink' or 'symlink', the pseudos and the
+                        files to link are staged once in the 'shared'
+                        subdirectory of the working directory (using this
+                        kind of link) and all calculations refer to the
+                        staged files. See the 'shared_assets' attribute
+                        for a report of the staged files.
+        registry : Registry, str, optional
+                   A registry (or the path of its database) where all the
+                   calculations are recorded at once, with the working
+                   directory as their sweep.
+        compact : bool, optional
+                  If True, only a CalculationHandle (working directory,
+                  name, variables hash, job id and status) is kept for each
+                  calculation once its files are written: the launchers
+                  (and their abipy objects) are released. A launcher is
+                  rebuilt from the sweep arguments, without writing
+                  anything, only when needed (see 'launcher').
+        deduplicate : bool, optional
+                      If True, calculations identical to a previous one
+                      once their variables are merged (same variables,
+                      pseudos, linked files and other launcher arguments)
+                      are not launched: their subdirectory is a link to
+                      the one of the original calculation. See the
+                      'duplicates' (name: original name) and
+                      'deduplication' attributes.
         Other kwargs (like run and overwrite) are passed directly to each
         sublauncher.
         """
         super().__init__(loglevel)
+        if executor not in self._executors:
+            raise ValueError("executor must be one of %s." %
+                             str(tuple(self._executors)))
         length = self._list_check(input_names, specific_variables)
         self._logger.debug(f"{length} different calculations to launch.")
         (common_pseudos,
@@ -55,43 +121,626 @@ class MassLauncher(BaseUtility):
          jobnames) = self._sanitize_list_format(length, common_pseudos,
                                                 to_link, jobnames)
         kwargs = self._sanitize_dict_format(length, **kwargs)
+        if "result_cache" in kwargs:
+            kwargs["result_cache"] = self._share_result_caches(
+                    kwargs["result_cache"], loglevel)
+        # errors collected per calculation (only in concurrent mode)
+        self.errors = {}
+        # validate all inputs before writing anything
+        invalids = self._approve_inputs(input_names, base_variables,
+                                        specific_variables, loglevel,
+                                        **kwargs)
+        if invalids and workers is None:
+            raise ValueError("Input file errors: %s" % str(invalids))
+        for input_name, errors in invalids.items():
+            self.errors[input_name] = ValueError("Input file errors: %s" %
+                                                 str(errors))
         workdir = os.path.abspath(workdir)
+        self.workdir = workdir
         if not os.path.exists(workdir):
             os.mkdir(workdir)
         if specific_pseudos is None:
             specific_pseudos = [[], ] * length
-        self._launchers = self._launch(workdir, common_pseudos,
-                                       specific_pseudos,
-                                       input_names, base_variables,
-                                       specific_variables, to_link, loglevel,
-                                       jobnames,
-                                       **kwargs)
+        self.shared_assets = None
+        if shared_assets is not None:
+            self.shared_assets = SharedAssets(os.path.join(workdir, "shared"),
+                                              link=shared_assets,
+                                              loglevel=loglevel)
+            (common_pseudos, specific_pseudos,
+             to_link) = self._share_assets(common_pseudos, specific_pseudos,
+                                           to_link)
+        # name: name of the original calculation
+        self.duplicates = {}
+        self.deduplication = None
+        if deduplicate:
+            self._deduplicate(common_pseudos, specific_pseudos, input_names,
+                              base_variables, specific_variables, to_link,
+                              kwargs)
+        # arguments of the launchers, needed to rebuild them
+        self._sweep_args = (workdir, common_pseudos, specific_pseudos,
+                            input_names, base_variables, specific_variables,
+                            to_link, loglevel, jobnames, kwargs)
+        self._positions = None
+        if instrumentation is None:
+            instrumentation = Instrumentation()
+        self.instrumentation = instrumentation
+        if isinstance(registry, str):
+            from .registry import Registry
+            registry = Registry(registry, loglevel=loglevel)
+        self.registry = registry
+        self.compact = compact
+        self._launchers = []
+        # name: handle of the calculations (if compact)
+        self._handles = {}
+        launchers = self._launch(workdir, common_pseudos, specific_pseudos,
+                                 input_names, base_variables,
+                                 specific_variables, to_link, loglevel,
+                                 jobnames, workers, executor, **kwargs)
+        # the calculations are registered at once
+        entries = self._keep(launchers)
+        if registry is not None:
+            registry.register_many(entries)
+        else:
+            deque(entries, maxlen=0)
+        if compact:
+            self._launchers = _RebuiltLaunchers(self)
+        self._link_duplicates()
+
+    @property
+    def handles(self):
+        """The list of CalculationHandle of the calculations (without the
+        ones in 'errors' and the duplicates).
+        """
+        if self.compact:
+            return list(self._handles.values())
+        return [l.handle() for l in self._launchers]
+
+    def launcher(self, name):
+        """Return the Launcher of a calculation given its name. If compact,
+        it is rebuilt from the sweep arguments (nothing is written).
+        """
+        name = self._strip_in(name)
+        name = self.duplicates.get(name, name)
+        if not self.compact:
+            for launcher in self._launchers:
+                if launcher.input_name == name:
+                    return launcher
+            raise KeyError(name)
+        return self._rebuild(self._handles[name])
+
+    def submit(self, scheduler=None, max_jobs=None, poll_interval=60,
+               progress=None, timeout=None):
+        """Submit all the calculations (one job each). Returns the list of
+        job ids (None for results restored from a result cache or, if
+        throttled, for calculations not submitted before the timeout or
+        refused too many times by the scheduler).
+
+        Parameters
+        ----------
+        scheduler : str, Scheduler, optional
+                    The scheduler used for submission.
+        max_jobs : int, optional
+                   If given, the submission is throttled such that at most
+                   this number of jobs of the user are queued or running
+                   (see SubmissionController). The remaining calculations
+                   are submitted as jobs end.
+        poll_interval : float, optional
+                        If throttled, time (in seconds) between two counts
+                        of the jobs of the user.
+        progress : str, optional
+                   If throttled, the file where the progress is kept such
+                   that submitting again (e.g.: after a restart) resumes
+                   it. By default, 'submissions.jsonl' in the working
+                   directory.
+        timeout : float, optional
+                  If throttled, maximal time (in seconds) spent submitting.
+        """
+        scheduler = get_scheduler(scheduler)
+        if max_jobs is not None:
+            return self._submit_throttled(scheduler, max_jobs,
+                                          poll_interval, progress, timeout)
+        if self.compact and not self._uses_result_cache():
+            # no results to restore: the launchers are not needed
+            return [self._submit_handle(h, scheduler)
+                    for h in self._handles.values()]
+        return [self._update_handle(l, l.submit(scheduler))
+                for l in self._launchers]
+
+    def run_local(self, ncores=None, poll_interval=0.1):
+        """Run all calculations on the local machine, concurrently, without
+        using more than 'ncores' cores (all of them by default). Each
+        calculation uses as many cores as its mpirun processes.
+        Returns the list of JobResult (name, workdir, ncores, returncode,
+        walltime) in the same order as the calculations.
+        """
+        executor = LocalExecutor(ncores, poll_interval=poll_interval,
+                                 loglevel=self._logger.level)
+        results = executor.run(l.local_job() for l in self._launchers)
+        failed = [r.name for r in results if r.returncode]
+        if failed:
+            self._logger.warning(f"{len(failed)} calculations failed:"
+                                 f" {failed}")
+        return results
+
+    def harvest(self, path=None, workers=None):
+        """Harvest the energies, forces, stresses, timings and convergence
+        of all the existing outputs into a table (see Harvester). Only the
+        outputs modified since the last harvest are parsed. Returns the
+        table (dict of arrays indexed by the 'path' column).
+
+        Parameters
+        ----------
+        path : str, optional
+               Path of the table. By default, 'harvest.npz' in the working
+               directory.
+        workers : int, optional
+                  Number of processes parsing the outputs.
+        """
+        from .harvester import Harvester
+        if path is None:
+            path = os.path.join(self.workdir, "harvest.npz")
+        harvester = Harvester(path, workers=workers,
+                              loglevel=self._logger.level)
+        return harvester.harvest([h.output_path for h in self.handles])
+
+    def monitor(self, rules=None, stop=False, scheduler=None):
+        """Return a ScfMonitor following the log files of all the
+        calculations (submitted ones are cancelled if stopped). Call its
+        'poll' or 'run' method to follow them.
+
+        Parameters
+        ----------
+        rules : list, optional
+                The divergence rules (see ScfMonitor).
+        stop : bool, optional
+               If True, calculations matching a rule are stopped.
+        scheduler : str, Scheduler, optional
+                    The scheduler used to cancel the jobs.
+        """
+        from .scf_monitor import ScfMonitor
+        monitor = ScfMonitor(rules=rules, stop=stop, scheduler=scheduler,
+                             loglevel=self._logger.level)
+        for handle in self.handles:
+            monitor.watch(handle.log_path,
+                          name=os.path.basename(handle.workdir),
+                          job_id=handle.job_id)
+        return monitor
+
+    async def as_completed(self, submit=None, ncores=None, scheduler=None,
+                           poll_interval=30, max_submissions=8):
+        """Asynchronous generator running all calculations and yielding their
+        JobResult as soon as each one finishes. Local runs share a budget
+        of 'ncores' cores (all of them by default). Submitted jobs are all
+        polled at once by a single JobWatcher.
+
+        Parameters
+        ----------
+        submit : bool, optional
+                 Same as for Launcher.run.
+        ncores : int, optional
+                 Core budget for local runs.
+        scheduler : str, Scheduler, optional
+                    The scheduler used for submission.
+        poll_interval : float, optional
+                        Time (in seconds) between two scheduler polls.
+        max_submissions : int, optional
+                          Maximal number of submit commands running at the
+                          same time.
+        """
+        import asyncio
+        from .aio import CoreBudget, JobWatcher
+        if self._launchers and self._launchers[0]._use_qsub(submit):
+            watcher = JobWatcher(get_scheduler(scheduler),
+                                 poll_interval=poll_interval,
+                                 loglevel=self._logger.level)
+            semaphore = asyncio.Semaphore(max_submissions)
+            tasks = [self._asubmit_and_wait(l, watcher, semaphore)
+                     for l in self._launchers]
+        else:
+            budget = CoreBudget(ncores or os.cpu_count())
+            tasks = [self._arun_in_budget(l, budget)
+                     for l in self._launchers]
+        for future in asyncio.as_completed(tasks):
+            yield await future
+
+    async def arun(self, **kwargs):
+        """Run all calculations (see 'as_completed' for the arguments) and
+        return their JobResult in the same order as the calculations.
+        """
+        results = {}
+        async for result in self.as_completed(**kwargs):
+            results[result.workdir] = result
+        return [results[h.workdir] for h in self.handles]
+
+    async def _asubmit_and_wait(self, launcher, watcher, semaphore):
+        start = timer()
+        async with semaphore:
+            self._update_handle(launcher,
+                                await launcher.asubmit(watcher.scheduler))
+        returncode = await launcher.await_submitted(watcher)
+        launcher._set_registry_status()
+        return launcher._job_result(returncode, timer() - start)
+
+    async def _arun_in_budget(self, launcher, budget):
+        ncores = await budget.acquire(launcher.local_job().ncores)
+        try:
+            return await launcher.arun(submit=False)
+        finally:
+            await budget.release(ncores)
+
+    def submit_array(self, path=None, scheduler=None, max_running=None,
+                     **resources):
+        """Submit all the calculations at once as a single job array
+        instead of one job per calculation. Returns the job id.
+
+        Parameters
+        ----------
+        path : str, optional
+               Path of the job array script. By default, it is written in
+               the working directory.
+        scheduler : str, optional
+                    'pbs' or 'slurm'. By default, the one of the user
+                    config.
+        max_running : int, optional
+                      Maximal number of calculations running at once.
+        Other kwargs (jobname, nodes, ppn, runtime, memory) are the
+        resources of each array item. By default, they are taken from the
+        first calculation's jobfile.
+        """
+        if not self._launchers:
+            raise ValueError("No calculations to submit.")
+        if path is None:
+            name = os.path.basename(self.workdir)
+            path = os.path.join(self.workdir, name + "_array.sh")
+        jobfile = self._launchers[0]._abilauncher.jobfile
+        for name in ("nodes", "ppn", "runtime", "memory"):
+            resources.setdefault(name, getattr(jobfile, name, None))
+        resources.setdefault("jobname",
+                             os.path.basename(self.workdir)[:15])
+        self._job_array = JobArray(path,
+                                   [l.jobfile_path for l in self._launchers],
+                                   scheduler=scheduler,
+                                   max_running=max_running,
+                                   loglevel=self._logger.level,
+                                   **resources)
+        return self._job_array.submit()
+
+    def submit_bundles(self, bundle_size=None, runtimes=None,
+                       scheduler=None, python=None, **resources):
+        """Submit the calculations packed in bundles: each bundle is a
+        single scheduler job running many calculations within its
+        allocation. Returns the list of job ids.
+
+        Parameters
+        ----------
+        bundle_size : int, optional
+                      Number of calculations per bundle.
+        runtimes : list, optional
+                   If no bundle size is given, the estimated runtime (in
+                   seconds) of each calculation. Bundles are then filled
+                   such that they end within their requested runtime.
+        scheduler : str, optional
+                    'pbs' or 'slurm'. By default, the one of the user
+                    config.
+        python : str, optional
+                 The python interpreter running the dispatcher.
+        Other kwargs (jobname, nodes, ppn, runtime, memory, lines_before)
+        are the resources of each bundle. By default, they are taken from
+        the first calculation's jobfile. A bundle runs on a single node
+        and shares its ppn cores among its calculations.
+        """
+        if not self._launchers:
+            raise ValueError("No calculations to submit.")
+        jobfile = self._launchers[0]._abilauncher.jobfile
+        for name in ("nodes", "ppn", "runtime", "memory", "lines_before"):
+            resources.setdefault(name, getattr(jobfile, name, None))
+        jobs = [l.local_job() for l in self._launchers]
+        if resources["ppn"] is not None:
+            ncores = int(resources["ppn"])
+        else:
+            ncores = max(job.ncores for job in jobs)
+        max_runtime = None
+        if resources["runtime"] is not None:
+            max_runtime = runtime_to_seconds(resources["runtime"])
+        bundles = make_bundles(jobs, ncores, bundle_size=bundle_size,
+                               runtimes=runtimes, max_runtime=max_runtime)
+        name = os.path.basename(self.workdir)
+        jobname = resources.pop("jobname", None)
+        self._bundles = []
+        job_ids = []
+        for i, bundle in enumerate(bundles):
+            path = os.path.join(self.workdir, f"{name}_bundle{i}.sh")
+            farm = TaskFarm(path, [jobs[j] for j in bundle], ncores,
+                            scheduler=scheduler,
+                            jobname=jobname or f"{name[:10]}_b{i}",
+                            python=python,
+                            loglevel=self._logger.level,
+                            **resources)
+            job_ids.append(farm.submit())
+            self._bundles.append(farm)
+        self._logger.info(f"{len(jobs)} calculations submitted in"
+                          f" {len(bundles)} bundles.")
+        return job_ids
+
+    # pools are looked up by name: concurrent.futures only imports them
+    # (and multiprocessing) on first access.
+    _executors = {"process": "ProcessPoolExecutor",
+                  "thread": "ThreadPoolExecutor"}
 
     def _launch(self, workdir, common_pseudos, specific_pseudos,
                 input_names, base_variables,
-                specific_variables, to_link, loglevel, jobnames, **kwargs):
+                specific_variables, to_link, loglevel, jobnames,
+                workers, executor, **kwargs):
         self._logger.debug("Starting to create all launchers.")
-        launchers = []
-        for i, (input_name,
-                specifics, to_link_here,
-                jobname) in enumerate(zip(input_names,
-                                          specific_variables,
-                                          to_link, jobnames)):
-            if input_name.endswith(".in"):
-                input_name = input_name[:-3]
-            path = os.path.join(workdir, input_name)
+        all_args = self._launchers_args(workdir, common_pseudos,
+                                        specific_pseudos, input_names,
+                                        base_variables, specific_variables,
+                                        to_link, loglevel, jobnames,
+                                        **kwargs)
+        if workers is None:
+            return (_build_launcher(args) for args in all_args)
+        return self._launch_concurrently(all_args, workers, executor)
+
+    def _launch_concurrently(self, all_args, workers, executor):
+        # submit everything to the pool then yield results in input order.
+        # Failed calculations are skipped: everything else is keyed by name
+        self._logger.debug(f"Building launchers using {workers} "
+                           f"{executor} workers.")
+        pool_cls = getattr(concurrent.futures, self._executors[executor])
+        with pool_cls(max_workers=workers) as pool:
+            futures = deque((args[-1]["input_name"],
+                             pool.submit(_safe_build_launcher, args))
+                            for args in all_args)
+            while futures:
+                # results are released as soon as they are used
+                input_name, future = futures.popleft()
+                launcher, error = future.result()
+                if error is not None:
+                    self._logger.error(f"Could not create calculation "
+                                       f"{input_name}: {error}")
+                    self.errors[input_name] = error
+                    continue
+                yield launcher
+        if self.errors:
+            self._logger.warning(f"{len(self.errors)} calculations failed"
+                                 f" to be created.")
+
+    def _keep(self, launchers):
+        # keep the built launchers (or only their handles if compact) and
+        # yield their registry entries. Launchers may have been built in
+        # other processes: their timings are aggregated here and later
+        # phases are recorded directly
+        for launcher in launchers:
+            launcher.instrumentation = self.instrumentation
+            self.instrumentation.record_all(launcher.workdir,
+                                            launcher.timings)
+            launcher.registry = self.registry
+            yield launcher.registry_entry(sweep=self.workdir)
+            if self.compact:
+                self._handles[launcher.input_name] = launcher.handle()
+            else:
+                self._launchers.append(launcher)
+
+    def _rebuild(self, handle):
+        # build again the launcher of a compact sweep, its files already
+        # exist and are not overwritten
+        if self._positions is None:
+            self._positions = {self._strip_in(name): i for i, name
+                               in enumerate(self._sweep_args[3])}
+        path, pseudos, kwargs = self._launcher_args(
+                self._positions[handle.name], *self._sweep_args)
+        kwargs.update({"run": False, "overwrite": False,
+                       "input_renderer": None})
+        launcher = _build_launcher((path, pseudos, kwargs))
+        launcher.job_id = handle.job_id
+        launcher.instrumentation = self.instrumentation
+        launcher.registry = self.registry
+        return launcher
+
+    def _submit_throttled(self, scheduler, max_jobs, poll_interval,
+                          progress, timeout):
+        from .submission_controller import SubmissionController
+        if progress is None:
+            progress = os.path.join(self.workdir, "submissions.jsonl")
+        # name: handle (if compact) or launcher
+        targets = self._handles
+        if not self.compact:
+            targets = {l.input_name: l for l in self._launchers}
+        scripts = {name: target.jobfile_path
+                   for name, target in targets.items()}
+        if self._uses_result_cache():
+            for launcher in self._launchers:
+                if launcher._restore_from_cache():
+                    launcher._set_registry_status()
+                    del scripts[launcher.input_name]
+
+        def submitted(name, job_id):
+            self._set_job_id(targets[name], job_id)
+            if self.registry is not None:
+                self.registry.set_submitted(targets[name].workdir, job_id)
+
+        controller = SubmissionController(scripts, max_jobs,
+                                          scheduler=scheduler,
+                                          progress=progress,
+                                          on_submitted=submitted,
+                                          loglevel=self._logger.level)
+        job_ids = controller.run(poll_interval=poll_interval,
+                                 timeout=timeout)
+        # also the job ids of a previous (resumed) submission
+        for name, job_id in job_ids.items():
+            self._set_job_id(targets[name], job_id)
+        return [job_ids.get(name, None) for name in targets]
+
+    def _set_job_id(self, target, job_id):
+        # target is a handle (if compact) or a launcher
+        target.job_id = job_id
+        if self.compact:
+            from .registry import SUBMITTED
+            target.status = SUBMITTED
+
+    def _uses_result_cache(self):
+        return any(self._sweep_args[-1].get("result_cache", ()))
+
+    def _submit_handle(self, handle, scheduler):
+        # same as Launcher.submit without a result cache
+        from .registry import SUBMITTED
+        start = timer()
+        handle.job_id = scheduler.submit(handle.jobfile_path)
+        handle.status = SUBMITTED
+        self.instrumentation.record(handle.workdir, "submit", timer() - start)
+        if self.registry is not None:
+            self.registry.set_submitted(handle.workdir, handle.job_id)
+        self._logger.info(f"{handle.workdir} submitted as {handle.job_id}.")
+        return handle.job_id
+
+    def _update_handle(self, launcher, job_id):
+        # the job id of a rebuilt launcher is kept in its handle
+        if self.compact:
+            from .registry import SUBMITTED
+            handle = self._handles[launcher.input_name]
+            handle.job_id = job_id
+            if job_id is not None:
+                handle.status = SUBMITTED
+        return job_id
+
+    def _share_assets(self, common_pseudos, specific_pseudos, to_link):
+        # stage files once and replace them by the staged ones
+        share = self.shared_assets.share
+        pseudos = []
+        links = []
+        for specifics, to_link_here in zip(specific_pseudos, to_link):
+            if isinstance(specifics, str):
+                specifics = [specifics]
+            pseudos.append([share(Launcher._check_pseudo_exists(p),
+                                  "pseudos")
+                            for p in list(common_pseudos) + list(specifics)])
+            if isinstance(to_link_here, str):
+                to_link_here = [to_link_here]
+            if to_link_here is not None:
+                to_link_here = [share(path) for path in to_link_here]
+            links.append(to_link_here)
+        report = self.shared_assets.report()
+        self._logger.info(f"{report['assets']} files ({report['bytes']}"
+                          f" bytes) staged for {report['references']}"
+                          f" references: {report['hardlinks']} hard links,"
+                          f" {report['symlinks']} symbolic links,"
+                          f" {report['bytes_saved']} bytes saved.")
+        return [], pseudos, links
+
+    def _deduplicate(self, common_pseudos, specific_pseudos, input_names,
+                     base_variables, specific_variables, to_link, kwargs):
+        # find the calculations identical to a previous one: same
+        # variables, pseudos, linked files and other launcher arguments
+        # (e.g.: jobfile resources)
+        originals = {}
+        for i, input_name in enumerate(input_names):
+            input_name = self._strip_in(input_name)
+            if input_name in self.errors:
+                continue
             abinit_vars = base_variables.copy()
-            abinit_vars.update(specifics)
-            kwargs_here = {k: v[i] for k, v in kwargs.items()}
-            l = Launcher(path, common_pseudos + specific_pseudos[i],
-                         input_name=input_name,
-                         abinit_variables=abinit_vars,
-                         to_link=to_link_here,
-                         loglevel=loglevel,
-                         jobname=jobname,
-                         **kwargs_here)
-            launchers.append(l)
-        return launchers
+            abinit_vars.update(specific_variables[i])
+            specifics = specific_pseudos[i]
+            if isinstance(specifics, str):
+                specifics = [specifics]
+            try:
+                pseudos = [Launcher._check_pseudo_exists(p)
+                           for p in list(common_pseudos) + list(specifics)]
+                key = calculation_hash(abinit_vars, pseudos, to_link[i])
+            except FileNotFoundError:
+                # pseudos not found (raised or collected in 'errors' when
+                # building the calculation) or files to link not written
+                # yet: cannot be compared
+                continue
+            key = (key, tuple(sorted((name, repr(values[i]))
+                                     for name, values in kwargs.items())))
+            if key in originals:
+                self.duplicates[input_name] = originals[key]
+            else:
+                originals[key] = input_name
+        ncalcs = len(originals) + len(self.duplicates)
+        self.deduplication = {"calculations": ncalcs,
+                              "distinct": len(originals),
+                              "duplicates": len(self.duplicates),
+                              "ratio": ncalcs / max(len(originals), 1)}
+        self._logger.info(f"{len(self.duplicates)} duplicates out of {ncalcs}"
+                          f" calculations (deduplication ratio: "
+                          f"{self.deduplication['ratio']:.2f}).")
+
+    def _link_duplicates(self):
+        # the subdirectory of a duplicate points to the original one
+        for input_name, original in self.duplicates.items():
+            if original in self.errors:
+                self.errors[input_name] = self.errors[original]
+                continue
+            path = os.path.join(self.workdir, input_name)
+            if os.path.islink(path):
+                os.remove(path)
+            elif os.path.exists(path):
+                self._logger.warning(f"{path} already exists: not linked to"
+                                     f" {original}.")
+                continue
+            os.symlink(original, path)
+
+    def _share_result_caches(self, caches, loglevel):
+        # a single ResultCache per directory for all the calculations
+        shared = {}
+        for cache in caches:
+            if isinstance(cache, str) and cache not in shared:
+                shared[cache] = ResultCache(cache, loglevel=loglevel)
+        return [shared.get(c, c) if isinstance(c, str) else c
+                for c in caches]
+
+    def _approve_inputs(self, input_names, base_variables,
+                        specific_variables, loglevel, **kwargs):
+        # check all inputs at once, returns the errors of each invalid input
+        mpiruns = kwargs.get("mpirun", [None] * len(input_names))
+        paral_params = {"nodes": kwargs.get("nodes", None),
+                        "ppn": kwargs.get("ppn", None),
+                        "mpirun_np": [Launcher._get_mpirun_np(mpirun=m)
+                                      for m in mpiruns]}
+        approver = BatchInputApprover(base_variables, specific_variables,
+                                      paral_params, loglevel=loglevel)
+        return {self._strip_in(input_names[i]): errors
+                for i, errors in approver.errors.items()}
+
+    def _strip_in(self, input_name):
+        if input_name.endswith(".in"):
+            return input_name[:-3]
+        return input_name
+
+    def _launchers_args(self, workdir, common_pseudos, specific_pseudos,
+                        input_names, base_variables, specific_variables,
+                        to_link, loglevel, jobnames, **kwargs):
+        # generate the arguments given to each sub launcher
+        # the base variables are formatted only once
+        renderer = InputRenderer(base_variables)
+        for i, input_name in enumerate(input_names):
+            input_name = self._strip_in(input_name)
+            if input_name in self.errors or input_name in self.duplicates:
+                # invalid input (already reported) or duplicate
+                continue
+            path, pseudos, kwargs_here = self._launcher_args(
+                    i, workdir, common_pseudos, specific_pseudos,
+                    input_names, base_variables, specific_variables,
+                    to_link, loglevel, jobnames, kwargs)
+            kwargs_here["input_renderer"] = renderer
+            yield path, pseudos, kwargs_here
+
+    def _launcher_args(self, i, workdir, common_pseudos, specific_pseudos,
+                       input_names, base_variables, specific_variables,
+                       to_link, loglevel, jobnames, kwargs):
+        # the arguments of the i-th sub launcher
+        input_name = self._strip_in(input_names[i])
+        abinit_vars = base_variables.copy()
+        abinit_vars.update(specific_variables[i])
+        kwargs_here = {k: v[i] for k, v in kwargs.items()}
+        kwargs_here.update({"input_name": input_name,
+                            "abinit_variables": abinit_vars,
+                            "to_link": to_link[i],
+                            "loglevel": loglevel,
+                            "jobname": jobnames[i]})
+        return (os.path.join(workdir, input_name),
+                common_pseudos + specific_pseudos[i], kwargs_here)
 
     def _sanitize_dict_format(self, length, **kwargs):
         toreturn = {}
@@ -128,8 +777,45 @@ class MassLauncher(BaseUtility):
         return length
 
     def _is_list(self, a_list):
-        types = (list, tuple, np.ndarray)
+        types = (list, tuple)
+        if "numpy" in sys.modules:
+            # if numpy was never imported, a_list cannot be an array
+            types += (sys.modules["numpy"].ndarray, )
         for typ in types:
             if isinstance(a_list, typ):
                 return True
         return False
+
+
+def _build_launcher(args):
+    # module level function such that it can be sent to a process pool
+    path, pseudos, kwargs = args
+    return Launcher(path, pseudos, **kwargs)
+
+
+def _safe_build_launcher(args):
+    # same as above but returns the error instead of raising it
+    try:
+        return _build_launcher(args), None
+    except Exception as e:
+        return None, e
+
+
+class _RebuiltLaunchers(Sequence):
+    # the launchers of a compact MassLauncher, each one is rebuilt from its
+    # handle when accessed
+    def __init__(self, mass_launcher):
+        self._mass_launcher = mass_launcher
+
+    def __len__(self):
+        return len(self._mass_launcher._handles)
+
+    def __getitem__(self, index):
+        handles = list(self._mass_launcher._handles.values())[index]
+        if isinstance(index, slice):
+            return [self._mass_launcher._rebuild(h) for h in handles]
+        return self._mass_launcher._rebuild(handles)
+
+    def __iter__(self):
+        for handle in list(self._mass_launcher._handles.values()):
+            yield self._mass_launcher._rebuild(handle)
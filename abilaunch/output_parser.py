@@ -0,0 +1,83 @@
+import os
+import re
+
+
+# abinit writes this line at the very end of a successful run
+COMPLETED_TAG = "Calculation completed."
+# size of the end of file which is read to check for completion
+TAIL_SIZE = 4096
+
+
+def is_completed(output_path):
+    """Return True if an abinit output file exists and is complete. Only the
+    end of the file is read.
+    """
+    try:
+        with open(output_path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            f.seek(max(size - TAIL_SIZE, 0))
+            tail = f.read().decode(errors="ignore")
+    except OSError:
+        return False
+    return COMPLETED_TAG in tail
+
+
+# final value of etotal echoed after the computation, e.g.:
+#            etotal1    -1.1034518296E+00
+_ETOTAL = re.compile(r"^\s*etotal(\d*)\s+(-?\d+\.\d+E[+-]\d+)",
+                     re.MULTILINE)
+
+
+def parse_etotal(output_path):
+    """Return the total energy (in Ha) of an abinit output file, or None if
+    it cannot be found. For multi dataset outputs, the energy of the last
+    dataset is returned.
+    """
+    try:
+        with open(output_path, "r", errors="ignore") as f:
+            content = f.read()
+    except OSError:
+        return None
+    matches = _ETOTAL.findall(content)
+    if not matches:
+        return None
+    return float(matches[-1][1])
+
+
+_WALLTIME = re.compile(r"Overall time at end \(sec\) : cpu=\s*\S+\s+"
+                       r"wall=\s*([0-9.Ee+-]+)")
+_MEMORY = re.compile(r"This job should need less than\s+([0-9.]+) Mbytes")
+_NPROC = re.compile(r"mpi_nproc:\s*(\d+)")
+
+
+def parse_walltime(output_path):
+    """Return the total wall time (in seconds) reported at the end of an
+    abinit output file, or None if it cannot be found.
+    """
+    matches = _findall(_WALLTIME, output_path)
+    return float(matches[-1]) if matches else None
+
+
+def parse_memory(output_path):
+    """Return the memory (in bytes) abinit predicted for the calculation,
+    or None if it cannot be found.
+    """
+    matches = _findall(_MEMORY, output_path)
+    return float(matches[-1]) * 2 ** 20 if matches else None
+
+
+def parse_nproc(output_path):
+    """Return the number of MPI processes reported in the header of an
+    abinit output file, or None if it cannot be found.
+    """
+    matches = _findall(_NPROC, output_path)
+    return int(matches[0]) if matches else None
+
+
+def _findall(regex, path):
+    try:
+        with open(path, "r", errors="ignore") as f:
+            return regex.findall(f.read())
+    except OSError:
+        return []
@@ -0,0 +1,200 @@
+from .base import BaseUtility
+from itertools import product
+import logging
+import math
+
+
+# Simple model of the efficiency of abinit's k-points / bands / FFT
+# parallelization (paral_kgb). k-points scale almost perfectly as long as
+# they are evenly distributed, bands and FFT need communications which
+# cost more as the number of processes grows (FFT more than bands).
+BAND_COMMUNICATION = 0.05
+FFT_COMMUNICATION = 0.15
+# minimal number of bands per process and of FFT planes per process
+MIN_BANDS_PER_PROC = 2
+MIN_PLANES_PER_PROC = 4
+# below this efficiency, the user is warned
+MIN_EFFICIENCY = 0.5
+
+
+class ParalTuner(BaseUtility):
+    """Class that chooses the npkpt, npband, npfft (and npspinor) variables
+    for a given number of cores. All the distributions of the cores among
+    the k-points, bands and FFT levels are enumerated and the one with the
+    best predicted parallel efficiency is kept.
+
+    The 'variables' attribute are the chosen variables, 'efficiency' their
+    predicted efficiency and 'candidates' all the valid distributions
+    sorted by decreasing efficiency.
+    """
+    _loggername = "ParalTuner"
+
+    def __init__(self, abinit_variables, ncores,
+                 min_efficiency=MIN_EFFICIENCY, loglevel=logging.INFO):
+        """
+        Parameters
+        ----------
+        abinit_variables : dict
+                           The abinit variables of the calculation. nkpt,
+                           nband and the FFT grid are taken from them (the
+                           FFT grid is estimated from ecut and acell). The
+                           k-points are only distributed if nkpt is given:
+                           the number of irreducible k-points of a grid
+                           (ngkpt) is not known before abinit reduces it.
+        ncores : int
+                 The total number of MPI processes.
+        min_efficiency : float, optional
+                         A warning is issued if the best predicted
+                         efficiency is lower.
+        """
+        super().__init__(loglevel=loglevel)
+        self.ncores = int(ncores)
+        # None if unknown
+        self.nkpt = _get_irreducible_nkpt(abinit_variables)
+        self.nband = abinit_variables.get("nband", None)
+        if isinstance(self.nband, (list, tuple)):
+            self.nband = max(self.nband)
+        self.ngfft = _get_ngfft(abinit_variables)
+        self.nspinor = abinit_variables.get("nspinor", 1)
+        self.candidates = self._enumerate()
+        self.efficiency, distribution = self.candidates[0]
+        self.variables = self._to_variables(distribution)
+        used = math.prod(distribution)
+        if used < self.ncores:
+            self._logger.warning(f"Only {used} of the {self.ncores} cores"
+                                 f" can be used.")
+        if self.efficiency < min_efficiency:
+            self._logger.warning(f"The {self.ncores} cores are used with a"
+                                 f" predicted efficiency of"
+                                 f" {self.efficiency:.0%}.")
+
+    def apply(self, abinit_variables):
+        """Return a copy of the abinit variables with the chosen
+        parallelization variables.
+        """
+        abinit_variables = abinit_variables.copy()
+        abinit_variables.update(self.variables)
+        return abinit_variables
+
+    def _enumerate(self):
+        # all valid (npkpt, npband, npfft, npspinor) using at most ncores.
+        # With paral_kgb, abinit requires all the cores to be used.
+        npkpts = [1]
+        if self.nkpt is not None:
+            npkpts = range(1, min(self.nkpt, self.ncores) + 1)
+        npbands = [1]
+        if self.nband is not None:
+            npbands = [n for n in _divisors(self.nband)
+                       if self.nband // n >= MIN_BANDS_PER_PROC or n == 1]
+        npffts = [1]
+        if self.ngfft is not None:
+            # abinit distributes the planes of the 2nd and 3rd dimensions
+            planes = math.gcd(self.ngfft[1], self.ngfft[2])
+            npffts = [n for n in _divisors(planes)
+                      if self.ngfft[2] // n >= MIN_PLANES_PER_PROC or n == 1]
+        npspinors = (1, 2) if self.nspinor == 2 else (1, )
+        candidates = []
+        for distribution in product(npkpts, npbands, npffts, npspinors):
+            used = math.prod(distribution)
+            if used > self.ncores:
+                continue
+            if _uses_paral_kgb(distribution) and used != self.ncores:
+                continue
+            candidates.append((self._efficiency(*distribution),
+                               distribution))
+        # best first, then favor k-points over bands over FFT
+        candidates.sort(key=lambda c: (-c[0], [-n for n in c[1]]))
+        return candidates
+
+    def _efficiency(self, npkpt, npband, npfft, npspinor):
+        efficiency = 1.0
+        if self.nkpt is not None:
+            efficiency = _balance(self.nkpt, npkpt)
+        efficiency /= 1 + BAND_COMMUNICATION * math.log2(npband)
+        efficiency /= 1 + FFT_COMMUNICATION * math.log2(npfft)
+        used = npkpt * npband * npfft * npspinor
+        return efficiency * used / self.ncores
+
+    def _to_variables(self, distribution):
+        npkpt, npband, npfft, npspinor = distribution
+        variables = {"npkpt": npkpt, "npband": npband, "npfft": npfft}
+        if self.nspinor == 2:
+            variables["npspinor"] = npspinor
+        if _uses_paral_kgb(distribution):
+            variables["paral_kgb"] = 1
+        # the FFT grid (often only estimated) is never written: abinit
+        # chooses one compatible with npfft
+        return variables
+
+
+def _uses_paral_kgb(distribution):
+    npkpt, npband, npfft, npspinor = distribution
+    return npband * npfft * npspinor > 1
+
+
+def _get_irreducible_nkpt(abinit_variables):
+    # number of k-points times the number of spin polarizations, only if
+    # the k-points are given explicitly
+    if "nkpt" not in abinit_variables:
+        return None
+    return (int(abinit_variables["nkpt"]) *
+            abinit_variables.get("nsppol", 1))
+
+
+def _divisors(n):
+    return [i for i in range(1, n + 1) if not n % i]
+
+
+def _balance(nitems, nprocs):
+    # efficiency of the distribution of nitems over nprocs
+    return nitems / (nprocs * math.ceil(nitems / nprocs))
+
+
+def _get_nkpt(abinit_variables):
+    # number of k-points times the number of spin polarizations
+    nsppol = abinit_variables.get("nsppol", 1)
+    if "nkpt" in abinit_variables:
+        return int(abinit_variables["nkpt"]) * nsppol
+    ngkpt = abinit_variables.get("ngkpt", None)
+    if ngkpt is None:
+        return nsppol
+    shiftk = abinit_variables.get("shiftk", [[0.5, 0.5, 0.5]])
+    nshiftk = len(shiftk) if isinstance(shiftk[0], (list, tuple)) else 1
+    # upper bound (symmetries reduce the number of k-points), only used to
+    # estimate the work, never to distribute the k-points
+    return math.prod(ngkpt) * nshiftk * nsppol
+
+
+def _get_ngfft(abinit_variables):
+    # FFT grid given or estimated from ecut and the cell (in bohr), only
+    # used to choose npfft
+    if "ngfft" in abinit_variables:
+        return tuple(abinit_variables["ngfft"])
+    ecut = abinit_variables.get("ecut", None)
+    acell = abinit_variables.get("acell", None)
+    if ecut is None or acell is None:
+        return None
+    try:
+        rprim = abinit_variables.get("rprim", ((1, 0, 0), (0, 1, 0),
+                                               (0, 0, 1)))
+        lengths = [float(a) * math.sqrt(sum(float(x) ** 2 for x in row))
+                   for a, row in zip(acell, rprim)]
+    except (TypeError, ValueError):
+        # units given as strings
+        return None
+    # the density sphere has a radius of 2 * sqrt(2 * ecut)
+    gmax = 2 * math.sqrt(2 * float(ecut))
+    return tuple(_fft_size(math.ceil(gmax * length / math.pi))
+                 for length in lengths)
+
+
+def _fft_size(n):
+    # smallest even size >= n with only 2, 3 and 5 as prime factors
+    while True:
+        m = n
+        for p in (2, 3, 5):
+            while m % p == 0:
+                m //= p
+        if m == 1 and n % 2 == 0:
+            return n
+        n += 1
@@ -0,0 +1,229 @@
+from .base import BaseUtility
+from .config import get_user_config
+import json
+import logging
+import os
+import re
+
+
+ELEMENTS = ("H", "He", "Li", "Be", "B", "C", "N", "O", "F", "Ne", "Na", "Mg",
+            "Al", "Si", "P", "S", "Cl", "Ar", "K", "Ca", "Sc", "Ti", "V", "Cr",
+            "Mn", "Fe", "Co", "Ni", "Cu", "Zn", "Ga", "Ge", "As", "Se", "Br",
+            "Kr", "Rb", "Sr", "Y", "Zr", "Nb", "Mo", "Tc", "Ru", "Rh", "Pd",
+            "Ag", "Cd", "In", "Sn", "Sb", "Te", "I", "Xe", "Cs", "Ba", "La",
+            "Ce", "Pr", "Nd", "Pm", "Sm", "Eu", "Gd", "Tb", "Dy", "Ho", "Er",
+            "Tm", "Yb", "Lu", "Hf", "Ta", "W", "Re", "Os", "Ir", "Pt", "Au",
+            "Hg", "Tl", "Pb", "Bi", "Po", "At", "Rn", "Fr", "Ra", "Ac", "Th",
+            "Pa", "U", "Np", "Pu", "Am", "Cm", "Bk", "Cf", "Es", "Fm", "Md",
+            "No", "Lr", "Rf", "Db", "Sg", "Bh", "Hs", "Mt", "Ds", "Rg", "Cn",
+            "Nh", "Fl", "Mc", "Lv", "Ts", "Og")
+# extensions of the files that are considered as pseudopotentials
+PSEUDOS_EXTENSIONS = (".psp", ".psp8", ".pspnc", ".pspgth", ".psphgh",
+                      ".fhi", ".hgh", ".gth", ".xml", ".upf", ".paw",
+                      ".pawps", ".tm", ".psml")
+# number of bytes read at the top of a pseudo to find its element
+HEADER_SIZE = 2048
+
+
+def znucl_to_symbol(znucl):
+    """Return the element symbol corresponding to an atomic number."""
+    z = int(round(float(znucl)))
+    if z < 1 or z > len(ELEMENTS):
+        raise ValueError("Invalid atomic number: %s" % str(znucl))
+    return ELEMENTS[z - 1]
+
+
+class PseudoIndex(BaseUtility):
+    """Index of one or many pseudopotential libraries. It maps the
+    filename and the element symbol of each pseudo to its absolute path
+    such that no filesystem lookups are needed once the index is built.
+    """
+    _loggername = "PseudoIndex"
+
+    def __init__(self, directories, cache_path=None, loglevel=logging.INFO):
+        """
+        Parameters
+        ----------
+        directories : list
+                      The list of pseudos libraries directories. When the
+                      same filename is present in many libraries, the first
+                      one has priority.
+        cache_path : str, optional
+                     If given, the index is stored in this file and reused
+                     as long as the directories' modification times did not
+                     change.
+        loglevel : int, optional
+                   Sets the logging level.
+        """
+        super().__init__(loglevel=loglevel)
+        if isinstance(directories, str):
+            directories = (directories, )
+        self.directories = [os.path.abspath(os.path.expanduser(d))
+                            for d in directories]
+        self._by_name = {}
+        self._by_element = {}
+        self._mtimes = {}
+        if cache_path is not None and self._load(cache_path):
+            self._logger.debug(f"Pseudos index loaded from {cache_path}.")
+        else:
+            self._build()
+            if cache_path is not None:
+                self._save(cache_path)
+        self._paths = set(self._by_name.values())
+        for paths in self._by_element.values():
+            self._paths.update(paths)
+
+    def __contains__(self, path):
+        return path in self._paths
+
+    def __len__(self):
+        return len(self._paths)
+
+    def find(self, filename):
+        """Return the absolute path of a pseudo from its filename. Returns
+        None if it is not indexed.
+        """
+        return self._by_name.get(filename, None)
+
+    def find_element(self, symbol):
+        """Return the absolute paths of all the pseudos of an element. The
+        pseudos from the first libraries come first.
+        """
+        if not isinstance(symbol, str):
+            symbol = znucl_to_symbol(symbol)
+        return list(self._by_element.get(symbol.capitalize(), []))
+
+    def _build(self):
+        self._logger.debug("Building pseudos index of %s." %
+                           str(self.directories))
+        for directory in self.directories:
+            if not os.path.isdir(directory):
+                self._logger.warning(f"Pseudos directory {directory} does"
+                                     f" not exist.")
+                continue
+            self._index_directory(directory)
+
+    def _index_directory(self, directory):
+        self._mtimes[directory] = os.stat(directory).st_mtime
+        with os.scandir(directory) as entries:
+            entries = sorted(entries, key=lambda x: x.name)
+        for entry in entries:
+            if entry.is_dir():
+                self._index_directory(entry.path)
+                continue
+            if not entry.name.lower().endswith(PSEUDOS_EXTENSIONS):
+                continue
+            path = os.path.abspath(entry.path)
+            # the first library has priority over the following ones
+            self._by_name.setdefault(entry.name, path)
+            symbol = self._get_element(path)
+            if symbol is not None:
+                self._by_element.setdefault(symbol, []).append(path)
+
+    def _get_element(self, path):
+        # try to read the element from the header, if it fails, deduce it
+        # from the filename.
+        try:
+            with open(path, "r", errors="ignore") as f:
+                header = f.read(HEADER_SIZE)
+        except OSError:  # pragma: nocover
+            header = ""
+        symbol = _element_from_header(header)
+        if symbol is None:
+            symbol = _element_from_filename(os.path.basename(path))
+        return symbol
+
+    def _load(self, cache_path):
+        if not os.path.isfile(cache_path):
+            return False
+        try:
+            with open(cache_path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            self._logger.warning(f"Could not read pseudos index"
+                                 f" {cache_path}.")
+            return False
+        if data.get("directories") != self.directories:
+            return False
+        # index is outdated if any indexed directory changed
+        for directory, mtime in data["mtimes"].items():
+            try:
+                if os.stat(directory).st_mtime != mtime:
+                    return False
+            except OSError:
+                return False
+        self._mtimes = data["mtimes"]
+        self._by_name = data["names"]
+        self._by_element = data["elements"]
+        return True
+
+    def _save(self, cache_path):
+        data = {"directories": self.directories,
+                "mtimes": self._mtimes,
+                "names": self._by_name,
+                "elements": self._by_element}
+        dirname = os.path.dirname(cache_path)
+        if dirname and not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        # write in a temporary file first such that concurrent readers
+        # never see a partial index
+        tmp = cache_path + ".%d.tmp" % os.getpid()
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, cache_path)
+
+
+def _element_from_header(header):
+    # PAW xml
+    match = re.search(r'<atom\s+symbol="([A-Za-z]{1,2})"', header)
+    if match:
+        return match.group(1).capitalize()
+    # UPF
+    match = re.search(r'element="\s*([A-Za-z]{1,2})\s*"', header)
+    if match:
+        return match.group(1).capitalize()
+    # abinit formats: second line is 'zatom, zion, pspdat'
+    lines = header.splitlines()
+    if len(lines) > 1 and "zatom" in lines[1]:
+        try:
+            return znucl_to_symbol(lines[1].split()[0])
+        except ValueError:
+            return None
+    return None
+
+
+def _element_from_filename(filename):
+    # 01h.pspgth, 14si.pspnc, Si.psp8, Fe-sp.psp8, Fe.GGA_PBE-JTH.xml
+    match = re.match(r"(\d*)([A-Za-z]{0,2})", filename)
+    number, letters = match.groups()
+    if number:
+        try:
+            return znucl_to_symbol(number)
+        except ValueError:
+            return None
+    for n in (2, 1):
+        candidate = letters[:n].capitalize()
+        if len(candidate) == n and candidate in ELEMENTS:
+            return candidate
+    return None
+
+
+_INDEXES = {}
+
+
+def get_pseudo_index(directories=None, cache_path=None):
+    """Return the pseudos index of the given directories. It is built only
+    once per process. By default, the libraries and the cache path of the
+    user config are used.
+    """
+    if directories is None:
+        config = get_user_config()
+        directories = config.pseudos_dirs
+        if cache_path is None:
+            cache_path = config.pseudos_index
+    if isinstance(directories, str):
+        directories = (directories, )
+    key = (tuple(directories), cache_path)
+    if key not in _INDEXES:
+        _INDEXES[key] = PseudoIndex(directories, cache_path=cache_path)
+    return _INDEXES[key]
@@ -0,0 +1,273 @@
+from .base import BaseUtility
+from .hashing import canonical_variables, variables_hash
+from .output_parser import is_completed
+from .scheduler import get_scheduler
+import json
+import logging
+import numbers
+import os
+import sqlite3
+import time
+
+
+DEFAULT_REGISTRY = os.path.join(os.path.expanduser("~"), ".cache",
+                                "abilaunch", "registry.sqlite")
+# status of a calculation
+WRITTEN = "written"
+SUBMITTED = "submitted"
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+# status of unfinished submitted jobs
+PENDING = (SUBMITTED, QUEUED, RUNNING)
+# operators allowed on variables in queries
+OPERATORS = ("=", "!=", "<", "<=", ">", ">=")
+# number of job ids per scheduler status command
+STATUS_CHUNK = 500
+COLUMNS = ("workdir", "name", "sweep", "vars_hash", "job_id", "submitted",
+           "status", "output")
+
+
+class Registry(BaseUtility):
+    """Persistent SQLite registry of the calculations. Each calculation is
+    stored with its working directory, name, sweep, variables hash, job id,
+    submission time, status and output file. The numeric variables are
+    indexed such that calculations can be queried by value.
+    """
+    _loggername = "Registry"
+
+    def __init__(self, path=DEFAULT_REGISTRY, loglevel=logging.INFO):
+        """
+        Parameters
+        ----------
+        path : str, optional
+               Path of the registry database.
+        """
+        super().__init__(loglevel=loglevel)
+        self.path = os.path.abspath(os.path.expanduser(path))
+        dirname = os.path.dirname(self.path)
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        self._connect()
+
+    def __getstate__(self):
+        # connections cannot be sent to other processes
+        state = self.__dict__.copy()
+        del state["_connection"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._connect()
+
+    def __len__(self):
+        return self._connection.execute(
+                "SELECT COUNT(*) FROM calculations").fetchone()[0]
+
+    def register(self, workdir, name, abinit_variables, output, sweep=None,
+                 job_id=None, status=WRITTEN):
+        """Add (or replace) a calculation in the registry."""
+        self.register_many([{"workdir": workdir, "name": name,
+                             "abinit_variables": abinit_variables,
+                             "output": output, "sweep": sweep,
+                             "job_id": job_id, "status": status}])
+
+    def register_many(self, entries):
+        """Add (or replace) many calculations in a single transaction.
+        'entries' are dicts of the 'register' arguments.
+        """
+        calculations = []
+        variables = []
+        for entry in entries:
+            workdir = os.path.abspath(entry["workdir"])
+            abinit_variables = entry["abinit_variables"]
+            calculations.append(
+                    (workdir, entry["name"], entry.get("sweep", None),
+                     variables_hash(abinit_variables),
+                     canonical_variables(abinit_variables),
+                     entry.get("job_id", None),
+                     time.time() if entry.get("job_id", None) else None,
+                     entry.get("status", WRITTEN), entry["output"]))
+            variables += [(workdir, name, float(value))
+                          for name, value in abinit_variables.items()
+                          if _is_number(value)]
+        with self._connection:
+            self._connection.executemany(
+                    "DELETE FROM variables WHERE workdir = ?",
+                    ((c[0], ) for c in calculations))
+            self._connection.executemany(
+                    "INSERT OR REPLACE INTO calculations (workdir, name, "
+                    "sweep, vars_hash, variables, job_id, submitted, status,"
+                    " output) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    calculations)
+            self._connection.executemany(
+                    "INSERT INTO variables (workdir, name, value) "
+                    "VALUES (?, ?, ?)", variables)
+        self._logger.debug(f"{len(calculations)} calculations registered.")
+
+    def set_submitted(self, workdir, job_id):
+        """Record the submission of a calculation."""
+        with self._connection:
+            self._connection.execute(
+                    "UPDATE calculations SET job_id = ?, submitted = ?, "
+                    "status = ? WHERE workdir = ?",
+                    (job_id, time.time(), SUBMITTED,
+                     os.path.abspath(workdir)))
+
+    def set_status(self, workdir, status):
+        """Set the status of a calculation."""
+        self.set_statuses({workdir: status})
+
+    def set_statuses(self, statuses):
+        """Set the status of many calculations (dict workdir: status)."""
+        with self._connection:
+            self._connection.executemany(
+                    "UPDATE calculations SET status = ? WHERE workdir = ?",
+                    ((status, os.path.abspath(workdir))
+                     for workdir, status in statuses.items()))
+
+    def query(self, sweep=None, status=None, where=None):
+        """Return the calculations (as dicts) matching all the criteria.
+
+        Parameters
+        ----------
+        sweep : str, optional
+                The sweep (working directory of the MassLauncher).
+        status : str, list, optional
+                 One or many statuses.
+        where : dict, optional
+                Conditions on the numeric variables. Values are either a
+                value (equality) or an (operator, value) tuple, e.g.:
+                {"ecut": (">", 40), "nstep": 10}.
+        """
+        clauses, parameters = self._where(sweep, status)
+        for name, condition in (where or {}).items():
+            operator, value = "=", condition
+            if isinstance(condition, (list, tuple)):
+                operator, value = condition
+            if operator not in OPERATORS:
+                raise ValueError("operator must be one of %s." %
+                                 str(OPERATORS))
+            clauses.append("workdir IN (SELECT workdir FROM variables "
+                           f"WHERE name = ? AND value {operator} ?)")
+            parameters += [name, value]
+        sql = "SELECT %s FROM calculations" % ", ".join(COLUMNS)
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        rows = self._connection.execute(sql + " ORDER BY workdir",
+                                        parameters)
+        return [dict(zip(COLUMNS, row)) for row in rows]
+
+    def variables(self, workdir):
+        """Return the abinit variables of a calculation."""
+        row = self._connection.execute(
+                "SELECT variables FROM calculations WHERE workdir = ?",
+                (os.path.abspath(workdir), )).fetchone()
+        if row is None:
+            raise KeyError(workdir)
+        return json.loads(row[0])
+
+    def counts(self, sweep=None):
+        """Return a dict with the number of calculations per status."""
+        clauses, parameters = self._where(sweep, None)
+        sql = "SELECT status, COUNT(*) FROM calculations"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        return dict(self._connection.execute(sql + " GROUP BY status",
+                                             parameters))
+
+    def update_from_scheduler(self, scheduler=None, sweep=None,
+                              resource_estimator=None):
+        """Update the status of all unfinished submitted calculations from
+        the scheduler, in bulk. Jobs reported as ended are completed if
+        their output is complete and failed otherwise. Calculations whose
+        job state is unknown (not reported by the scheduler) are left
+        unchanged. Errors of the status command are raised. If a
+        ResourceEstimator is given, the completed runs are added to its
+        history (from their output files). Returns the number of updated
+        calculations.
+        """
+        scheduler = get_scheduler(scheduler)
+        rows = self.query(sweep=sweep, status=PENDING)
+        job_ids = sorted({row["job_id"] for row in rows if row["job_id"]})
+        states = {}
+        for i in range(0, len(job_ids), STATUS_CHUNK):
+            states.update(scheduler.status(job_ids[i:i + STATUS_CHUNK]))
+        statuses = {}
+        for row in rows:
+            state = states.get(row["job_id"], None)
+            if state == scheduler.QUEUED:
+                status = QUEUED
+            elif state == scheduler.RUNNING:
+                status = RUNNING
+            elif state == scheduler.DONE:
+                status = (COMPLETED if is_completed(row["output"])
+                          else FAILED)
+            else:
+                # unknown: only the scheduler says when a job has ended
+                continue
+            if status == row["status"]:
+                continue
+            statuses[row["workdir"]] = status
+            if status == COMPLETED and resource_estimator is not None:
+                resource_estimator.record_output(
+                        self.variables(row["workdir"]), None, row["output"])
+        self.set_statuses(statuses)
+        self._logger.debug(f"{len(statuses)} statuses updated.")
+        return len(statuses)
+
+    def update_from_outputs(self, sweep=None):
+        """Mark as completed all the calculations whose output file is
+        complete. Returns the number of updated calculations.
+        """
+        rows = self.query(sweep=sweep,
+                          status=(WRITTEN, SUBMITTED, QUEUED, RUNNING,
+                                  FAILED))
+        statuses = {row["workdir"]: COMPLETED for row in rows
+                    if is_completed(row["output"])}
+        self.set_statuses(statuses)
+        return len(statuses)
+
+    def close(self):
+        self._connection.close()
+
+    def _where(self, sweep, status):
+        clauses = []
+        parameters = []
+        if sweep is not None:
+            clauses.append("sweep = ?")
+            parameters.append(os.path.abspath(sweep))
+        if status is not None:
+            if isinstance(status, str):
+                status = (status, )
+            clauses.append("status IN (%s)" % ", ".join("?" * len(status)))
+            parameters += list(status)
+        return clauses, parameters
+
+    def _connect(self):
+        self._connection = sqlite3.connect(self.path, timeout=30)
+        with self._connection:
+            self._connection.executescript(
+                    "CREATE TABLE IF NOT EXISTS calculations ("
+                    " workdir TEXT PRIMARY KEY, name TEXT, sweep TEXT,"
+                    " vars_hash TEXT, variables TEXT, job_id TEXT,"
+                    " submitted REAL, status TEXT, output TEXT);"
+                    "CREATE INDEX IF NOT EXISTS calculations_sweep"
+                    " ON calculations (sweep, status);"
+                    "CREATE INDEX IF NOT EXISTS calculations_status"
+                    " ON calculations (status);"
+                    "CREATE INDEX IF NOT EXISTS calculations_job_id"
+                    " ON calculations (job_id);"
+                    "CREATE INDEX IF NOT EXISTS calculations_vars_hash"
+                    " ON calculations (vars_hash);"
+                    "CREATE TABLE IF NOT EXISTS variables ("
+                    " workdir TEXT, name TEXT, value REAL);"
+                    "CREATE INDEX IF NOT EXISTS variables_value"
+                    " ON variables (name, value);"
+                    "CREATE INDEX IF NOT EXISTS variables_workdir"
+                    " ON variables (workdir);")
+
+
+def _is_number(value):
+    return isinstance(value, numbers.Real) and not isinstance(value, bool)
@@ -0,0 +1,200 @@
+from .base import BaseUtility
+from .hashing import variables_hash
+from .output_parser import parse_memory, parse_nproc, parse_walltime
+from .paral_tuner import _get_nkpt
+from collections import namedtuple
+import logging
+import math
+import os
+import sqlite3
+import time
+
+
+DEFAULT_HISTORY = os.path.join(os.path.expanduser("~"), ".cache",
+                               "abilaunch", "history.sqlite")
+# without history, the estimates use these rough constants: seconds per
+# unit of work per core, fixed memory and bytes per wavefunction
+# coefficient
+SECONDS_PER_WORK = 2e-9
+BASE_MEMORY = 200 * 2 ** 20
+BYTES_PER_COEFFICIENT = 48
+# abinit's default number of SCF steps
+DEFAULT_NSTEP = 30
+# volume used when the cell cannot be read (in bohr^3)
+DEFAULT_VOLUME = 1000
+
+
+ResourceEstimate = namedtuple("ResourceEstimate", ("runtime", "memory"))
+
+
+class ResourceEstimator(BaseUtility):
+    """Class that predicts the wall time and the memory of calculations
+    from their size (ecut, natom, nkpt, nband and the cell volume). The
+    predictions are power laws of the work (number of plane waves x bands x
+    k-points x SCF steps) fitted on a local history database of past runs
+    which grows with each recorded run. Without history, rough default
+    constants are used. A safety margin is added to all predictions.
+    """
+    _loggername = "ResourceEstimator"
+
+    def __init__(self, path=DEFAULT_HISTORY, margin=0.5,
+                 loglevel=logging.INFO):
+        """
+        Parameters
+        ----------
+        path : str, optional
+               Path of the history database.
+        margin : float, optional
+                 Relative safety margin added to the predictions (0.5 asks
+                 for 50% more than predicted).
+        """
+        super().__init__(loglevel=loglevel)
+        self.path = os.path.abspath(os.path.expanduser(path))
+        self.margin = margin
+        dirname = os.path.dirname(self.path)
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        self._connect()
+
+    def __getstate__(self):
+        # connections cannot be sent to other processes
+        state = self.__dict__.copy()
+        del state["_connection"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._connect()
+
+    def _connect(self):
+        self._connection = sqlite3.connect(self.path)
+        self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS runs ("
+                "id INTEGER PRIMARY KEY, vars_hash TEXT, work REAL, "
+                "coefficients REAL, ncores INTEGER, walltime REAL, "
+                "memory REAL, recorded REAL)")
+        self._connection.commit()
+
+    def __len__(self):
+        return self._connection.execute(
+                "SELECT COUNT(*) FROM runs").fetchone()[0]
+
+    def estimate(self, abinit_variables, ncores=1):
+        """Return the ResourceEstimate (runtime in seconds, memory in bytes)
+        of a calculation running on 'ncores' cores (MPI processes), margin
+        included. The memory is the total of all the processes.
+        """
+        work, coefficients = _features(abinit_variables)
+        rows = self._connection.execute(
+                "SELECT work, walltime * ncores FROM runs "
+                "WHERE walltime IS NOT NULL").fetchall()
+        core_seconds = _predict(rows, work, math.log(SECONDS_PER_WORK))
+        rows = self._connection.execute(
+                "SELECT coefficients, memory FROM runs "
+                "WHERE memory IS NOT NULL").fetchall()
+        memory = _predict(rows, coefficients, None)
+        if memory is None:
+            memory = BASE_MEMORY + BYTES_PER_COEFFICIENT * coefficients
+        factor = 1 + self.margin
+        # the history has the memory of each process (as printed by abinit)
+        return ResourceEstimate(core_seconds / max(ncores, 1) * factor,
+                                memory * max(ncores, 1) * factor)
+
+    def jobfile_kwargs(self, abinit_variables, ncores=1):
+        """Return the 'runtime' and 'memory' kwargs of the jobfile."""
+        runtime, memory = self.estimate(abinit_variables, ncores)
+        # at least one minute, rounded up to the minute
+        minutes = max(math.ceil(runtime / 60), 1)
+        return {"runtime": (minutes // 60, minutes % 60, 0),
+                "memory": "%dmb" % math.ceil(memory / 2 ** 20)}
+
+    def record(self, abinit_variables, ncores, walltime=None, memory=None):
+        """Add a run to the history.
+
+        Parameters
+        ----------
+        abinit_variables : dict
+                           The variables of the calculation.
+        ncores : int
+                 The number of cores used.
+        walltime : float, optional
+                   The wall time of the run (in seconds).
+        memory : float, optional
+                 The memory used by each process of the run (in bytes), as
+                 predicted by abinit in its output.
+        """
+        if walltime is None and memory is None:
+            return
+        work, coefficients = _features(abinit_variables)
+        self._connection.execute(
+                "INSERT INTO runs (vars_hash, work, coefficients, ncores, "
+                "walltime, memory, recorded) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (variables_hash(abinit_variables), work, coefficients,
+                 ncores, walltime, memory, time.time()))
+        self._connection.commit()
+        self._logger.debug(f"Run recorded: {walltime}s, {memory} bytes.")
+
+    def record_output(self, abinit_variables, ncores, output_path):
+        """Add a run to the history from its abinit output file. If
+        'ncores' is None, it is read from the output as well.
+        """
+        if ncores is None:
+            ncores = parse_nproc(output_path) or 1
+        self.record(abinit_variables, ncores,
+                    walltime=parse_walltime(output_path),
+                    memory=parse_memory(output_path))
+
+    def close(self):
+        self._connection.close()
+
+
+def _features(abinit_variables):
+    # (work, number of wavefunction coefficients) of a calculation
+    ecut = float(abinit_variables.get("ecut", 10))
+    natom = abinit_variables.get("natom", 1)
+    nband = abinit_variables.get("nband", None)
+    if isinstance(nband, (list, tuple)):
+        nband = max(nband)
+    if nband is None:
+        # rough guess, there is no way to know the number of electrons
+        nband = 4 * natom
+    nkpt = _get_nkpt(abinit_variables)
+    nstep = abinit_variables.get("nstep", DEFAULT_NSTEP)
+    # number of plane waves in the sphere of radius sqrt(2 * ecut)
+    npw = max(_volume(abinit_variables) * (2 * ecut) ** 1.5 /
+              (6 * math.pi ** 2), 2)
+    coefficients = nkpt * nband * npw
+    return coefficients * math.log2(npw) * nstep, coefficients
+
+
+def _volume(abinit_variables):
+    # volume of the cell in bohr^3
+    r = abinit_variables.get("rprim", ((1, 0, 0), (0, 1, 0), (0, 0, 1)))
+    try:
+        acell = [float(a) for a in abinit_variables.get("acell", (1, 1, 1))]
+        r = [[float(x) * a for x in row] for a, row in zip(acell, r)]
+    except (TypeError, ValueError):
+        # units given as strings
+        return DEFAULT_VOLUME
+    return abs(r[0][0] * (r[1][1] * r[2][2] - r[1][2] * r[2][1]) -
+               r[0][1] * (r[1][0] * r[2][2] - r[1][2] * r[2][0]) +
+               r[0][2] * (r[1][0] * r[2][1] - r[1][1] * r[2][0]))
+
+
+def _predict(rows, x, log_prior):
+    # fit log(y) = a + b log(x) on the (x, y) rows and predict y at x.
+    # With a single distinct x, only the scale is fitted (b = 1).
+    points = [(math.log(px), math.log(py)) for px, py in rows
+              if px > 0 and py > 0]
+    if not points:
+        return None if log_prior is None else math.exp(log_prior) * x
+    n = len(points)
+    mean_x = sum(p[0] for p in points) / n
+    mean_y = sum(p[1] for p in points) / n
+    var_x = sum((p[0] - mean_x) ** 2 for p in points)
+    slope = 1.0
+    if var_x > 1e-6:
+        slope = sum((p[0] - mean_x) * (p[1] - mean_y)
+                    for p in points) / var_x
+    intercept = mean_y - slope * mean_x
+    return math.exp(intercept + slope * math.log(x))
@@ -0,0 +1,180 @@
+from .base import BaseUtility
+from contextlib import contextmanager
+from timeit import default_timer as timer
+import fcntl
+import json
+import logging
+import os
+import re
+import shutil
+import time
+
+
+class ResultCache(BaseUtility):
+    """Content addressed store of calculation results. Results are stored
+    under the hash of their calculation (see hashing.calculation_hash) and
+    restored by hard links (or copies across filesystems). The store is
+    bounded in size: least recently used results are evicted first.
+    Many caches (e.g.: in other processes) can share the same directory:
+    the index is read again and updated under a file lock.
+    """
+    _loggername = "ResultCache"
+    _index_name = "index.json"
+    _lock_name = "index.lock"
+
+    def __init__(self, root, max_size=None, loglevel=logging.INFO):
+        """
+        Parameters
+        ----------
+        root : str
+               Directory of the cache.
+        max_size : int, optional
+                   Maximal size of the cache in bytes. Unbounded if None.
+        """
+        super().__init__(loglevel=loglevel)
+        self.root = os.path.abspath(os.path.expanduser(root))
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if not os.path.isdir(self.root):
+            os.makedirs(self.root)
+        self._index = self._load_index()
+
+    def __contains__(self, key):
+        return key in self._load_index()
+
+    def __len__(self):
+        return len(self._load_index())
+
+    @property
+    def size(self):
+        """Total size of the stored results in bytes."""
+        return sum(entry["size"] for entry in self._load_index().values())
+
+    def stats(self):
+        """Return a dict of the cache statistics."""
+        lookups = self.hits + self.misses
+        return {"hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self),
+                "size": self.size}
+
+    def restore(self, key, workdir, rootname):
+        """Restore the results stored under 'key' in 'workdir'. 'rootname'
+        is the name of the calculation: stored files are renamed
+        accordingly. Returns True on a hit and False on a miss.
+        """
+        with self._locked():
+            entry = self._index.get(key, None)
+            if entry is None:
+                self.misses += 1
+                return False
+            self.hits += 1
+            for relpath in entry["files"]:
+                source = os.path.join(self.root, key, relpath)
+                target = os.path.join(workdir,
+                                      _rename(relpath, entry["rootname"],
+                                              rootname))
+                _link_or_copy(source, target)
+            entry["atime"] = time.time()
+            self._save_index()
+        self._logger.debug(f"Results of {rootname} restored from cache.")
+        return True
+
+    def store(self, key, workdir, rootname, files):
+        """Store result files of a calculation under 'key'.
+
+        Parameters
+        ----------
+        key : str
+              The calculation hash.
+        workdir : str
+                  The calculation directory.
+        rootname : str
+                   The name of the calculation.
+        files : list
+                The result files (absolute or relative to workdir).
+        """
+        start = timer()
+        with self._locked():
+            if key in self._index:
+                return
+            relpaths = []
+            size = 0
+            for path in files:
+                path = os.path.join(workdir, path)
+                relpath = os.path.relpath(path, workdir)
+                _link_or_copy(path, os.path.join(self.root, key, relpath))
+                size += os.path.getsize(path)
+                relpaths.append(relpath)
+            self._index[key] = {"rootname": rootname, "files": relpaths,
+                                "size": size, "atime": time.time()}
+            self._evict()
+            self._save_index()
+        self._logger.debug(f"Results of {rootname} stored in cache"
+                           f" ({size} bytes) in {timer() - start:.3f}s.")
+
+    def _evict(self):
+        if self.max_size is None:
+            return
+        total = sum(entry["size"] for entry in self._index.values())
+        for key in sorted(self._index, key=lambda k: self._index[k]["atime"]):
+            if total <= self.max_size:
+                break
+            total -= self._index.pop(key)["size"]
+            shutil.rmtree(os.path.join(self.root, key), ignore_errors=True)
+            self.evictions += 1
+            self._logger.debug(f"Evicted {key} from cache.")
+
+    @contextmanager
+    def _locked(self):
+        # the index is read again such that the entries stored by other
+        # caches since are kept
+        with open(os.path.join(self.root, self._lock_name), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                self._index = self._load_index()
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _load_index(self):
+        path = os.path.join(self.root, self._index_name)
+        if not os.path.isfile(path):
+            return {}
+        with open(path, "r") as f:
+            return json.load(f)
+
+    def _save_index(self):
+        path = os.path.join(self.root, self._index_name)
+        tmp = path + ".%d.tmp" % os.getpid()
+        with open(tmp, "w") as f:
+            json.dump(self._index, f)
+        os.replace(tmp, path)
+
+
+def _rename(relpath, old_rootname, new_rootname):
+    # files are named after their calculation: odat_<root>_WFK, <root>.out.
+    # Only a whole leading rootname is replaced ('d' in 'odat_d_DEN' is not
+    # the one of 'odat').
+    dirname, basename = os.path.split(relpath)
+    pattern = r"^(odat_)?%s(?=[._]|$)" % re.escape(old_rootname)
+    basename = re.sub(pattern, lambda match: (match.group(1) or "") +
+                      new_rootname, basename, count=1)
+    return os.path.join(dirname, basename)
+
+
+def _link_or_copy(source, target):
+    dirname = os.path.dirname(target)
+    if not os.path.isdir(dirname):
+        os.makedirs(dirname)
+    if os.path.lexists(target):
+        os.remove(target)
+    try:
+        os.link(source, target)
+    except OSError:
+        # different filesystems
+        shutil.copy2(source, target)
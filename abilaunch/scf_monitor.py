@@ -0,0 +1,284 @@
+from .base import BaseUtility
+from .output_parser import COMPLETED_TAG
+from .scheduler import get_scheduler
+from collections import namedtuple
+import logging
+import os
+import signal
+import time
+
+
+# An SCF step as printed by abinit in its log and output files, e.g.:
+#      iter   Etot(hartree)      deltaE(h)  residm     vres2
+#  ETOT  3  -1.1034518296045    -5.701E-05 3.149E-10 2.035E-03
+# 'residual' is the density/potential residual (vres2 or nres2).
+ScfStep = namedtuple("ScfStep", ("iteration", "etotal", "delta_e",
+                                 "residm", "residual"))
+# suffix of the file where the reason of a stopped calculation is written
+STOPPED_SUFFIX = ".stopped"
+
+
+class ScfMonitor(BaseUtility):
+    """Class that follows the SCF cycles of many running calculations by
+    tailing their log (or output) files. Each poll only reads what was
+    appended since the previous one. Calculations matching a divergence
+    rule are reported once (see the 'matched' attribute) and can be
+    stopped: their job is cancelled (or their process terminated) and the
+    reason is written next to the watched file (with a '.stopped' suffix)
+    and kept in the 'stopped' attribute.
+    """
+    _loggername = "ScfMonitor"
+
+    def __init__(self, rules=None, stop=False, scheduler=None,
+                 max_unknown=3, loglevel=logging.INFO):
+        """
+        Parameters
+        ----------
+        rules : list, optional
+                The divergence rules. A rule is a callable taking the list
+                of ScfStep of the current SCF cycle (of the current dataset
+                and ionic step) and returning the reason to stop (or
+                None). By default: diverging(), oscillating() and
+                stagnating().
+        stop : bool, optional
+               If True, calculations matching a rule are stopped. Otherwise
+               they are only reported.
+        scheduler : str, Scheduler, optional
+                    The scheduler used to cancel submitted calculations.
+        max_unknown : int, optional
+                      Number of consecutive checks after which a submitted
+                      calculation whose job is unknown to the scheduler
+                      (e.g.: purged) is considered finished.
+        """
+        super().__init__(loglevel=loglevel)
+        if rules is None:
+            rules = [diverging(), oscillating(), stagnating()]
+        self.rules = list(rules)
+        self.stop = stop
+        self._scheduler = scheduler
+        self.max_unknown = max_unknown
+        # name: reason of the calculations matching a rule
+        self.matched = {}
+        # name: reason of the stopped calculations
+        self.stopped = {}
+        self._watched = {}
+
+    def __len__(self):
+        return len(self._watched)
+
+    def watch(self, path, name=None, job_id=None, process=None):
+        """Follow a calculation.
+
+        Parameters
+        ----------
+        path : str
+               The log (or output) file of the calculation. It may not
+               exist yet.
+        name : str, optional
+               The name of the calculation. By default, the path.
+        job_id : str, optional
+                 The job id of a submitted calculation, cancelled when
+                 stopped.
+        process : optional
+                  The process of a local calculation (anything with a
+                  'terminate' method, or a pid) terminated when stopped.
+        """
+        path = os.path.abspath(os.path.expanduser(path))
+        name = path if name is None else name
+        self._watched[name] = {"path": path, "job_id": job_id,
+                               "process": process, "offset": 0,
+                               "partial": b"", "steps": [],
+                               "finished": False, "unknown": 0}
+
+    def steps(self, name):
+        """Return the ScfStep of the current SCF cycle of a calculation."""
+        return list(self._watched[name]["steps"])
+
+    @property
+    def finished(self):
+        """True if all the calculations are completed or stopped."""
+        return all(calc["finished"] for calc in self._watched.values())
+
+    def poll(self):
+        """Read what was appended to all the watched files and apply the
+        rules. Returns the dict name: reason of the calculations which
+        matched a rule during this poll.
+        """
+        matched = {}
+        for name, calc in self._watched.items():
+            if calc["finished"] or not self._read(calc):
+                continue
+            if name in self.matched:
+                continue
+            reason = self._check(calc["steps"])
+            if reason is None:
+                continue
+            matched[name] = self.matched[name] = reason
+            self._logger.warning(f"{name}: {reason}.")
+            if self.stop:
+                self._stop(name, calc, reason)
+        return matched
+
+    def run(self, poll_interval=30, timeout=None):
+        """Poll until all calculations are completed, stopped or (for
+        submitted ones) ended, or until 'timeout' seconds. Returns the
+        'stopped' dict.
+        """
+        start = time.monotonic()
+        while True:
+            self.poll()
+            self._check_jobs()
+            if self.finished:
+                break
+            if timeout is not None and time.monotonic() - start > timeout:
+                break
+            time.sleep(poll_interval)
+        return self.stopped
+
+    def _check_jobs(self):
+        # submitted calculations ended without completing (e.g.: crashed)
+        # are finished as well
+        calcs = {calc["job_id"]: calc for calc in self._watched.values()
+                 if calc["job_id"] is not None and not calc["finished"]}
+        if not calcs:
+            return
+        scheduler = get_scheduler(self._scheduler)
+        for job_id, state in scheduler.status(list(calcs)).items():
+            calc = calcs[job_id]
+            if state == scheduler.DONE:
+                calc["finished"] = True
+                continue
+            if state != scheduler.UNKNOWN:
+                calc["unknown"] = 0
+                continue
+            # a job which stays unknown to the scheduler is not coming back
+            calc["unknown"] += 1
+            if calc["unknown"] >= self.max_unknown:
+                self._logger.warning(f"Job {job_id} is unknown to the"
+                                     " scheduler: considered finished.")
+                calc["finished"] = True
+
+    def _read(self, calc):
+        # parse the new lines of a watched file, returns True if new SCF
+        # steps were read
+        try:
+            with open(calc["path"], "rb") as f:
+                f.seek(calc["offset"])
+                content = f.read()
+        except OSError:
+            # not started yet
+            return False
+        calc["offset"] += len(content)
+        lines = (calc["partial"] + content).split(b"\n")
+        # the last line may still be written
+        calc["partial"] = lines.pop()
+        new_steps = False
+        for line in lines:
+            line = line.decode(errors="ignore")
+            if line.startswith(" ETOT"):
+                step = _parse_step(line)
+                if step is None:
+                    continue
+                steps = calc["steps"]
+                if steps and step.iteration <= steps[-1].iteration:
+                    # a new SCF cycle (e.g.: next ionic step)
+                    calc["steps"] = steps = []
+                steps.append(step)
+                new_steps = True
+            elif line.startswith(("== DATASET", "--- Iteration:")):
+                # new dataset or new ionic step
+                calc["steps"] = []
+            elif COMPLETED_TAG in line:
+                calc["finished"] = True
+        return new_steps
+
+    def _check(self, steps):
+        for rule in self.rules:
+            reason = rule(steps)
+            if reason is not None:
+                return reason
+        return None
+
+    def _stop(self, name, calc, reason):
+        if calc["job_id"] is not None:
+            get_scheduler(self._scheduler).cancel([calc["job_id"]])
+        elif calc["process"] is not None:
+            process = calc["process"]
+            if isinstance(process, int):
+                os.kill(process, signal.SIGTERM)
+            else:
+                process.terminate()
+        else:
+            self._logger.warning(f"{name} cannot be stopped: no job id or"
+                                 f" process given.")
+            return
+        calc["finished"] = True
+        self.stopped[name] = reason
+        with open(calc["path"] + STOPPED_SUFFIX, "w") as f:
+            f.write(reason + "\n")
+        self._logger.info(f"{name} stopped.")
+
+
+def diverging(factor=100, min_steps=3):
+    """Rule matching when the residual grew 'factor' times above the lowest
+    residual reached.
+    """
+    def rule(steps):
+        residuals = [s.residual for s in steps if s.residual is not None]
+        if len(residuals) < min_steps:
+            return None
+        lowest = min(residuals)
+        if lowest > 0 and residuals[-1] > factor * lowest:
+            return (f"diverging: residual {residuals[-1]:.3E} is more than"
+                    f" {factor} times the lowest ({lowest:.3E})")
+        return None
+    return rule
+
+
+def oscillating(window=8, decrease=0.5):
+    """Rule matching when the energy difference changed sign at each of the
+    last 'window' steps without its amplitude decreasing below 'decrease'
+    times its value at the start of the window.
+    """
+    def rule(steps):
+        deltas = [s.delta_e for s in steps[-window:]]
+        # the first step has no meaningful energy difference
+        if len(steps) <= window or 0 in deltas:
+            return None
+        if any((a > 0) == (b > 0) for a, b in zip(deltas, deltas[1:])):
+            return None
+        if abs(deltas[-1]) < decrease * abs(deltas[0]):
+            return None
+        return (f"oscillating: the energy difference changed sign at each"
+                f" of the last {window} steps")
+    return rule
+
+
+def stagnating(window=15, reduction=10):
+    """Rule matching when the residual was not reduced 'reduction' times
+    within the last 'window' steps.
+    """
+    def rule(steps):
+        residuals = [s.residual for s in steps[-window - 1:]
+                     if s.residual is not None]
+        if len(residuals) <= window:
+            return None
+        if residuals[-1] * reduction > residuals[0]:
+            return (f"stagnating: residual not reduced {reduction} times in"
+                    f" {window} steps")
+        return None
+    return rule
+
+
+def _parse_step(line):
+    parts = line.split()
+    try:
+        values = [float(part.replace("D", "E")) for part in parts[2:]]
+        iteration = int(parts[1])
+    except (ValueError, IndexError):
+        return None
+    if not values:
+        return None
+    values += [None] * (4 - len(values))
+    etotal, delta_e, residm, residual = values[:4]
+    return ScfStep(iteration, etotal, delta_e, residm, residual)
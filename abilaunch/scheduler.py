@@ -0,0 +1,450 @@
+from .base import BaseUtility
+from .config import get_user_config
+import abc
+import getpass
+import logging
+import os
+import subprocess
+
+
+class Scheduler(BaseUtility, abc.ABC):
+    """Base class for the interface with a batch scheduler (PBS, SLURM...).
+    Subclasses define the commands and the directives used by the scheduler.
+    """
+    _loggername = "Scheduler"
+    name = None
+    # command used to submit a script
+    submit_command = None
+    # prefix of the directives in a job script
+    directive = None
+    # environment variable containing the index of a job array item
+    array_index_variable = None
+    # command used to query the state of jobs
+    status_command = None
+    # command used to cancel jobs
+    cancel_command = None
+    # error message of the status command for jobs it does not know anymore
+    unknown_job_message = None
+    # job states reported by the scheduler -> QUEUED, RUNNING or DONE
+    states = {}
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    UNKNOWN = "unknown"
+
+    def __init__(self, submit_command=None, status_command=None,
+                 cancel_command=None, loglevel=logging.INFO):
+        """
+        Parameters
+        ----------
+        submit_command : str, optional
+                         Overrides the default submission command
+                         (e.g.: a full path to qsub).
+        status_command : str, optional
+                         Overrides the default command used to get the state
+                         of jobs (e.g.: a full path to qstat).
+        cancel_command : str, optional
+                         Overrides the default command used to cancel jobs
+                         (e.g.: a full path to qdel).
+        """
+        super().__init__(loglevel=loglevel)
+        if submit_command is not None:
+            self.submit_command = submit_command
+        if status_command is not None:
+            self.status_command = status_command
+        if cancel_command is not None:
+            self.cancel_command = cancel_command
+
+    def submit(self, script, cwd=None, options=None):
+        """Submit a job script and return its job id.
+
+        Parameters
+        ----------
+        script : str
+                 Path to the job script.
+        cwd : str, optional
+              Directory from which the script is submitted. By default, it
+              is the script's directory.
+        options : list, optional
+                  Other command line options given to the submit command.
+        """
+        command, cwd = self._get_submit_command(script, cwd, options)
+        result = subprocess.run(command, cwd=cwd,
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE,
+                                universal_newlines=True)
+        if result.returncode:
+            raise RuntimeError("Could not submit %s: %s" %
+                               (script, result.stderr.strip()))
+        return self._parse_job_id(result.stdout)
+
+    async def asubmit(self, script, cwd=None, options=None):
+        """Same as 'submit' but without blocking the event loop."""
+        command, cwd = self._get_submit_command(script, cwd, options)
+        returncode, stdout, stderr = await _run_async(command, cwd=cwd)
+        if returncode:
+            raise RuntimeError("Could not submit %s: %s" %
+                               (script, stderr.strip()))
+        return self._parse_job_id(stdout)
+
+    def status(self, job_ids):
+        """Return a dict mapping each job id to its state (Scheduler.QUEUED,
+        RUNNING, DONE or UNKNOWN). A job is DONE only if the scheduler
+        reports it as ended or purged. Jobs it does not report at all are
+        UNKNOWN. Raises a RuntimeError if the status command fails.
+        """
+        if not job_ids:
+            return {}
+        result = subprocess.run(self._get_status_command(job_ids),
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE,
+                                universal_newlines=True)
+        return self._get_states(job_ids, result.returncode, result.stdout,
+                                result.stderr)
+
+    def user_jobs(self, user=None):
+        """Return a dict mapping the (short) id of each unfinished job
+        (queued or running) of a user (by default, the current one) to its
+        state.
+        """
+        if user is None:
+            user = getpass.getuser()
+        result = subprocess.run(self._get_user_status_command(user),
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE,
+                                universal_newlines=True)
+        if result.returncode:
+            raise RuntimeError("Could not get the jobs of %s: %s" %
+                               (user, result.stderr.strip()))
+        states = {job_id: self.states.get(state, self.DONE)
+                  for job_id, state
+                  in self._parse_user_status(result.stdout).items()}
+        return {job_id: state for job_id, state in states.items()
+                if state != self.DONE}
+
+    def cancel(self, job_ids):
+        """Cancel jobs (queued or running)."""
+        if not job_ids:
+            return
+        command = self.cancel_command.split() + list(job_ids)
+        self._logger.debug("Cancelling: %s" % " ".join(command))
+        result = subprocess.run(command,
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE,
+                                universal_newlines=True)
+        if result.returncode:
+            raise RuntimeError("Could not cancel %s: %s" %
+                               (" ".join(job_ids), result.stderr.strip()))
+
+    async def astatus(self, job_ids):
+        """Same as 'status' but without blocking the event loop."""
+        if not job_ids:
+            return {}
+        returncode, stdout, stderr = await _run_async(
+                self._get_status_command(job_ids))
+        return self._get_states(job_ids, returncode, stdout, stderr)
+
+    def _get_submit_command(self, script, cwd, options):
+        script = os.path.abspath(script)
+        if cwd is None:
+            cwd = os.path.dirname(script)
+        command = self.submit_command.split()
+        if options is not None:
+            command += list(options)
+        command.append(script)
+        self._logger.debug("Submitting: %s" % " ".join(command))
+        return command, cwd
+
+    def _get_states(self, job_ids, returncode, stdout, stderr):
+        # the status command fails if some jobs are unknown (e.g.: finished
+        # and purged). Any other failure is raised such that jobs are never
+        # taken as finished because the scheduler could not be reached.
+        errors = [line for line in stderr.splitlines() if line.strip()]
+        if returncode and (not errors or
+                           not all(self.unknown_job_message in line
+                                   for line in errors)):
+            raise RuntimeError("Could not get the state of jobs %s: %s" %
+                               (" ".join(job_ids), stderr.strip()))
+        reported = self._parse_status(stdout)
+        missing = {_short_id(job_id) for job_id in job_ids} - set(reported)
+        purged = self._parse_unknown_jobs(errors, missing)
+        states = {}
+        for job_id in job_ids:
+            short_id = _short_id(job_id)
+            if short_id in reported:
+                states[job_id] = self.states.get(reported[short_id],
+                                                 self.UNKNOWN)
+            elif short_id in purged:
+                states[job_id] = self.DONE
+            else:
+                states[job_id] = self.UNKNOWN
+        return states
+
+    def header_lines(self, jobname=None, nodes=None, ppn=None, runtime=None,
+                     memory=None):
+        """Return the directives requesting the given resources."""
+        lines = []
+        if jobname is not None:
+            lines.append(self._jobname_directive(jobname))
+        if runtime is not None:
+            lines.append(self._runtime_directive(self._runtime(runtime)))
+        if nodes is not None and ppn is not None:
+            lines.append(self._nodes_directive(nodes, ppn))
+        if memory is not None:
+            lines.append(self._memory_directive(memory))
+        return lines
+
+    def dependency_options(self, job_ids):
+        """Return the submit command options such that a job only starts
+        once all the given jobs ended successfully.
+        """
+        job_ids = [job_id for job_id in job_ids if job_id is not None]
+        if not job_ids:
+            return []
+        return self._dependency_options("afterok:" + ":".join(job_ids))
+
+    def array_directive(self, length, max_running=None):
+        """Return the directive defining a job array of 'length' items
+        indexed from 0. 'max_running' limits the number of items running
+        at the same time.
+        """
+        indices = "0-%d" % (length - 1)
+        if max_running is not None:
+            indices += "%%%d" % max_running
+        return self._array_directive(indices)
+
+    def _runtime(self, runtime):
+        # same formats as abipy: hours or a (hours, min, sec) triplet
+        if isinstance(runtime, int):
+            runtime = (runtime, 0, 0)
+        if isinstance(runtime, str):
+            return runtime
+        return "{0}:{1:02d}:{2:02d}".format(*runtime)
+
+    @abc.abstractmethod
+    def _parse_job_id(self, stdout):
+        """Return the job id printed by the submit command."""
+
+    @abc.abstractmethod
+    def _get_status_command(self, job_ids):
+        """Return the status command of the given jobs."""
+
+    @abc.abstractmethod
+    def _parse_status(self, stdout):
+        """Return a dict: short job id -> scheduler state."""
+
+    def _parse_unknown_jobs(self, errors, missing):
+        # return the short ids of the jobs (among 'missing', the ones not
+        # listed) that the status command reports as unknown in its error
+        # lines
+        return set()
+
+    @abc.abstractmethod
+    def _get_user_status_command(self, user):
+        """Return the status command of all the jobs of a user."""
+
+    @abc.abstractmethod
+    def _parse_user_status(self, stdout):
+        """Return a dict: short job id -> scheduler state."""
+
+    @abc.abstractmethod
+    def _jobname_directive(self, jobname):
+        """Return the directive setting the job name."""
+
+    @abc.abstractmethod
+    def _runtime_directive(self, runtime):
+        """Return the directive requesting the runtime."""
+
+    @abc.abstractmethod
+    def _nodes_directive(self, nodes, ppn):
+        """Return the directives requesting the nodes and cores."""
+
+    @abc.abstractmethod
+    def _memory_directive(self, memory):
+        """Return the directive requesting the memory."""
+
+    @abc.abstractmethod
+    def _array_directive(self, indices):
+        """Return the directive of a job array."""
+
+    @abc.abstractmethod
+    def _dependency_options(self, dependency):
+        """Return the submit command options of a dependency."""
+
+
+class PBSScheduler(Scheduler):
+    """Interface with PBS/Torque (qsub)."""
+    name = "pbs"
+    submit_command = "qsub"
+    directive = "#PBS"
+    array_index_variable = "PBS_ARRAYID"
+    status_command = "qstat"
+    cancel_command = "qdel"
+    unknown_job_message = "Unknown Job Id"
+    states = {"Q": Scheduler.QUEUED, "H": Scheduler.QUEUED,
+              "W": Scheduler.QUEUED, "T": Scheduler.QUEUED,
+              "R": Scheduler.RUNNING, "E": Scheduler.RUNNING,
+              "C": Scheduler.DONE, "F": Scheduler.DONE}
+
+    def _parse_job_id(self, stdout):
+        # qsub prints the job id: '1234.server' or '1234[].server'
+        return stdout.strip()
+
+    def _get_status_command(self, job_ids):
+        return self.status_command.split() + list(job_ids)
+
+    def _parse_status(self, stdout):
+        # Job ID     Name     User     Time Use S Queue
+        # ---------- -------- -------- -------- - -----
+        # 1234.serv  name     user     00:00:01 R batch
+        reported = {}
+        for line in stdout.splitlines():
+            parts = line.split()
+            if len(parts) < 6 or parts[0].startswith(("Job", "---")):
+                continue
+            reported[_short_id(parts[0])] = parts[4]
+        return reported
+
+    def _parse_unknown_jobs(self, errors, missing):
+        # qstat: Unknown Job Id 1234.server
+        return {_short_id(line.split()[-1]) for line in errors
+                if self.unknown_job_message in line}
+
+    def _get_user_status_command(self, user):
+        return self.status_command.split() + ["-u", user]
+
+    def _parse_user_status(self, stdout):
+        # server:
+        #                                               Req'd  Req'd   Elap
+        # Job ID   Username Queue Jobname SessID NDS TSK Memory Time  S Time
+        # -------- -------- ----- ------- ------ --- --- ------ ----- - ----
+        # 1234.ser user     batch name    5678   1   8   --     01:00 R 00:10
+        reported = {}
+        for line in stdout.splitlines():
+            parts = line.split()
+            if len(parts) < 2 or not parts[0][:1].isdigit():
+                continue
+            reported[_short_id(parts[0])] = parts[-2]
+        return reported
+
+    def _jobname_directive(self, jobname):
+        return f"{self.directive} -N {jobname}"
+
+    def _runtime_directive(self, runtime):
+        return f"{self.directive} -l walltime={runtime}"
+
+    def _nodes_directive(self, nodes, ppn):
+        return f"{self.directive} -l nodes={nodes}:ppn={ppn}"
+
+    def _memory_directive(self, memory):
+        return f"{self.directive} -l mem={memory}"
+
+    def _array_directive(self, indices):
+        return f"{self.directive} -t {indices}"
+
+    def _dependency_options(self, dependency):
+        return ["-W", f"depend={dependency}"]
+
+
+class SlurmScheduler(Scheduler):
+    """Interface with SLURM (sbatch)."""
+    name = "slurm"
+    submit_command = "sbatch"
+    directive = "#SBATCH"
+    array_index_variable = "SLURM_ARRAY_TASK_ID"
+    status_command = "squeue"
+    cancel_command = "scancel"
+    unknown_job_message = "Invalid job id specified"
+    states = {"PD": Scheduler.QUEUED, "CF": Scheduler.QUEUED,
+              "S": Scheduler.QUEUED, "RQ": Scheduler.QUEUED,
+              "R": Scheduler.RUNNING, "CG": Scheduler.RUNNING,
+              "CD": Scheduler.DONE, "F": Scheduler.DONE,
+              "CA": Scheduler.DONE, "TO": Scheduler.DONE,
+              "NF": Scheduler.DONE, "PR": Scheduler.DONE,
+              "BF": Scheduler.DONE, "DL": Scheduler.DONE,
+              "OOM": Scheduler.DONE}
+
+    def _parse_job_id(self, stdout):
+        # sbatch prints: 'Submitted batch job 1234'
+        return stdout.split()[-1]
+
+    def _get_status_command(self, job_ids):
+        # all states: the recently ended jobs are reported as well
+        return self.status_command.split() + ["-h", "-o", "%i %t", "-t",
+                                              "all", "-j", ",".join(job_ids)]
+
+    def _parse_status(self, stdout):
+        # '1234 R' lines
+        reported = {}
+        for line in stdout.splitlines():
+            parts = line.split()
+            if len(parts) == 2:
+                reported[_short_id(parts[0])] = parts[1]
+        return reported
+
+    def _parse_unknown_jobs(self, errors, missing):
+        # 'slurm_load_jobs error: Invalid job id specified' does not name
+        # the job: squeue only fails when none of the jobs is known, and
+        # otherwise omits the unknown ones
+        if any(self.unknown_job_message in line for line in errors):
+            return set(missing)
+        return set()
+
+    def _get_user_status_command(self, user):
+        return self.status_command.split() + ["-h", "-o", "%i %t", "-u",
+                                              user]
+
+    def _parse_user_status(self, stdout):
+        return self._parse_status(stdout)
+
+    def _jobname_directive(self, jobname):
+        return f"{self.directive} --job-name={jobname}"
+
+    def _runtime_directive(self, runtime):
+        return f"{self.directive} --time={runtime}"
+
+    def _nodes_directive(self, nodes, ppn):
+        return (f"{self.directive} --nodes={nodes}\n"
+                f"{self.directive} --ntasks-per-node={ppn}")
+
+    def _memory_directive(self, memory):
+        return f"{self.directive} --mem={memory}"
+
+    def _array_directive(self, indices):
+        return f"{self.directive} --array={indices}"
+
+    def _dependency_options(self, dependency):
+        return [f"--dependency={dependency}"]
+
+
+def _short_id(job_id):
+    # '1234.server' and '1234.serv' (truncated by qstat) are the same job
+    return job_id.split(".")[0]
+
+
+async def _run_async(command, cwd=None):
+    import asyncio
+    process = await asyncio.create_subprocess_exec(
+            *command, cwd=cwd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE)
+    stdout, stderr = await process.communicate()
+    return process.returncode, stdout.decode(), stderr.decode()
+
+
+SCHEDULERS = {cls.name: cls for cls in (PBSScheduler, SlurmScheduler)}
+
+
+def get_scheduler(name=None, **kwargs):
+    """Return a scheduler instance from its name ('pbs' or 'slurm'). By
+    default, the scheduler of the user config is used.
+    """
+    if isinstance(name, Scheduler):
+        return name
+    if name is None:
+        name = get_user_config().scheduler
+    if name.lower() not in SCHEDULERS:
+        raise ValueError("Unknown scheduler %s. Choose from %s." %
+                         (name, str(tuple(SCHEDULERS))))
+    return SCHEDULERS[name.lower()](**kwargs)
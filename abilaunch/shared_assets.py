@@ -0,0 +1,92 @@
+from .base import BaseUtility
+import filecmp
+import logging
+import os
+
+
+class SharedAssets(BaseUtility):
+    """Directory where the files used by many calculations of a sweep
+    (pseudos and files to link) are staged once. Files are staged by hard
+    link (or by symbolic link when on another filesystem) such that their
+    content is never duplicated, and calculations refer to the staged
+    files.
+    """
+    _loggername = "SharedAssets"
+    _links = ("hardlink", "symlink")
+
+    def __init__(self, root, link="hardlink", loglevel=logging.INFO):
+        """
+        Parameters
+        ----------
+        root : str
+               Directory where the files are staged.
+        link : str, optional
+               How files are staged: 'hardlink' (default) or 'symlink'.
+        """
+        super().__init__(loglevel=loglevel)
+        if link not in self._links:
+            raise ValueError("link must be one of %s." % str(self._links))
+        self.root = os.path.abspath(root)
+        self.link = link
+        # source realpath -> [staged path, size, number of references]
+        self._assets = {}
+
+    def share(self, path, kind="data"):
+        """Stage a file (if not already done) and return the path of the
+        staged file. Files of the same kind are staged in the same
+        directory ('pseudos' or 'data').
+        """
+        source = os.path.realpath(os.path.expanduser(path))
+        asset = self._assets.get(source, None)
+        if asset is None:
+            if not os.path.isfile(source):
+                raise FileNotFoundError("File to share not found: %s" % path)
+            staged = os.path.join(self.root, kind, os.path.basename(source))
+            self._stage(source, staged)
+            asset = [staged, os.path.getsize(source), 0]
+            self._assets[source] = asset
+        asset[2] += 1
+        return asset[0]
+
+    def report(self):
+        """Return a dict with the number of staged files, of references to
+        them, of hard and symbolic links among them, their total size and
+        the bytes saved compared to a copy per reference (the staged file
+        itself being the one copy kept).
+        """
+        assets = self._assets.values()
+        symlinks = sum(1 for a in assets if os.path.islink(a[0]))
+        return {"assets": len(assets),
+                "references": sum(a[2] for a in assets),
+                "hardlinks": len(assets) - symlinks,
+                "symlinks": symlinks,
+                "bytes": sum(a[1] for a in assets),
+                "bytes_saved": sum(a[1] * (a[2] - 1) for a in assets)}
+
+    def _stage(self, source, staged):
+        if os.path.lexists(staged):
+            if os.path.exists(staged) and os.path.samefile(source, staged):
+                # already staged (e.g.: by a previous sweep)
+                return
+            if any(asset[0] == staged for asset in self._assets.values()):
+                raise ValueError("Cannot share %s: another file named %s is"
+                                 " already shared." %
+                                 (source, os.path.basename(staged)))
+            if os.path.exists(staged) and filecmp.cmp(source, staged,
+                                                      shallow=False):
+                # same content (e.g.: source copied again since)
+                return
+            # staged by a previous sweep from a source which changed since
+            self._logger.debug(f"{staged} is outdated, staging {source}.")
+            os.remove(staged)
+        dirname = os.path.dirname(staged)
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        if self.link == "hardlink":
+            try:
+                os.link(source, staged)
+                return
+            except OSError:
+                self._logger.debug(f"Cannot hard link {source}, using a "
+                                   f"symbolic link.")
+        os.symlink(source, staged)
@@ -0,0 +1,162 @@
+from .base import BaseUtility
+from .input_renderer import InputRenderer
+from .instrumentation import Instrumentation
+from .launcher import Launcher
+from .result_cache import ResultCache
+from collections.abc import Iterator
+from itertools import repeat, zip_longest
+import logging
+import os
+import sys
+
+
+class StreamingMassLauncher(BaseUtility):
+    """Same as the MassLauncher but the calculations are given as iterables
+    (e.g.: generators) which are never materialized. Each calculation is
+    built, and optionally run or submitted, before the next one is read.
+    Only a lightweight CalculationHandle is kept for each calculation.
+    """
+    _loggername = "StreamingMassLauncher"
+
+    def __init__(self,
+                 workdir,
+                 common_pseudos,
+                 input_names,
+                 base_variables,
+                 specific_variables,
+                 specific_pseudos=None,
+                 loglevel=logging.INFO,
+                 jobnames=None,
+                 to_link=None,
+                 submit=False,
+                 instrumentation=None,
+                 registry=None, **kwargs):
+        """
+        Parameters
+        ----------
+        workdir : str
+                  Working directory where all launchers will be launched.
+        common_pseudos : list
+                         List of the common pseudos for each calculation.
+                         Can be a single string.
+        input_names : iterable
+                      The names of the calculations. They will be used to
+                      name the subdirectory.
+        base_variables : dict
+                         The abinit variables used in each calculations.
+        specific_variables : iterable
+                             The dictionaries of the specific variables for
+                             each calculations.
+        specific_pseudos : iterable, optional
+                           The list of pseudos specifc to each calculation.
+        to_link : str, iterable, optional
+                  A file to link to each calculation or one file (or list
+                  of files) per calculation.
+        loglevel : int, optional
+                   Sets the logging level.
+        jobnames : iterable, optional
+                   The jobname of each job.
+        submit : bool, optional
+                 If True, each calculation is submitted as soon as it is
+                 written.
+        instrumentation : Instrumentation, optional
+                          Aggregates the duration of each phase of all the
+                          calculations. A new one is created by default and
+                          is available as the 'instrumentation' attribute.
+        registry : Registry, str, optional
+                   A registry (or the path of its database) where each
+                   calculation is recorded as soon as it is written.
+        Other kwargs (like run and overwrite) are passed directly to each
+        sublauncher. Lists, tuples, arrays and iterators give one value per
+        calculation, other values are used for all calculations.
+        """
+        super().__init__(loglevel)
+        workdir = os.path.abspath(workdir)
+        self.workdir = workdir
+        if not os.path.exists(workdir):
+            os.mkdir(workdir)
+        if isinstance(common_pseudos, str):
+            common_pseudos = [common_pseudos]
+        common_pseudos = list(common_pseudos)
+        if instrumentation is None:
+            instrumentation = Instrumentation()
+        self.instrumentation = instrumentation
+        if isinstance(registry, str):
+            from .registry import Registry
+            registry = Registry(registry, loglevel=loglevel)
+        self.registry = registry
+        self._handles = []
+        if isinstance(kwargs.get("result_cache", None), str):
+            # a single ResultCache for all the calculations
+            kwargs["result_cache"] = ResultCache(kwargs["result_cache"],
+                                                 loglevel=loglevel)
+        # the base variables are formatted only once
+        renderer = InputRenderer(base_variables)
+        items = zip_longest(input_names, specific_variables,
+                            fillvalue=_MISSING)
+        per_item = zip(self._per_item(specific_pseudos, []),
+                       self._per_item(to_link, None),
+                       self._per_item(jobnames, None),
+                       self._per_item_kwargs(**kwargs))
+        for input_name, specifics in items:
+            try:
+                pseudos, to_link_here, jobname, kwargs_here = next(per_item)
+            except StopIteration:
+                input_name = _MISSING
+            if input_name is _MISSING or specifics is _MISSING:
+                raise ValueError("Not all args have the same length!")
+            if isinstance(pseudos, str):
+                pseudos = [pseudos]
+            if input_name.endswith(".in"):
+                input_name = input_name[:-3]
+            abinit_vars = base_variables.copy()
+            abinit_vars.update(specifics)
+            launcher = Launcher(os.path.join(workdir, input_name),
+                                common_pseudos + list(pseudos),
+                                input_name=input_name,
+                                abinit_variables=abinit_vars,
+                                to_link=to_link_here,
+                                loglevel=loglevel,
+                                jobname=jobname,
+                                instrumentation=instrumentation,
+                                input_renderer=renderer,
+                                **kwargs_here)
+            if registry is not None:
+                registry.register(**launcher.registry_entry(sweep=workdir))
+                launcher.registry = registry
+            if submit:
+                launcher.submit()
+            # release the launcher, only keep its handle
+            self._handles.append(launcher.handle())
+        self._logger.debug(f"{len(self._handles)} calculations launched.")
+
+    def __iter__(self):
+        return iter(self._handles)
+
+    def __len__(self):
+        return len(self._handles)
+
+    def _per_item(self, value, default):
+        # return an iterator giving the value of each calculation
+        if value is None:
+            return repeat(default)
+        if self._is_iterable(value):
+            return iter(value)
+        return repeat(value)
+
+    def _per_item_kwargs(self, **kwargs):
+        iterators = {k: self._per_item(v, None) for k, v in kwargs.items()}
+        while True:
+            try:
+                yield {k: next(v) for k, v in iterators.items()}
+            except StopIteration:
+                return
+
+    def _is_iterable(self, value):
+        types = (list, tuple, Iterator)
+        if "numpy" in sys.modules:
+            types += (sys.modules["numpy"].ndarray, )
+        return isinstance(value, types)
+
+
+_MISSING = object()
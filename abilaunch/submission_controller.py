@@ -0,0 +1,197 @@
+from .base import BaseUtility
+from .scheduler import get_scheduler
+from collections import deque
+import json
+import logging
+import os
+import time
+
+
+class SubmissionController(BaseUtility):
+    """Class that submits many job scripts while keeping at most 'max_jobs'
+    jobs of the user queued or running (e.g.: below the maximal number of
+    queued jobs of the site). The jobs of the user are counted with the
+    scheduler's status command before each round of submissions and the
+    remaining scripts are submitted as jobs end. When two submissions are
+    refused in a row, the scheduler is taken as saturated (e.g.: queue limit
+    reached anyway) and they are retried at the next round. A script
+    refused on its own (e.g.: invalid resources) is retried after the
+    others and given up after 'max_refusals' refusals (see the 'failed'
+    attribute). A refused script with no other script after it to tell
+    which case applies is retried at the next round without counting.
+
+    Each submission (or given up script) is appended to a progress file
+    (JSON lines) such that a controller created again with the same file
+    (e.g.: after a restart) only submits the scripts not handled yet.
+    """
+    _loggername = "SubmissionController"
+
+    def __init__(self, scripts, max_jobs, scheduler=None, progress=None,
+                 user=None, on_submitted=None, max_refusals=3,
+                 loglevel=logging.INFO):
+        """
+        Parameters
+        ----------
+        scripts : dict, list
+                  The job scripts to submit. Either a dict name: script or
+                  a list of scripts (named by their path).
+        max_jobs : int
+                   Maximal number of jobs of the user queued or running.
+        scheduler : str, Scheduler, optional
+                    The scheduler used to count the jobs and submit. Its
+                    status command can be overridden (see Scheduler).
+        progress : str, optional
+                   Path of the progress file. If None, the progress is not
+                   persisted.
+        user : str, optional
+               The user whose jobs are counted. By default, the current
+               one.
+        on_submitted : callable, optional
+                       Called with the name and the job id of each new
+                       submission.
+
+        max_refusals : int, optional
+                       Number of refusals of a script after which it is
+                       given up.
+        """
+        super().__init__(loglevel=loglevel)
+        if max_jobs < 1:
+            raise ValueError("max_jobs must be at least 1.")
+        if not isinstance(scripts, dict):
+            scripts = {script: script for script in scripts}
+        self.scripts = scripts
+        self.max_jobs = max_jobs
+        self.scheduler = get_scheduler(scheduler)
+        self.user = user
+        self.on_submitted = on_submitted
+        self.progress = None
+        if progress is not None:
+            self.progress = os.path.abspath(os.path.expanduser(progress))
+        self.max_refusals = max_refusals
+        # name: job id of the submitted scripts
+        self.job_ids = {}
+        # name: last error of the scripts given up
+        self.failed = {}
+        self._load()
+        self._refusals = {}
+        self._remaining = deque(name for name in scripts
+                                if name not in self.job_ids and
+                                name not in self.failed)
+        if self.job_ids or self.failed:
+            self._logger.info(f"Resuming: {len(self.job_ids)} scripts already"
+                              f" submitted, {len(self.failed)} given up,"
+                              f" {len(self._remaining)} left.")
+
+    @property
+    def remaining(self):
+        """The names of the scripts not submitted yet."""
+        return list(self._remaining)
+
+    @property
+    def finished(self):
+        """True if all the scripts are submitted (or given up)."""
+        return not self._remaining
+
+    def submit_available(self):
+        """Submit as many of the remaining scripts as there are free slots.
+        Returns the dict name: job id of the new submissions.
+        """
+        if not self._remaining:
+            return {}
+        active = len(self.scheduler.user_jobs(self.user))
+        submitted = {}
+        # the previous script if it was refused
+        refused = None
+        while self._remaining and active < self.max_jobs:
+            name = self._remaining.popleft()
+            try:
+                job_id = self.scheduler.submit(self.scripts[name])
+            except RuntimeError as e:
+                if refused is None:
+                    # the next script tells whether the scheduler refuses
+                    # this one or any submission
+                    refused = (name, e)
+                    continue
+                # backpressure from the scheduler: retried later
+                self._remaining.appendleft(name)
+                self._remaining.appendleft(refused[0])
+                refused = None
+                self._logger.warning(f"Submissions refused, retrying later:"
+                                     f" {e}")
+                break
+            if refused is not None:
+                self._refuse(*refused)
+                refused = None
+            active += 1
+            submitted[name] = self.job_ids[name] = job_id
+            self._save({"name": name, "job_id": job_id})
+            if self.on_submitted is not None:
+                self.on_submitted(name, job_id)
+        if refused is not None:
+            # no other script to compare with: the scheduler may refuse
+            # any submission, retried in the next round without counting
+            self._remaining.appendleft(refused[0])
+            self._logger.warning(f"Submission of {refused[0]} refused,"
+                                 f" retrying later: {refused[1]}")
+        if submitted:
+            self._logger.info(f"{len(submitted)} scripts submitted,"
+                              f" {len(self._remaining)} left.")
+        return submitted
+
+    def run(self, poll_interval=60, timeout=None):
+        """Submit all the scripts, waiting 'poll_interval' seconds between
+        two rounds, or until 'timeout' seconds. Returns the 'job_ids' dict.
+        """
+        start = time.monotonic()
+        while True:
+            self.submit_available()
+            if self.finished:
+                break
+            if timeout is not None and time.monotonic() - start > timeout:
+                self._logger.warning(f"Timeout: {len(self._remaining)}"
+                                     f" scripts not submitted.")
+                break
+            time.sleep(poll_interval)
+        return self.job_ids
+
+    def _refuse(self, name, error):
+        # the script itself is refused: retried after the others or given
+        # up
+        self._refusals[name] = self._refusals.get(name, 0) + 1
+        if self._refusals[name] < self.max_refusals:
+            self._logger.warning(f"Submission of {name} refused, retrying"
+                                 f" later: {error}")
+            self._remaining.append(name)
+            return
+        self._logger.error(f"Submission of {name} refused"
+                           f" {self._refusals[name]} times, giving up:"
+                           f" {error}")
+        self.failed[name] = str(error)
+        self._save({"name": name, "error": str(error)})
+
+    def _load(self):
+        # the submissions (and given up scripts) recorded in the progress
+        # file
+        if self.progress is None or not os.path.isfile(self.progress):
+            return
+        with open(self.progress) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # last line partially written before a crash
+                    continue
+                if entry["name"] not in self.scripts:
+                    continue
+                if "error" in entry:
+                    self.failed[entry["name"]] = entry["error"]
+                else:
+                    self.job_ids[entry["name"]] = entry["job_id"]
+
+    def _save(self, entry):
+        # appended right after the submission such that a restart never
+        # submits a script twice
+        if self.progress is None:
+            return
+        with open(self.progress, "a") as f:
+            f.write(json.dumps(entry) + "\n")
@@ -0,0 +1,240 @@
+from .base import BaseUtility
+from .launcher import Launcher
+from .output_parser import parse_etotal
+from .streaming import StreamingMassLauncher
+from itertools import product, tee
+import abc
+import logging
+import os
+
+
+# Declarative parameter sweeps. A sweep is built from axes (one abinit
+# variable and its values) combined with Product (grid), Zip and Nested.
+# Names and variables of each point are generated lazily:
+#
+#   sweep = Product(Axis("ecut", [10, 20, 30]),
+#                   Axis("ngkpt", [[2, 2, 2], [4, 4, 4]]))
+#   for name, variables in sweep:
+#       ...  # "ecut10_ngkpt2x2x2", {"ecut": 10, "ngkpt": [2, 2, 2]}
+
+
+class Sweep(abc.ABC):
+    """Base class of all sweeps. Iterating over a sweep yields the
+    (name, variables) of each of its points.
+    """
+
+    def __iter__(self):
+        for parts, variables in self._points():
+            yield "_".join(parts), variables
+
+    def __mul__(self, other):
+        return Product(self, other)
+
+    @abc.abstractmethod
+    def _points(self):
+        """Yield (list of name parts, dict of variables) per point."""
+
+    def launch(self, workdir, common_pseudos, base_variables, **kwargs):
+        """Write (and submit if submit=True) all the calculations of the
+        sweep. Points are streamed one by one to a StreamingMassLauncher
+        which is returned. Other kwargs are passed to it.
+        """
+        names, specifics = tee(iter(self))
+        return StreamingMassLauncher(workdir, common_pseudos,
+                                     (name for name, _ in names),
+                                     base_variables,
+                                     (var for _, var in specifics),
+                                     **kwargs)
+
+
+class Axis(Sweep):
+    """A single abinit variable and its values."""
+
+    def __init__(self, variable, values, label=None):
+        """
+        Parameters
+        ----------
+        variable : str
+                   The abinit variable name.
+        values : iterable
+                 The values of the variable.
+        label : str, optional
+                The prefix used in the calculation names. Defaults to the
+                variable name.
+        """
+        self.variable = variable
+        self.values = values
+        self.label = variable if label is None else label
+
+    def _points(self):
+        for value in self.values:
+            yield [self.label + _format(value)], {self.variable: value}
+
+
+class Product(Sweep):
+    """Grid of all the combinations of the points of many sweeps."""
+
+    def __init__(self, *sweeps):
+        self.sweeps = sweeps
+
+    def _points(self):
+        # materializing is needed for a product but it is done per sweep
+        # thus the memory scales with the sum, not the product, of sizes
+        for points in product(*(list(s._points()) for s in self.sweeps)):
+            yield _merge(points)
+
+
+class Zip(Sweep):
+    """Sweeps iterated together (one point of each per point)."""
+
+    def __init__(self, *sweeps):
+        self.sweeps = sweeps
+
+    def _points(self):
+        iterators = [s._points() for s in self.sweeps]
+        while True:
+            points = [next(it, None) for it in iterators]
+            if all(point is None for point in points):
+                return
+            if any(point is None for point in points):
+                raise ValueError("Zipped sweeps have different lengths!")
+            yield _merge(points)
+
+
+class Nested(Sweep):
+    """Inner sweep depending on each point of an outer sweep."""
+
+    def __init__(self, outer, inner):
+        """
+        Parameters
+        ----------
+        outer : Sweep
+                The outer sweep.
+        inner : Sweep, callable
+                The inner sweep or a function returning the inner sweep
+                from the variables of an outer point.
+        """
+        self.outer = outer
+        self.inner = inner
+
+    def _points(self):
+        for outer in self.outer._points():
+            inner = self.inner
+            if not isinstance(inner, Sweep):
+                inner = inner(outer[1])
+            for point in inner._points():
+                yield _merge((outer, point))
+
+
+class ConvergenceStudy(BaseUtility):
+    """Adaptive convergence study along one axis. The points of the axis
+    are run in order and the study stops as soon as the total energy
+    changes by less than the tolerance between consecutive points.
+    """
+    _loggername = "ConvergenceStudy"
+
+    def __init__(self, workdir, common_pseudos, base_variables, axis,
+                 tolerance, batch=1, observable=parse_etotal,
+                 loglevel=logging.INFO, **kwargs):
+        """
+        Parameters
+        ----------
+        workdir : str
+                  Directory where the calculations are written.
+        common_pseudos : list
+                         The pseudos of each calculation.
+        base_variables : dict
+                         The abinit variables common to all calculations.
+        axis : Sweep
+               The points to converge, in increasing order of precision.
+        tolerance : float
+                    Convergence criterion on the observable (Ha for the
+                    total energy).
+        batch : int, optional
+                Number of points run at the same time.
+        observable : callable, optional
+                     Function returning the observable from an output path.
+        Other kwargs are passed to each Launcher.
+        """
+        super().__init__(loglevel=loglevel)
+        self.workdir = os.path.abspath(workdir)
+        self.common_pseudos = common_pseudos
+        self.base_variables = base_variables
+        self.axis = axis
+        self.tolerance = tolerance
+        self.batch = batch
+        self.observable = observable
+        self.kwargs = kwargs
+        # list of (name, variables, observable) of the run points
+        self.results = []
+        self.converged = None
+
+    def run(self, submit=None, scheduler=None, poll_interval=30):
+        """Run the points until convergence. Returns the (name, variables)
+        of the first converged point or None if the axis is exhausted.
+        Arguments are the same as for Launcher.arun.
+        """
+        import asyncio
+        return asyncio.run(self.arun(submit=submit, scheduler=scheduler,
+                                     poll_interval=poll_interval))
+
+    async def arun(self, submit=None, scheduler=None, poll_interval=30):
+        """Awaitable version of 'run'."""
+        import asyncio
+        from .aio import JobWatcher
+        from .scheduler import get_scheduler
+        watcher = JobWatcher(get_scheduler(scheduler),
+                             poll_interval=poll_interval)
+        points = iter(self.axis)
+        while True:
+            batch = [p for _, p in zip(range(self.batch), points)]
+            if not batch:
+                self._logger.warning("Convergence not reached within "
+                                     f"{self.tolerance}.")
+                return None
+            launchers = [self._launcher(name, var) for name, var in batch]
+            await asyncio.gather(*(launcher.arun(submit=submit,
+                                                 watcher=watcher)
+                                   for launcher in launchers))
+            for (name, var), launcher in zip(batch, launchers):
+                value = self.observable(launcher.output_path)
+                if value is None:
+                    raise RuntimeError(f"No observable found for {name}.")
+                self._logger.info(f"{name}: {value}")
+                self.results.append((name, var, value))
+                if self._is_converged():
+                    self.converged = self.results[-2][:2]
+                    return self.converged
+
+    def _is_converged(self):
+        if len(self.results) < 2:
+            return False
+        return abs(self.results[-1][2] - self.results[-2][2]) < self.tolerance
+
+    def _launcher(self, name, variables):
+        abinit_variables = self.base_variables.copy()
+        abinit_variables.update(variables)
+        return Launcher(os.path.join(self.workdir, name),
+                        self.common_pseudos,
+                        input_name=name,
+                        abinit_variables=abinit_variables,
+                        loglevel=self._logger.level,
+                        **self.kwargs)
+
+
+def _merge(points):
+    parts = []
+    variables = {}
+    for point_parts, point_variables in points:
+        parts += point_parts
+        variables.update(point_variables)
+    return parts, variables
+
+
+def _format(value):
+    # format a value to be used in a calculation name
+    if hasattr(value, "tolist"):
+        value = value.tolist()
+    if isinstance(value, (list, tuple)):
+        return "x".join(_format(v) for v in value)
+    return str(value)
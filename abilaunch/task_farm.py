@@ -0,0 +1,223 @@
+from .base import BaseUtility
+from .local_executor import LocalExecutor, LocalJob
+from .scheduler import get_scheduler
+import argparse
+import json
+import logging
+import os
+import sys
+
+
+class TaskFarm(BaseUtility):
+    """Class that writes and submits a single scheduler job running many
+    calculations inside its allocation. The job script calls a dispatcher
+    (python -m abilaunch.task_farm) which runs the calculations within the
+    allocated cores: concurrently if they fit together, back-to-back
+    otherwise. The calculations are started without a host list, so a
+    bundle runs on a single node.
+    """
+    _loggername = "TaskFarm"
+
+    def __init__(self, path, jobs, ncores, scheduler=None, jobname=None,
+                 nodes=None, ppn=None, runtime=None, memory=None,
+                 lines_before=None, python=None, loglevel=logging.INFO):
+        """
+        Parameters
+        ----------
+        path : str
+               Path where the job script is written. The list of
+               calculations is written next to it with a '.json' suffix.
+        jobs : list
+               The LocalJob of each calculation (see Launcher.local_job).
+        ncores : int
+                 Number of cores of the allocation shared by the jobs.
+        scheduler : str, Scheduler, optional
+                    The scheduler ('pbs' or 'slurm'). By default, the one
+                    of the user config.
+        jobname, nodes, ppn, runtime, memory : optional
+                    Resources requested for the whole bundle. Only one
+                    node can be requested.
+        lines_before : list, optional
+                       Lines executed before the dispatcher (e.g.: module
+                       loads).
+        python : str, optional
+                 The python interpreter running the dispatcher. By default,
+                 the current one.
+        """
+        super().__init__(loglevel=loglevel)
+        if not len(jobs):
+            raise ValueError("No jobs given.")
+        self.path = os.path.abspath(os.path.expanduser(path))
+        self.manifest_path = os.path.splitext(self.path)[0] + ".json"
+        self.results_path = os.path.splitext(self.path)[0] + "_results.json"
+        self.jobs = list(jobs)
+        self.ncores = int(ncores)
+        if nodes is not None and int(nodes) > 1:
+            raise ValueError("A bundle runs on a single node but"
+                             f" {nodes} were requested.")
+        for job in self.jobs:
+            if job.ncores > self.ncores:
+                raise ValueError(f"{job.name} requires {job.ncores} cores"
+                                 f" but the bundle only has {self.ncores}.")
+        self.scheduler = get_scheduler(scheduler)
+        self.resources = {"jobname": jobname, "nodes": nodes, "ppn": ppn,
+                          "runtime": runtime, "memory": memory}
+        if lines_before is None:
+            lines_before = []
+        elif isinstance(lines_before, str):
+            lines_before = [lines_before]
+        self.lines_before = list(lines_before)
+        self.python = python if python is not None else sys.executable
+        self.job_id = None
+
+    def __len__(self):
+        return len(self.jobs)
+
+    def __str__(self):
+        lines = ["#!/bin/bash", ""]
+        lines += self.scheduler.header_lines(**self.resources)
+        lines.append("")
+        lines += self.lines_before
+        lines.append(f'"{self.python}" -m abilaunch.task_farm '
+                     f'"{self.manifest_path}"')
+        lines.append("")
+        return "\n".join(lines)
+
+    def manifest(self):
+        """Return the dict read by the dispatcher."""
+        return {"ncores": self.ncores,
+                "results": self.results_path,
+                "jobs": [{"name": job.name, "command": job.command,
+                          "workdir": job.workdir, "ncores": job.ncores}
+                         for job in self.jobs]}
+
+    def write(self):
+        """Write the job script and the list of calculations."""
+        dirname = os.path.dirname(self.path)
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        with open(self.manifest_path, "w") as f:
+            json.dump(self.manifest(), f, indent=1)
+        with open(self.path, "w") as f:
+            f.write(str(self))
+        self._logger.debug(f"Bundle of {len(self)} calculations written in"
+                           f" {self.path}.")
+
+    def submit(self):
+        """Write and submit the bundle. Returns the job id."""
+        self.write()
+        self.job_id = self.scheduler.submit(self.path)
+        self._logger.info(f"Bundle {self.job_id} submitted with"
+                          f" {len(self)} calculations.")
+        return self.job_id
+
+
+def make_bundles(jobs, ncores, bundle_size=None, runtimes=None,
+                 max_runtime=None):
+    """Split jobs into bundles. Returns a list of lists of job indices.
+
+    Parameters
+    ----------
+    jobs : list
+           The LocalJob to bundle.
+    ncores : int
+             Number of cores of each bundle.
+    bundle_size : int, optional
+                  Number of jobs per bundle.
+    runtimes : list, optional
+               If no bundle size is given, the estimated runtime (in
+               seconds) of each job. Bundles are then filled such that
+               their estimated runtime stays below 'max_runtime'.
+    max_runtime : float, optional
+                  The walltime (in seconds) of each bundle.
+    """
+    if bundle_size is not None:
+        return [list(range(i, min(i + bundle_size, len(jobs))))
+                for i in range(0, len(jobs), bundle_size)]
+    if runtimes is None or max_runtime is None:
+        raise ValueError("Either a bundle size or the runtimes and the"
+                         " max runtime must be given.")
+    if len(runtimes) != len(jobs):
+        raise ValueError("One runtime is needed per job.")
+    # longest jobs first, each one goes in the first bundle where it fits.
+    # The runtime of a bundle is estimated by simulating how the dispatcher
+    # runs its jobs: jobs which cannot share the cores run one after the
+    # other.
+    order = sorted(range(len(jobs)),
+                   key=lambda i: -runtimes[i] * jobs[i].ncores)
+    bundles = []
+    for i in order:
+        if jobs[i].ncores > ncores:
+            raise ValueError(f"{jobs[i].name} requires {jobs[i].ncores}"
+                             f" cores but the bundles only have {ncores}.")
+        if runtimes[i] > max_runtime:
+            raise ValueError(f"{jobs[i].name} is estimated to run longer"
+                             f" than the bundle walltime.")
+        for bundle in bundles:
+            candidate = sorted(bundle + [i])
+            if _makespan([jobs[j].ncores for j in candidate],
+                         [runtimes[j] for j in candidate],
+                         ncores) <= max_runtime:
+                bundle[:] = candidate
+                break
+        else:
+            bundles.append([i])
+    return bundles
+
+
+def _makespan(cores, runtimes, ncores):
+    # total runtime of jobs run by a LocalExecutor on 'ncores' cores: the
+    # biggest jobs first, every pending job which fits in the free cores
+    # is started and the others wait for running jobs to end
+    pending = sorted(range(len(cores)), key=lambda i: -cores[i])
+    running = []
+    free = ncores
+    now = 0
+    while pending:
+        for i in list(pending):
+            if cores[i] <= free:
+                pending.remove(i)
+                running.append((now + runtimes[i], cores[i]))
+                free -= cores[i]
+        # wait for the next running job to end
+        running.sort()
+        now, ended = running.pop(0)
+        free += ended
+    return max([now] + [end for end, _ in running])
+
+
+def runtime_to_seconds(runtime):
+    """Convert a runtime as given to the jobfiles (hours, (hours, min, sec)
+    or 'hh:mm:ss') to seconds.
+    """
+    if isinstance(runtime, (int, float)):
+        return runtime * 3600
+    if isinstance(runtime, str):
+        runtime = [int(part) for part in runtime.split(":")]
+    hours, minutes, seconds = runtime
+    return hours * 3600 + minutes * 60 + seconds
+
+
+def dispatch(manifest_path):
+    """Run all the jobs of a bundle manifest within its cores and write
+    their results. Returns the number of failed jobs.
+    """
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    jobs = [LocalJob(**job) for job in manifest["jobs"]]
+    results = LocalExecutor(manifest["ncores"]).run(jobs)
+    with open(manifest["results"], "w") as f:
+        json.dump([result._asdict() for result in results], f, indent=1)
+    return sum(1 for result in results if result.returncode)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+            description="Run the calculations of a bundle.")
+    parser.add_argument("manifest", help="The bundle's json file.")
+    args = parser.parse_args(argv)
+    return 1 if dispatch(args.manifest) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
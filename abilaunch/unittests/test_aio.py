@@ -0,0 +1,156 @@
+import asyncio
+import os
+import stat
+import tempfile
+import unittest
+from abilaunch.aio import CoreBudget, JobWatcher
+from abilaunch.scheduler import PBSScheduler, SlurmScheduler
+
+
+# fake qstat: lists the jobs written in the 'queue' file and logs its calls.
+# It fails if there is no 'queue' file (e.g.: server down).
+FAKE_QSTAT = """#!/bin/bash
+echo "$@" >> {calls}
+if [ ! -f {queue} ]; then
+    echo "qstat: cannot connect to server" >&2
+    exit 1
+fi
+echo "Job ID   Name  User  Time Use S Queue"
+echo "-------- ----- ----- -------- - -----"
+cat {queue}
+"""
+
+
+class TestAio(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.queue = os.path.join(self.tempdir.name, "queue")
+        self.calls = os.path.join(self.tempdir.name, "calls")
+        qstat = os.path.join(self.tempdir.name, "qstat")
+        with open(qstat, "w") as f:
+            f.write(FAKE_QSTAT.format(calls=self.calls, queue=self.queue))
+        os.chmod(qstat, os.stat(qstat).st_mode | stat.S_IEXEC)
+        self.scheduler = PBSScheduler(status_command=qstat)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+        del self.tempdir
+
+    def _set_queue(self, jobs):
+        with open(self.queue, "w") as f:
+            for job_id, state in jobs.items():
+                f.write(f"{job_id}.serv  name  user  00:00:00 {state} q\n")
+
+    def test_scheduler_status(self):
+        with self.assertRaises(RuntimeError):
+            self.scheduler.status(["1.server"])
+        self._set_queue({"1": "R", "2": "Q", "4": "C"})
+        states = self.scheduler.status(["1.server", "2.server", "3.server",
+                                        "4.server"])
+        self.assertEqual(states, {"1.server": "running",
+                                  "2.server": "queued",
+                                  "3.server": "unknown",
+                                  "4.server": "done"})
+        # jobs reported as unknown by qstat are purged
+        states = self.scheduler._get_states(
+                ["1.server", "3.server"], 153,
+                "1.serv  name  user  00:00:00 R q\n",
+                "qstat: Unknown Job Id 3.server\n")
+        self.assertEqual(states, {"1.server": "running",
+                                  "3.server": "done"})
+
+    def test_job_watcher(self):
+        self._set_queue({"1": "R", "2": "Q"})
+        output = os.path.join(self.tempdir.name, "calc.out")
+        watcher = JobWatcher(self.scheduler, poll_interval=0.05)
+        finished = []
+
+        async def wait(job_id, output_path=None):
+            await watcher.wait(job_id, output_path)
+            finished.append(job_id)
+
+        async def main():
+            tasks = [asyncio.ensure_future(wait("1.server")),
+                     asyncio.ensure_future(wait("2.server", output))]
+            await asyncio.sleep(0.2)
+            self.assertEqual(finished, [])
+            # job 1 ends and job 2 output is complete
+            self._set_queue({"1": "C", "2": "R"})
+            with open(output, "w") as f:
+                f.write(" Calculation completed.\n")
+            await asyncio.gather(*tasks)
+
+        asyncio.run(main())
+        self.assertEqual(sorted(finished), ["1.server", "2.server"])
+        # both jobs are polled with a single command
+        with open(self.calls) as f:
+            for line in f:
+                self.assertEqual(line.split(), ["1.server", "2.server"])
+
+    def test_unknown_jobs(self):
+        # squeue does not name the unknown jobs: it only fails if none of
+        # them is known
+        slurm = SlurmScheduler()
+        states = slurm._get_states(
+                ["1", "2"], 1, "",
+                "slurm_load_jobs error: Invalid job id specified\n")
+        self.assertEqual(states, {"1": "done", "2": "done"})
+        states = slurm._get_states(["1", "2"], 0, "1 R\n", "")
+        self.assertEqual(states, {"1": "running", "2": "unknown"})
+
+    def test_job_watcher_lost_job(self):
+        # the scheduler drops job 1 without reporting it as done
+        self._set_queue({"1": "R"})
+        watcher = JobWatcher(self.scheduler, poll_interval=0.01,
+                             max_unknown=3)
+
+        async def main():
+            task = asyncio.ensure_future(watcher.wait("1.server"))
+            await asyncio.sleep(0.05)
+            self.assertFalse(task.done())
+            self._set_queue({})
+            return await task
+
+        with self.assertLogs("JobWatcher", level="WARNING"):
+            self.assertEqual(asyncio.run(main()), None)
+        self.assertEqual(watcher._waiters, {})
+        self.assertEqual(watcher._unknown, {})
+
+    def test_job_watcher_failure(self):
+        # qstat keeps failing: the error is raised by all the waiters
+        watcher = JobWatcher(self.scheduler, poll_interval=0.01,
+                             max_failures=2)
+
+        async def main():
+            return await asyncio.gather(watcher.wait("1.server"),
+                                        watcher.wait("2.server"),
+                                        return_exceptions=True)
+
+        with self.assertLogs("JobWatcher", level="WARNING"):
+            errors = asyncio.run(main())
+        self.assertEqual(len(errors), 2)
+        for error in errors:
+            self.assertIsInstance(error, RuntimeError)
+        with open(self.calls) as f:
+            self.assertEqual(len(f.readlines()), 2)
+        self.assertEqual(watcher._waiters, {})
+
+    def test_core_budget(self):
+        running = []
+        peak = []
+
+        async def job(budget, ncores):
+            ncores = await budget.acquire(ncores)
+            running.append(ncores)
+            peak.append(sum(running))
+            await asyncio.sleep(0.01)
+            running.remove(ncores)
+            await budget.release(ncores)
+
+        async def main():
+            budget = CoreBudget(4)
+            await asyncio.gather(*[job(budget, n) for n in (2, 3, 1, 4, 8)])
+            self.assertEqual(budget.free, 4)
+
+        asyncio.run(main())
+        self.assertLessEqual(max(peak), 4)
@@ -0,0 +1,99 @@
+import math
+import os
+import tempfile
+import unittest
+from abilaunch import harvester
+from abilaunch.harvester import Harvester, parse_output
+
+
+OUTPUT = """== DATASET  1 ==================================================
+ ETOT  1  -1.0957516458120    -1.096E+00 1.039E-04 4.137E-01 1.839E-02
+ ETOT  2  -1.1033948239566    -7.643E-03 1.010E-08 4.052E-02 2.006E-02
+ ETOT  3  -1.1034518296045    -5.701E-05 3.149E-10 2.035E-03 2.154E-02
+ At SCF step    3, etot is converged :
+  for the second time, diff in etot=  5.701E-05 < toldfe=  1.000E-06
+ -outvars: echo values of variables after computation  --------
+            acell      1.0000000000E+01  1.0000000000E+01  1.0E+01 Bohr
+             ecut      {ecut}E+01 Hartree
+           etotal     {etotal}
+            fcart     -3.0000000000E-02 -4.0000000000E-02 -0.0000000000E+00
+                       3.0000000000E-02  4.0000000000E-02 -0.0000000000E+00
+           strten     -9.9135914749E-05 -1.6829097565E-05 -1.6829097565E-05
+                       0.0000000000E+00  0.0000000000E+00  0.0000000000E+00
+            typat      1  1
+================================================================================
+- Proc.   0 individual time (sec): cpu=          0.4  wall=          0.5
++Overall time at end (sec) : cpu=          0.4  wall=          0.5
+ Calculation completed.
+"""
+
+
+class TestHarvester(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.outputs = []
+        for i in range(3):
+            calcdir = os.path.join(self.tempdir.name, "calc%d" % i)
+            os.makedirs(calcdir)
+            path = os.path.join(calcdir, "calc%d.out" % i)
+            self._write(path, -1.1 - i)
+            self.outputs.append(path)
+        self.harvester = Harvester(os.path.join(self.tempdir.name, "table"),
+                                   workers=1)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+        del self.tempdir
+
+    def _write(self, path, etotal):
+        with open(path, "w") as f:
+            f.write(OUTPUT.format(etotal="%.10E" % etotal, ecut="1.0"))
+
+    def test_parse_output(self):
+        row = parse_output(self.outputs[0])
+        self.assertTrue(row["completed"])
+        self.assertTrue(row["converged"])
+        self.assertEqual(row["scf_steps"], 3)
+        self.assertAlmostEqual(row["etotal"], -1.1)
+        self.assertAlmostEqual(row["max_force"], 0.05)
+        self.assertAlmostEqual(row["stress"][0], -9.9135914749E-05)
+        self.assertEqual(row["cpu_time"], 0.4)
+        self.assertEqual(row["walltime"], 0.5)
+
+    def test_parse_incomplete_output(self):
+        with open(self.outputs[0], "w") as f:
+            f.write(OUTPUT.split(" -outvars")[0])
+        row = parse_output(self.outputs[0])
+        self.assertFalse(row["completed"])
+        self.assertTrue(math.isnan(row["etotal"]))
+
+    def test_harvest(self):
+        table = self.harvester.harvest(self.tempdir.name)
+        self.assertEqual(list(table["path"]), self.outputs)
+        self.assertEqual(self.harvester.parsed, 3)
+        self.assertTrue(all(table["completed"]))
+        self.assertEqual(table["stress"].shape, (3, 6))
+        self.assertAlmostEqual(table["etotal"][2], -3.1)
+        self.assertEqual(list(self.harvester.load()["path"]), self.outputs)
+
+    def test_harvest_changed_only(self):
+        self.harvester.harvest(self.outputs)
+        mtime = os.stat(self.outputs[1]).st_mtime_ns
+        self._write(self.outputs[1], -5.0)
+        # same size: only the mtime tells the file changed
+        os.utime(self.outputs[1], ns=(mtime + 10 ** 9, mtime + 10 ** 9))
+        table = self.harvester.harvest(self.outputs)
+        self.assertEqual(self.harvester.parsed, 1)
+        self.assertAlmostEqual(table["etotal"][1], -5.0)
+        self.assertAlmostEqual(table["etotal"][0], -1.1)
+
+    def test_harvest_parallel(self):
+        default = harvester.MIN_PARALLEL
+        harvester.MIN_PARALLEL = 1
+        try:
+            table = Harvester(self.harvester.path, workers=2).harvest(
+                    self.outputs)
+        finally:
+            harvester.MIN_PARALLEL = default
+        self.assertEqual(len(table["etotal"]), 3)
+        self.assertAlmostEqual(table["etotal"][1], -2.1)
@@ -0,0 +1,40 @@
+import subprocess
+import sys
+import unittest
+
+
+# heavy modules that should not be loaded by a plain 'import abilaunch'
+HEAVY_MODULES = ("abipy", "pymatgen", "matplotlib", "pandas", "numpy")
+# maximal cumulative import time of abilaunch (in seconds)
+MAX_IMPORT_TIME = 0.5
+
+
+class TestImportTime(unittest.TestCase):
+    def _run(self, code, *options):
+        return subprocess.run([sys.executable, *options, "-c", code],
+                              stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                              universal_newlines=True, check=True)
+
+    def test_no_heavy_imports(self):
+        code = ("import abilaunch, sys; "
+                "print(' '.join(sorted(sys.modules)))")
+        modules = self._run(code).stdout.split()
+        for heavy in HEAVY_MODULES:
+            self.assertNotIn(heavy, modules)
+
+    def test_config_not_read_on_import(self):
+        code = ("import abilaunch.config as c, abilaunch; "
+                "print(c._USER_CONFIG is None)")
+        self.assertEqual(self._run(code).stdout.strip(), "True")
+
+    def test_import_time(self):
+        # -X importtime prints: 'import time: self | cumulative | module'
+        stderr = self._run("import abilaunch", "-X", "importtime").stderr
+        for line in stderr.splitlines():
+            parts = [p.strip() for p in line.split("|")]
+            if len(parts) == 3 and parts[-1] == "abilaunch":
+                cumulative = int(parts[1]) * 1e-6
+                break
+        else:  # pragma: nocover
+            self.fail("Could not find abilaunch import time.")
+        self.assertLess(cumulative, MAX_IMPORT_TIME)
@@ -0,0 +1,59 @@
+import unittest
+from abilaunch.input_approver import BatchInputApprover, InputApprover
+
+
+base_vars = {"acell": (10, 10, 10),
+             "ntypat": 1,
+             "znucl": 1,
+             "natom": 2,
+             "typat": (1, 1),
+             "ecut": 10.0,
+             "nstep": 10,
+             "toldfe": 1.0e-6}
+specific_vars = [{"ecut": 5},
+                 {"tolwfr": 1e-10},
+                 {"iscf": -2},
+                 {"iscf": -3},
+                 {"npkpt": 8},
+                 {"npband": 2, "npfft": 20},
+                 {"ndtset": 2, "tolwfr": 1e-10}]
+
+
+class TestBatchInputApprover(unittest.TestCase):
+    def _compare(self, base, specifics, paral_params=None):
+        batch = BatchInputApprover(base, specifics, paral_params)
+        for i, specific in enumerate(specifics):
+            variables = base.copy()
+            variables.update(specific)
+            params = paral_params
+            if params is not None:
+                params = {k: v[i] if isinstance(v, list) else v
+                          for k, v in params.items()}
+            single = InputApprover(variables, params)
+            self.assertEqual(batch.valid[i], single.valid)
+            self.assertEqual(batch.errors.get(i, []), single.errors)
+        return batch
+
+    def test_same_as_single_approver(self):
+        batch = self._compare(base_vars, specific_vars[:-3])
+        self.assertEqual(list(batch.errors), [1, 2])
+
+    def test_missing_variables(self):
+        base = base_vars.copy()
+        base.pop("ecut")
+        batch = self._compare(base, [{"ecut": 5}, {}])
+        self.assertEqual(list(batch.errors), [1])
+
+    def test_paral_params(self):
+        paral_params = {"nodes": [1, "2:m48G", 1, 1],
+                        "ppn": 4,
+                        "mpirun_np": [4, 4, 8, None]}
+        specifics = [specific_vars[4], specific_vars[5],
+                     specific_vars[0], specific_vars[4]]
+        batch = self._compare(base_vars, specifics, paral_params)
+        self.assertEqual(list(batch.errors), [0, 1, 2])
+
+    def test_multidtset_skipped(self):
+        batch = BatchInputApprover(base_vars, specific_vars[-1:])
+        self.assertTrue(batch.valid[0])
+        self.assertEqual(batch.errors, {})
@@ -0,0 +1,75 @@
+import numpy as np
+import unittest
+from abilaunch import input_renderer
+from abilaunch.input_renderer import (InputRenderer, render_input,
+                                      render_variable)
+
+
+H2_INPUT = """#== Basis set ==#
+ ecut 10.0
+
+#== Bands ==#
+ nband1 3
+ nband2 4
+
+#== SCF procedure ==#
+ tolvrs 1e-18
+
+#== Unit cell ==#
+ acell 10 10 10
+ natom 2
+ ntypat 1
+ typat 1 1
+ xcart
+   -0.7000000000    0.0000000000    0.0000000000
+    0.7000000000    0.0000000000    0.0000000000
+ znucl 1
+
+#== Other ==#
+ foo bar
+"""
+
+
+class TestInputRenderer(unittest.TestCase):
+    def setUp(self):
+        self.variables = {"acell": (10, 10, 10), "ntypat": 1, "znucl": 1,
+                          "natom": 2, "typat": (1, 1),
+                          "xcart": ((-0.7, 0.0, 0.0), (0.7, 0.0, 0.0)),
+                          "ecut": 10.0, "nband2": 4, "nband1": 3,
+                          "tolvrs": 1e-18, "tsmear": None, "foo": "bar"}
+
+    def test_render_input(self):
+        self.assertEqual(render_input(self.variables), H2_INPUT)
+
+    def test_render_arrays(self):
+        self.assertEqual(render_variable("typat", np.array([1, 2, 2, 1])),
+                         " typat\n 1 2 2\n 1")
+        self.assertEqual(render_variable("xred", np.array([[0, 0, 0],
+                                                           [.25, .25, .25]])),
+                         " xred\n    0.0000000000    0.0000000000    "
+                         "0.0000000000\n    0.2500000000    0.2500000000    "
+                         "0.2500000000")
+        self.assertEqual(render_variable("upawu", [5.0, 1e-5, -0.0, "eV"]),
+                         " upawu    5.0   1.000d-05   -0.00 eV")
+        self.assertEqual(render_variable("bdgw", [1, 1, 4, 4]),
+                         " bdgw\n 1 1\n 4 4")
+        self.assertEqual(render_variable("nbdbuf", np.int64(4)), " nbdbuf 4")
+
+    def test_renderer_cache(self):
+        calls = []
+        render = input_renderer.render_variable
+
+        def counted(name, value):
+            calls.append(name)
+            return render(name, value)
+        input_renderer.render_variable = counted
+        try:
+            renderer = InputRenderer(self.variables)
+            calls.clear()
+            variables = self.variables.copy()
+            variables.update({"ecut": float("10"), "nband1": 5})
+            content = renderer.render(variables)
+        finally:
+            input_renderer.render_variable = render
+        self.assertEqual(sorted(calls), ["ecut", "nband1"])
+        self.assertEqual(content, H2_INPUT.replace("nband1 3", "nband1 5"))
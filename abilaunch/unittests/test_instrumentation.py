@@ -0,0 +1,41 @@
+import json
+import unittest
+from abilaunch.instrumentation import Instrumentation
+
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+        self.instrumentation = Instrumentation(
+                hooks=[lambda *args: self.calls.append(args)])
+        self.instrumentation.record("calc1", "make", 1.0)
+        self.instrumentation.record_all("calc2", {"make": 3.0,
+                                                  "approve_input": 0.5})
+
+    def test_summary(self):
+        summary = self.instrumentation.summary()
+        self.assertEqual(summary["calculations"], 2)
+        # phases are sorted in execution order
+        self.assertEqual(list(summary["phases"]), ["approve_input", "make"])
+        make = summary["phases"]["make"]
+        self.assertEqual(make["count"], 2)
+        self.assertEqual(make["total"], 4.0)
+        self.assertEqual(make["mean"], 2.0)
+        self.assertEqual((make["min"], make["max"]), (1.0, 3.0))
+        self.assertEqual(json.loads(self.instrumentation.to_json()), summary)
+
+    def test_hooks(self):
+        self.assertEqual(self.calls[0], ("calc1", "make", 1.0))
+        self.assertEqual(len(self.calls), 3)
+        with self.instrumentation.phase("calc3", "submit"):
+            pass
+        self.assertEqual(self.calls[-1][:2], ("calc3", "submit"))
+
+    def test_prometheus(self):
+        text = self.instrumentation.to_prometheus(labels={"sweep": "ecut"})
+        self.assertIn('abilaunch_calculations{sweep="ecut"} 2\n', text)
+        self.assertIn('abilaunch_phase_seconds_sum{sweep="ecut",'
+                      'phase="make"} 4.0\n', text)
+        self.assertIn('abilaunch_phase_seconds_count{sweep="ecut",'
+                      'phase="make"} 2\n', text)
+        self.assertIn("# TYPE abilaunch_phase_seconds summary", text)
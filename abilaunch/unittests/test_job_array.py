@@ -0,0 +1,88 @@
+import os
+import stat
+import subprocess
+import tempfile
+import unittest
+from abilaunch.job_array import JobArray
+from abilaunch.scheduler import PBSScheduler, SlurmScheduler
+
+
+FAKE_SUBMIT = """#!/bin/bash
+echo "$@" >> {log}
+echo "{output}"
+"""
+
+
+class TestJobArray(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        # fake jobfiles which only create a file in their directory
+        self.jobfiles = []
+        for i in range(3):
+            calcdir = os.path.join(self.tempdir.name, "calc%d" % i, "run")
+            os.makedirs(calcdir)
+            jobfile = os.path.join(calcdir, "calc%d.sh" % i)
+            with open(jobfile, "w") as f:
+                f.write("#!/bin/bash\ntouch ran\n")
+            self.jobfiles.append(jobfile)
+        self.submitlog = os.path.join(self.tempdir.name, "submitted")
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+        del self.tempdir
+
+    def _fake_submit_command(self, name, output):
+        path = os.path.join(self.tempdir.name, name)
+        with open(path, "w") as f:
+            f.write(FAKE_SUBMIT.format(log=self.submitlog, output=output))
+        os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+        return path
+
+    def _run_item(self, path, variable, index):
+        env = os.environ.copy()
+        env[variable] = str(index)
+        subprocess.run(["bash", path], env=env, check=True,
+                       cwd=self.tempdir.name)
+
+    def test_pbs_array(self):
+        qsub = self._fake_submit_command("qsub", "42[].fakeserver")
+        path = os.path.join(self.tempdir.name, "array.sh")
+        array = JobArray(path, self.jobfiles,
+                         scheduler=PBSScheduler(submit_command=qsub),
+                         jobname="sweep", nodes=1, ppn=4, runtime=2,
+                         max_running=2)
+        self.assertEqual(array.submit(), "42[].fakeserver")
+        with open(self.submitlog) as f:
+            self.assertEqual(f.read().split(), [path])
+        with open(path) as f:
+            script = f.read()
+        for line in ("#PBS -N sweep", "#PBS -l walltime=2:00:00",
+                     "#PBS -l nodes=1:ppn=4", "#PBS -t 0-2%2"):
+            self.assertIn(line, script)
+        self._run_item(path, "PBS_ARRAYID", 1)
+        ran = [os.path.exists(os.path.join(os.path.dirname(j), "ran"))
+               for j in self.jobfiles]
+        self.assertEqual(ran, [False, True, False])
+
+    def test_slurm_array(self):
+        sbatch = self._fake_submit_command("sbatch",
+                                           "Submitted batch job 1234")
+        path = os.path.join(self.tempdir.name, "array.sh")
+        array = JobArray(path, self.jobfiles,
+                         scheduler=SlurmScheduler(submit_command=sbatch),
+                         runtime=(1, 30, 0))
+        self.assertEqual(array.submit(), "1234")
+        with open(path) as f:
+            script = f.read()
+        self.assertIn("#SBATCH --array=0-2", script)
+        self.assertIn("#SBATCH --time=1:30:00", script)
+        self._run_item(path, "SLURM_ARRAY_TASK_ID", 2)
+        self.assertTrue(os.path.exists(os.path.join(
+            os.path.dirname(self.jobfiles[2]), "ran")))
+
+    def test_submit_error(self):
+        path = os.path.join(self.tempdir.name, "array.sh")
+        array = JobArray(path, self.jobfiles,
+                         scheduler=PBSScheduler(submit_command="false"))
+        with self.assertRaises(RuntimeError):
+            array.submit()
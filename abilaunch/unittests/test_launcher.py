@@ -1,8 +1,11 @@
+import asyncio
 import os
 import tempfile
 import unittest
 import shutil
 from abilaunch import Launcher
+from abilaunch.input_renderer import render_input
+from abilaunch.result_cache import ResultCache
 
 
 here = os.path.dirname(os.path.abspath(__file__))
@@ -119,3 +122,99 @@ class TestLauncher(unittest.TestCase):
         self.launcher = Launcher.from_inplace_input(p, self.tempdir.name,
                                                     Hpseudo,
                                                     run=True)
+
+    def test_arun(self):
+        self.launcher = Launcher(self.tempdir.name,
+                                 Hpseudo,
+                                 input_name="test_launcher.in",
+                                 abinit_variables=tbase1_1_vars)
+        result = asyncio.run(self.launcher.arun(submit=False))
+        self.assertEqual(result.returncode, 0)
+        outputfile = os.path.join(self.tempdir.name, "test_launcher.out")
+        self.assertTrue(os.path.exists(outputfile))
+
+    def test_result_cache(self):
+        cache = ResultCache(os.path.join(self.tempdir.name, "cache"))
+        for name in ("first", "second"):
+            Launcher(os.path.join(self.tempdir.name, name),
+                     Hpseudo,
+                     abinit_variables=tbase1_1_vars,
+                     result_cache=cache,
+                     run=True)
+            outputfile = os.path.join(self.tempdir.name, name, name + ".out")
+            self.assertTrue(os.path.exists(outputfile))
+        self.assertEqual(cache.stats()["misses"], 1)
+        self.assertEqual(cache.stats()["hits"], 1)
+
+    def test_tune_paral(self):
+        launcher = Launcher(self.tempdir.name,
+                            Hpseudo,
+                            abinit_variables=tbase1_1_vars,
+                            mpirun="mpirun -np 2",
+                            nodes=1, ppn=2,
+                            tune_paral=True)
+        infile = os.path.join(self.tempdir.name,
+                              launcher.input_name + ".in")
+        with open(infile) as f:
+            content = f.read()
+        self.assertIn("npfft", content)
+
+    def test_resource_estimator(self):
+        history = os.path.join(self.tempdir.name, "history.sqlite")
+        launcher = Launcher(os.path.join(self.tempdir.name, "calc"),
+                            Hpseudo,
+                            abinit_variables=tbase1_1_vars,
+                            resource_estimator=history,
+                            run=True)
+        jobfile = launcher._abilauncher.jobfile
+        self.assertIsNotNone(jobfile.runtime)
+        self.assertIsNotNone(jobfile.memory)
+        self.assertEqual(len(launcher._resource_estimator), 1)
+
+    def test_resource_estimator_submitted(self):
+        # a submitted job is recorded from its output once it has ended
+        history = os.path.join(self.tempdir.name, "history.sqlite")
+        launcher = Launcher(os.path.join(self.tempdir.name, "calc"),
+                            Hpseudo,
+                            abinit_variables=tbase1_1_vars,
+                            resource_estimator=history)
+        launcher.job_id = "42.fakeserver"
+        output_path = launcher.output_path
+
+        class FakeWatcher:
+            async def wait(self, job_id, output_path=None):
+                with open(output_path, "w") as f:
+                    f.write(" Overall time at end (sec) : cpu=    0.4  "
+                            "wall=    12.5\n Calculation completed.\n")
+
+        self.assertEqual(asyncio.run(launcher.await_submitted(
+            FakeWatcher())), 0)
+        self.assertEqual(len(launcher._resource_estimator), 1)
+
+    def test_input_renderer(self):
+        launcher = Launcher(self.tempdir.name,
+                            Hpseudo,
+                            input_name="calc",
+                            abinit_variables=tbase1_1_vars)
+        with open(launcher._abilauncher.input_name) as f:
+            self.assertEqual(f.read(), render_input(tbase1_1_vars))
+
+    def test_from_directory(self):
+        inputpath = os.path.join(here, "files", "tbase1_1.in")
+        for name in ("first", "second"):
+            shutil.copy2(inputpath, os.path.join(self.tempdir.name,
+                                                 name + ".in"))
+        with open(inputpath) as f:
+            content = f.read()
+        launchers = Launcher.from_directory(self.tempdir.name, Hpseudo,
+                                            workers=2)
+        self.assertEqual([l.input_name for l in launchers],
+                         ["first", "second"])
+        for launcher in launchers:
+            # the input files are left untouched
+            with open(launcher._abilauncher.input_name) as f:
+                self.assertEqual(f.read(), content)
+            self.assertTrue(os.path.isfile(launcher.jobfile_path))
+        # already set up
+        self.assertEqual(Launcher.from_directory(self.tempdir.name,
+                                                 Hpseudo), [])
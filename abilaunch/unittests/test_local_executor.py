@@ -0,0 +1,56 @@
+import os
+import tempfile
+import unittest
+from abilaunch.local_executor import LocalExecutor, LocalJob
+from timeit import default_timer as timer
+
+
+class TestLocalExecutor(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+        del self.tempdir
+
+    def _job(self, name, ncores, command="sleep 0.3"):
+        # each job records the time it started in a file
+        start = os.path.join(self.tempdir.name, name)
+        return LocalJob(name, ["bash", "-c", f"date +%s.%N > {start};"
+                               f" {command}"],
+                        workdir=self.tempdir.name, ncores=ncores)
+
+    def _start_time(self, name):
+        with open(os.path.join(self.tempdir.name, name)) as f:
+            return float(f.read())
+
+    def test_core_budget(self):
+        jobs = [self._job("job%d" % i, 2) for i in range(4)]
+        start = timer()
+        results = LocalExecutor(4, poll_interval=0.01).run(jobs)
+        elapsed = timer() - start
+        self.assertEqual([r.name for r in results],
+                         ["job0", "job1", "job2", "job3"])
+        self.assertTrue(all(r.returncode == 0 for r in results))
+        self.assertTrue(all(r.walltime >= 0.3 for r in results))
+        # two jobs at a time: two rounds
+        self.assertGreaterEqual(elapsed, 0.6)
+        self.assertLess(elapsed, 1.2)
+
+    def test_packing(self):
+        # the 3 cores job starts with the 1 core job, the others wait
+        jobs = [self._job("small", 1), self._job("big", 3),
+                self._job("medium", 2)]
+        LocalExecutor(4, poll_interval=0.01).run(jobs)
+        small, big, medium = (self._start_time(n)
+                              for n in ("small", "big", "medium"))
+        self.assertLess(abs(small - big), 0.2)
+        self.assertGreaterEqual(medium - big, 0.25)
+
+    def test_failure_reported(self):
+        results = LocalExecutor(2).run([self._job("fail", 1, "exit 3")])
+        self.assertEqual(results[0].returncode, 3)
+
+    def test_too_many_cores(self):
+        with self.assertRaises(ValueError):
+            LocalExecutor(2).run([self._job("big", 4)])
@@ -1,7 +1,12 @@
+import asyncio
 import os
+import stat
 import tempfile
 import unittest
-from abilaunch import MassLauncher
+from abilaunch import MassLauncher, StreamingMassLauncher
+from abilaunch.hashing import variables_hash
+from abilaunch.scheduler import PBSScheduler
+from .test_submission_controller import FAKE_QSTAT, FAKE_QSUB
 
 
 here = os.path.dirname(os.path.abspath(__file__))
@@ -40,3 +45,312 @@ class TestMassLauncher(unittest.TestCase):
         for path in (ecut5path, ecut10path):
             self.assertTrue(os.path.exists(path))
         del ml
+
+    def test_masslauncher_workers(self):
+        for executor in ("process", "thread"):
+            workdir = os.path.join(self.tempdir.name, executor)
+            ml = MassLauncher(workdir,
+                              Hpseudo,
+                              ["ecut5", "ecut10", "ecut15"],
+                              tbase1_1_vars,
+                              [{"ecut": 5}, {"ecut": 10}, {"ecut": 15}],
+                              workers=2, executor=executor)
+            self.assertEqual(len(ml._launchers), 3)
+            self.assertEqual(ml.errors, {})
+            for name in ("ecut5", "ecut10", "ecut15"):
+                self.assertTrue(os.path.exists(os.path.join(workdir, name)))
+
+    def test_masslauncher_workers_collect_errors(self):
+        bad_vars = tbase1_1_vars.copy()
+        bad_vars.pop("ecut")
+        ml = MassLauncher(self.tempdir.name,
+                          Hpseudo,
+                          ["noecut", "ecut5"],
+                          bad_vars,
+                          [{}, {"ecut": 5}],
+                          workers=2, executor="thread")
+        self.assertEqual(len(ml._launchers), 1)
+        self.assertIn("noecut", ml.errors)
+        self.assertIsInstance(ml.errors["noecut"], ValueError)
+        # the calculations are found by name, not by position
+        self.assertEqual([h.name for h in ml.handles], ["ecut5"])
+        self.assertEqual(ml.launcher("ecut5").input_name, "ecut5")
+        with self.assertRaises(KeyError):
+            ml.launcher("noecut")
+
+    def test_masslauncher_invalid_inputs_before_writing(self):
+        workdir = os.path.join(self.tempdir.name, "sweep")
+        with self.assertRaises(ValueError):
+            MassLauncher(workdir,
+                         Hpseudo,
+                         ["ecut5", "nscf"],
+                         tbase1_1_vars,
+                         [{"ecut": 5}, {"iscf": -2}])
+        # nothing has been written
+        self.assertFalse(os.path.exists(workdir))
+
+    def test_masslauncher_submit_array(self):
+        qsub = os.path.join(self.tempdir.name, "qsub")
+        with open(qsub, "w") as f:
+            f.write("#!/bin/bash\necho 42[].fakeserver\n")
+        os.chmod(qsub, os.stat(qsub).st_mode | stat.S_IEXEC)
+        ml = MassLauncher(self.tempdir.name,
+                          Hpseudo,
+                          ["ecut5", "ecut10"],
+                          tbase1_1_vars,
+                          [{"ecut": 5}, {"ecut": 10}])
+        job_id = ml.submit_array(scheduler=PBSScheduler(submit_command=qsub))
+        self.assertEqual(job_id, "42[].fakeserver")
+        array = os.path.join(self.tempdir.name,
+                             os.path.basename(self.tempdir.name) +
+                             "_array.sh")
+        with open(array) as f:
+            script = f.read()
+        self.assertIn("#PBS -t 0-1", script)
+        for launcher in ml._launchers:
+            self.assertIn(launcher.jobfile_path, script)
+
+    def test_masslauncher_as_completed(self):
+        ml = MassLauncher(self.tempdir.name,
+                          Hpseudo,
+                          ["ecut5", "ecut10"],
+                          tbase1_1_vars,
+                          [{"ecut": 5}, {"ecut": 10}])
+
+        async def run():
+            return [r async for r in ml.as_completed(submit=False, ncores=1)]
+
+        results = asyncio.run(run())
+        self.assertEqual(sorted(r.name for r in results), ["ecut10", "ecut5"])
+        self.assertTrue(all(r.returncode == 0 for r in results))
+
+    def test_masslauncher_instrumentation(self):
+        ml = MassLauncher(self.tempdir.name,
+                          Hpseudo,
+                          ["ecut5", "ecut10"],
+                          tbase1_1_vars,
+                          [{"ecut": 5}, {"ecut": 10}],
+                          workers=2)
+        phases = ml.instrumentation.summary()["phases"]
+        for phase in ("approve_input", "check_pseudos", "process_to_link",
+                      "make"):
+            self.assertEqual(phases[phase]["count"], 2)
+
+    def test_masslauncher_shared_assets(self):
+        wfk = os.path.join(self.tempdir.name, "odat_WFK")
+        with open(wfk, "w") as f:
+            f.write("wfk")
+        workdir = os.path.join(self.tempdir.name, "sweep")
+        ml = MassLauncher(workdir,
+                          Hpseudo,
+                          ["ecut5", "ecut10"],
+                          tbase1_1_vars,
+                          [{"ecut": 5}, {"ecut": 10}],
+                          to_link=wfk,
+                          shared_assets="hardlink")
+        shared = os.path.join(workdir, "shared")
+        self.assertTrue(os.path.samefile(os.path.join(shared, "data",
+                                                      "odat_WFK"), wfk))
+        self.assertTrue(os.path.isfile(os.path.join(shared, "pseudos",
+                                                    "01h.pspgth")))
+        self.assertEqual(ml.shared_assets.report()["assets"], 2)
+
+    def test_masslauncher_submit_bundles(self):
+        qsub = os.path.join(self.tempdir.name, "qsub")
+        with open(qsub, "w") as f:
+            f.write("#!/bin/bash\necho 42.fakeserver\n")
+        os.chmod(qsub, os.stat(qsub).st_mode | stat.S_IEXEC)
+        ml = MassLauncher(self.tempdir.name,
+                          Hpseudo,
+                          ["ecut5", "ecut10", "ecut15"],
+                          tbase1_1_vars,
+                          [{"ecut": 5}, {"ecut": 10}, {"ecut": 15}])
+        job_ids = ml.submit_bundles(bundle_size=2,
+                                    scheduler=PBSScheduler(
+                                        submit_command=qsub))
+        self.assertEqual(job_ids, ["42.fakeserver"] * 2)
+        self.assertEqual([len(bundle) for bundle in ml._bundles], [2, 1])
+
+    def test_masslauncher_registry(self):
+        path = os.path.join(self.tempdir.name, "registry.sqlite")
+        ml = MassLauncher(self.tempdir.name,
+                          Hpseudo,
+                          ["ecut5", "ecut10"],
+                          tbase1_1_vars,
+                          [{"ecut": 5}, {"ecut": 10}],
+                          registry=path)
+        rows = ml.registry.query(sweep=self.tempdir.name,
+                                 where={"ecut": (">", 7)})
+        self.assertEqual([row["name"] for row in rows], ["ecut10"])
+        self.assertEqual(ml.registry.counts(), {"written": 2})
+        # the entries of calculations already run or submitted (e.g.: built
+        # with run=True) have their actual status
+        ecut5, ecut10 = ml._launchers
+        with open(ecut5.output_path, "w") as f:
+            f.write(" Calculation completed.\n")
+        ecut5._set_registry_status()
+        ecut10.job_id = "42.fakeserver"
+        self.assertEqual(ecut5.registry_entry()["status"], "completed")
+        self.assertEqual(ecut10.registry_entry()["status"], "submitted")
+        self.assertEqual(ecut10.handle().status, "submitted")
+
+    def test_masslauncher_harvest(self):
+        ml = MassLauncher(self.tempdir.name,
+                          Hpseudo,
+                          ["ecut5", "ecut10"],
+                          tbase1_1_vars,
+                          [{"ecut": 5}, {"ecut": 10}])
+        # only the existing outputs are harvested
+        output = ml._launchers[1].output_path
+        with open(output, "w") as f:
+            f.write(" Calculation completed.\n")
+        table = ml.harvest(workers=1)
+        self.assertEqual(list(table["path"]), [output])
+        self.assertTrue(table["completed"][0])
+        self.assertTrue(os.path.isfile(os.path.join(self.tempdir.name,
+                                                    "harvest.npz")))
+
+    def test_masslauncher_monitor(self):
+        ml = MassLauncher(self.tempdir.name,
+                          Hpseudo,
+                          ["ecut5", "ecut10"],
+                          tbase1_1_vars,
+                          [{"ecut": 5}, {"ecut": 10}])
+        monitor = ml.monitor()
+        self.assertEqual(len(monitor), 2)
+        self.assertEqual(monitor.poll(), {})
+        self.assertEqual(monitor.steps("ecut5"), [])
+
+    def test_masslauncher_compact(self):
+        qsub = os.path.join(self.tempdir.name, "qsub")
+        with open(qsub, "w") as f:
+            f.write("#!/bin/bash\necho 42.fakeserver\n")
+        os.chmod(qsub, os.stat(qsub).st_mode | stat.S_IEXEC)
+        workdir = os.path.join(self.tempdir.name, "sweep")
+        ml = MassLauncher(workdir,
+                          Hpseudo,
+                          ["ecut5", "ecut10"],
+                          tbase1_1_vars,
+                          [{"ecut": 5}, {"ecut": 10}],
+                          compact=True)
+        handles = ml.handles
+        self.assertEqual([h.name for h in handles], ["ecut5", "ecut10"])
+        self.assertEqual(handles[0].vars_hash,
+                         variables_hash(dict(tbase1_1_vars, ecut=5)))
+        self.assertEqual(handles[0].status, "written")
+        # rebuilt launchers do not write anything
+        launcher = ml.launcher("ecut10")
+        inputpath = os.path.join(workdir, "ecut10", "ecut10.in")
+        mtime = os.stat(inputpath).st_mtime_ns
+        self.assertEqual(launcher.output_path, handles[1].output_path)
+        self.assertEqual(launcher.log_path, handles[1].log_path)
+        self.assertEqual(launcher.jobfile_path, handles[1].jobfile_path)
+        self.assertEqual(ml.launcher("ecut10").workdir, launcher.workdir)
+        self.assertEqual(os.stat(inputpath).st_mtime_ns, mtime)
+        self.assertEqual(ml.submit(PBSScheduler(submit_command=qsub)),
+                         ["42.fakeserver"] * 2)
+        self.assertEqual([(h.job_id, h.status) for h in ml.handles],
+                         [("42.fakeserver", "submitted")] * 2)
+        self.assertEqual(ml.launcher("ecut5").job_id, "42.fakeserver")
+
+    def test_masslauncher_deduplicate(self):
+        # 'ecut10' and 'base' are the same once merged with the base
+        ml = MassLauncher(self.tempdir.name,
+                          Hpseudo,
+                          ["ecut10", "ecut5", "base"],
+                          tbase1_1_vars,
+                          [{"ecut": 10}, {"ecut": 5}, {}],
+                          deduplicate=True)
+        self.assertEqual(ml.duplicates, {"base": "ecut10"})
+        self.assertEqual(ml.deduplication["distinct"], 2)
+        self.assertEqual(ml.deduplication["ratio"], 1.5)
+        self.assertEqual([l.input_name for l in ml._launchers],
+                         ["ecut10", "ecut5"])
+        path = os.path.join(self.tempdir.name, "base")
+        self.assertTrue(os.path.islink(path))
+        self.assertTrue(os.path.samefile(
+            path, os.path.join(self.tempdir.name, "ecut10")))
+        self.assertEqual(ml.launcher("base").input_name, "ecut10")
+
+    def test_masslauncher_deduplicate_arguments(self):
+        # same variables but other resources: not duplicates
+        ml = MassLauncher(self.tempdir.name,
+                          Hpseudo,
+                          ["ecut10", "base", "other"],
+                          tbase1_1_vars,
+                          [{"ecut": 10}, {}, {}],
+                          runtime=["1:00:00", "1:00:00", "2:00:00"],
+                          deduplicate=True)
+        self.assertEqual(ml.duplicates, {"base": "ecut10"})
+        # a missing pseudo is an error of its calculation only
+        ml = MassLauncher(os.path.join(self.tempdir.name, "missing"),
+                          Hpseudo,
+                          ["ecut10", "missing", "base"],
+                          tbase1_1_vars,
+                          [{"ecut": 10}, {}, {}],
+                          specific_pseudos=[[], ["missing.psp"], []],
+                          deduplicate=True, workers=2)
+        self.assertEqual(ml.duplicates, {"base": "ecut10"})
+        self.assertEqual(list(ml.errors), ["missing"])
+        self.assertIsInstance(ml.errors["missing"], FileNotFoundError)
+
+    def test_masslauncher_submit_throttled(self):
+        jobs = os.path.join(self.tempdir.name, "jobs")
+        commands = {}
+        for name, content in (("qsub", FAKE_QSUB), ("qstat", FAKE_QSTAT)):
+            commands[name] = os.path.join(self.tempdir.name, name)
+            with open(commands[name], "w") as f:
+                f.write(content.format(jobs=jobs, limit=100))
+            os.chmod(commands[name],
+                     os.stat(commands[name]).st_mode | stat.S_IEXEC)
+        scheduler = PBSScheduler(submit_command=commands["qsub"],
+                                 status_command=commands["qstat"])
+        workdir = os.path.join(self.tempdir.name, "sweep")
+        ml = MassLauncher(workdir,
+                          Hpseudo,
+                          ["ecut5", "ecut10"],
+                          tbase1_1_vars,
+                          [{"ecut": 5}, {"ecut": 10}],
+                          compact=True)
+        # one slot: the second calculation waits for the first job to end
+        job_ids = ml.submit(scheduler, max_jobs=1, poll_interval=0,
+                            timeout=0)
+        self.assertEqual(job_ids, ["1.fakeserver", None])
+        with open(jobs, "w") as f:
+            f.write("1.fakeserver C\n")
+        # resumed from the progress file
+        job_ids = ml.submit(scheduler, max_jobs=1, poll_interval=0)
+        self.assertEqual(job_ids, ["1.fakeserver", "2.fakeserver"])
+        self.assertEqual([h.job_id for h in ml.handles], job_ids)
+        self.assertTrue(os.path.isfile(os.path.join(workdir,
+                                                    "submissions.jsonl")))
+
+
+class TestStreamingMassLauncher(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+        del self.tempdir
+
+    def test_generators(self):
+        ecuts = (5, 10, 15)
+        ml = StreamingMassLauncher(self.tempdir.name,
+                                   Hpseudo,
+                                   ("ecut%d" % e for e in ecuts),
+                                   tbase1_1_vars,
+                                   ({"ecut": e} for e in ecuts),
+                                   jobnames=iter(["a", "b", "c"]))
+        self.assertEqual([h.name for h in ml],
+                         ["ecut5", "ecut10", "ecut15"])
+        for handle in ml:
+            self.assertTrue(os.path.exists(handle.workdir))
+
+    def test_length_mismatch(self):
+        with self.assertRaises(ValueError):
+            StreamingMassLauncher(self.tempdir.name,
+                                  Hpseudo,
+                                  iter(["ecut5", "ecut10"]),
+                                  tbase1_1_vars,
+                                  iter([{"ecut": 5}]))
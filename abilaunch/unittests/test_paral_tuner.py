@@ -0,0 +1,82 @@
+import math
+import unittest
+from abilaunch.paral_tuner import ParalTuner
+
+
+base_vars = {"ecut": 20, "acell": (10, 10, 10), "nkpt": 4, "nband": 16}
+
+
+class TestParalTuner(unittest.TestCase):
+    def test_kpoints_first(self):
+        tuner = ParalTuner(base_vars, 4)
+        self.assertEqual(tuner.variables,
+                         {"npkpt": 4, "npband": 1, "npfft": 1})
+        self.assertEqual(tuner.efficiency, 1.0)
+
+    def test_bands(self):
+        tuner = ParalTuner(base_vars, 16)
+        self.assertEqual(tuner.variables,
+                         {"npkpt": 4, "npband": 4, "npfft": 1,
+                          "paral_kgb": 1})
+        self.assertLess(tuner.efficiency, 1.0)
+        variables = tuner.apply(base_vars)
+        self.assertEqual(variables["npband"], 4)
+        self.assertNotIn("npband", base_vars)
+        # all candidates are valid distributions
+        for efficiency, (npkpt, npband, npfft, npspinor) in tuner.candidates:
+            self.assertLessEqual(npkpt * npband * npfft * npspinor, 16)
+            self.assertEqual(16 % npband, 0)
+
+    def test_fft(self):
+        tuner = ParalTuner(dict(base_vars, nband=2), 8)
+        variables = tuner.variables
+        self.assertEqual(variables["npkpt"], 4)
+        self.assertEqual(variables["npfft"], 2)
+        # the estimated FFT grid is not written
+        self.assertNotIn("ngfft", variables)
+        # a grid given by the user is kept as is
+        user_vars = dict(base_vars, nband=2, ngfft=[30, 30, 30])
+        variables = ParalTuner(user_vars, 8).apply(user_vars)
+        self.assertEqual(variables["npfft"], 2)
+        self.assertEqual(variables["ngfft"], [30, 30, 30])
+
+    def test_kpoint_grid(self):
+        # FCC Si: 4x4x4 grid with 4 shifts, only ~10 irreducible k-points.
+        # The grid size is not the number of k-points: they are not
+        # distributed.
+        si_vars = {"ecut": 20, "acell": (10.26, 10.26, 10.26),
+                   "rprim": ((0, 0.5, 0.5), (0.5, 0, 0.5), (0.5, 0.5, 0)),
+                   "ngkpt": (4, 4, 4), "nshiftk": 4,
+                   "shiftk": ((0.5, 0.5, 0.5), (0.5, 0.0, 0.0),
+                              (0.0, 0.5, 0.0), (0.0, 0.0, 0.5)),
+                   "nband": 8}
+        with self.assertLogs("ParalTuner", level="WARNING"):
+            tuner = ParalTuner(si_vars, 512)
+        self.assertEqual(tuner.variables["npkpt"], 1)
+        self.assertNotIn("paral_kgb", tuner.variables)
+        tuner = ParalTuner(dict(si_vars, nband=16), 8)
+        self.assertEqual(tuner.variables["npkpt"], 1)
+        self._check_paral_kgb(tuner)
+
+    def test_all_cores_with_paral_kgb(self):
+        # 6 cores cannot be split among 4 k-points and bands
+        tuner = ParalTuner(base_vars, 6)
+        self._check_paral_kgb(tuner)
+        for efficiency, distribution in tuner.candidates:
+            if distribution[1:] != (1, 1, 1):
+                self.assertEqual(math.prod(distribution), 6)
+
+    def _check_paral_kgb(self, tuner):
+        variables = tuner.variables
+        if "paral_kgb" in variables:
+            self.assertEqual(variables["npkpt"] * variables["npband"] *
+                             variables["npfft"] *
+                             variables.get("npspinor", 1), tuner.ncores)
+
+    def test_warnings(self):
+        with self.assertLogs("ParalTuner", level="WARNING") as logs:
+            tuner = ParalTuner({"nkpt": 1}, 8)
+        self.assertEqual(tuner.variables,
+                         {"npkpt": 1, "npband": 1, "npfft": 1})
+        self.assertEqual(tuner.efficiency, 1 / 8)
+        self.assertEqual(len(logs.output), 2)
@@ -0,0 +1,68 @@
+import os
+import shutil
+import tempfile
+import unittest
+from abilaunch.pseudos import PseudoIndex, znucl_to_symbol
+
+
+here = os.path.dirname(os.path.abspath(__file__))
+Hpseudo = os.path.join(here, "files", "01h.pspgth")
+
+
+class TestPseudoIndex(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.lib1 = os.path.join(self.tempdir.name, "lib1")
+        self.lib2 = os.path.join(self.tempdir.name, "lib2")
+        for lib in (self.lib1, self.lib2):
+            os.mkdir(lib)
+            shutil.copy(Hpseudo, lib)
+        # a pseudo whose element is only known from its filename
+        with open(os.path.join(self.lib2, "Si.psp8"), "w") as f:
+            f.write("silicon\n")
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+        del self.tempdir
+
+    def test_znucl_to_symbol(self):
+        self.assertEqual(znucl_to_symbol(1), "H")
+        self.assertEqual(znucl_to_symbol(14.0), "Si")
+        with self.assertRaises(ValueError):
+            znucl_to_symbol(0)
+
+    def test_find(self):
+        index = PseudoIndex([self.lib1, self.lib2])
+        self.assertEqual(len(index), 3)
+        # first library has priority
+        self.assertEqual(index.find("01h.pspgth"),
+                         os.path.join(self.lib1, "01h.pspgth"))
+        self.assertEqual(index.find("Si.psp8"),
+                         os.path.join(self.lib2, "Si.psp8"))
+        self.assertIsNone(index.find("O.psp8"))
+        self.assertIn(os.path.join(self.lib2, "01h.pspgth"), index)
+
+    def test_find_element(self):
+        index = PseudoIndex([self.lib1, self.lib2])
+        self.assertEqual(index.find_element(1),
+                         [os.path.join(self.lib1, "01h.pspgth"),
+                          os.path.join(self.lib2, "01h.pspgth")])
+        self.assertEqual(index.find_element("si"),
+                         [os.path.join(self.lib2, "Si.psp8")])
+        self.assertEqual(index.find_element("O"), [])
+
+    def test_persisted_index(self):
+        cache = os.path.join(self.tempdir.name, "index.json")
+        index = PseudoIndex([self.lib1], cache_path=cache)
+        self.assertTrue(os.path.isfile(cache))
+        # remove a pseudo without changing the directory mtime: the
+        # cached index is still used
+        mtime = os.stat(self.lib1).st_mtime
+        os.remove(os.path.join(self.lib1, "01h.pspgth"))
+        os.utime(self.lib1, (mtime, mtime))
+        index = PseudoIndex([self.lib1], cache_path=cache)
+        self.assertEqual(len(index), 1)
+        # once the mtime changes, the index is rebuilt
+        os.utime(self.lib1, (mtime + 10, mtime + 10))
+        index = PseudoIndex([self.lib1], cache_path=cache)
+        self.assertEqual(len(index), 0)
@@ -0,0 +1,138 @@
+import os
+import pickle
+import stat
+import tempfile
+import unittest
+from abilaunch.registry import Registry
+from abilaunch.resource_estimator import ResourceEstimator
+from abilaunch.scheduler import PBSScheduler
+
+
+# fake qstat: job 1 is running, job 2 is completed, job 3 is purged and
+# other jobs are not reported
+FAKE_QSTAT = """#!/bin/bash
+echo "Job ID   Name  User  Time Use S Queue"
+echo "-------- ----- ----- -------- - -----"
+echo "1.serv  name  user  00:00:00 R q"
+echo "2.serv  name  user  00:00:10 C q"
+echo "qstat: Unknown Job Id 3.serv" >&2
+exit 153
+"""
+# fake qstat of an unreachable server
+FAILING_QSTAT = """#!/bin/bash
+echo "qstat: cannot connect to server" >&2
+exit 1
+"""
+
+
+class TestRegistry(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.registry = Registry(os.path.join(self.tempdir.name,
+                                              "registry.sqlite"))
+        self.sweep = os.path.join(self.tempdir.name, "sweep")
+        entries = []
+        for i, ecut in enumerate((20, 40, 60)):
+            workdir = os.path.join(self.sweep, "ecut%d" % ecut)
+            entries.append({"workdir": workdir, "name": "ecut%d" % ecut,
+                            "abinit_variables": {"ecut": ecut,
+                                                 "acell": [10, 10, 10]},
+                            "output": os.path.join(workdir, "run.out"),
+                            "sweep": self.sweep})
+        self.registry.register_many(entries)
+        self.workdirs = [entry["workdir"] for entry in entries]
+
+    def tearDown(self):
+        self.registry.close()
+        self.tempdir.cleanup()
+        del self.tempdir
+
+    def _complete(self, workdir):
+        os.makedirs(workdir, exist_ok=True)
+        with open(os.path.join(workdir, "run.out"), "w") as f:
+            f.write(" Calculation completed.\n")
+
+    def test_query(self):
+        self.assertEqual(len(self.registry), 3)
+        self.assertEqual(self.registry.counts(self.sweep), {"written": 3})
+        rows = self.registry.query(sweep=self.sweep, where={"ecut": (">", 30)})
+        self.assertEqual([row["name"] for row in rows], ["ecut40", "ecut60"])
+        rows = self.registry.query(where={"ecut": 20})
+        self.assertEqual(rows[0]["workdir"], self.workdirs[0])
+        self.assertEqual(self.registry.variables(self.workdirs[0]),
+                         {"ecut": 20, "acell": [10, 10, 10]})
+        self.assertEqual(self.registry.query(sweep=self.tempdir.name), [])
+        with self.assertRaises(ValueError):
+            self.registry.query(where={"ecut": ("; DROP", 1)})
+        # re-registering replaces the calculation
+        self.registry.register(self.workdirs[0], "ecut20", {"ecut": 25},
+                               "run.out", sweep=self.sweep)
+        self.assertEqual(len(self.registry.query(where={"ecut": 20})), 0)
+        self.assertEqual(len(self.registry), 3)
+
+    def _qstat(self, content):
+        qstat = os.path.join(self.tempdir.name, "qstat")
+        with open(qstat, "w") as f:
+            f.write(content)
+        os.chmod(qstat, os.stat(qstat).st_mode | stat.S_IEXEC)
+        return PBSScheduler(status_command=qstat)
+
+    def test_update_from_scheduler(self):
+        scheduler = self._qstat(FAKE_QSTAT)
+        for i, workdir in enumerate(self.workdirs):
+            self.registry.set_submitted(workdir, "%d.serv" % (i + 1))
+        self._complete(self.workdirs[1])
+        updated = self.registry.update_from_scheduler(scheduler)
+        self.assertEqual(updated, 3)
+        statuses = [row["status"] for row in self.registry.query()]
+        self.assertEqual(statuses, ["running", "completed", "failed"])
+        self.assertIsNotNone(self.registry.query()[0]["submitted"])
+        self.assertEqual(self.registry.query(status="failed")[0]["job_id"],
+                         "3.serv")
+
+    def test_update_from_scheduler_resources(self):
+        # the completed runs are added to the resource history
+        estimator = ResourceEstimator(os.path.join(self.tempdir.name,
+                                                   "history.sqlite"))
+        for i, workdir in enumerate(self.workdirs):
+            self.registry.set_submitted(workdir, "%d.serv" % (i + 1))
+        os.makedirs(self.workdirs[1])
+        with open(os.path.join(self.workdirs[1], "run.out"), "w") as f:
+            f.write("- mpi_nproc: 4, omp_nthreads: -1\n"
+                    " Overall time at end (sec) : cpu=          0.4  "
+                    "wall=          12.5\n"
+                    " Calculation completed.\n")
+        self.registry.update_from_scheduler(self._qstat(FAKE_QSTAT),
+                                            resource_estimator=estimator)
+        self.assertEqual(len(estimator), 1)
+        row = estimator._connection.execute(
+                "SELECT ncores, walltime FROM runs").fetchone()
+        self.assertEqual(row, (4, 12.5))
+        # already completed: not recorded twice
+        self.registry.update_from_scheduler(self._qstat(FAKE_QSTAT),
+                                            resource_estimator=estimator)
+        self.assertEqual(len(estimator), 1)
+        estimator.close()
+
+    def test_update_from_scheduler_unknown(self):
+        # job 4 is not reported: its calculation is left unchanged
+        self.registry.set_submitted(self.workdirs[0], "4.serv")
+        self.assertEqual(self.registry.update_from_scheduler(
+            self._qstat(FAKE_QSTAT)), 0)
+        self.assertEqual(self.registry.counts(),
+                         {"submitted": 1, "written": 2})
+        # the status command failing is not taken as finished jobs
+        with self.assertRaises(RuntimeError):
+            self.registry.update_from_scheduler(self._qstat(FAILING_QSTAT))
+        self.assertEqual(self.registry.counts(),
+                         {"submitted": 1, "written": 2})
+
+    def test_update_from_outputs(self):
+        self._complete(self.workdirs[2])
+        self.assertEqual(self.registry.update_from_outputs(self.sweep), 1)
+        self.assertEqual(self.registry.counts(),
+                         {"written": 2, "completed": 1})
+        # the registry can be sent to other processes
+        registry = pickle.loads(pickle.dumps(self.registry))
+        self.assertEqual(len(registry), 3)
+        registry.close()
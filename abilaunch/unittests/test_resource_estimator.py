@@ -0,0 +1,63 @@
+import os
+import pickle
+import tempfile
+import unittest
+from abilaunch.resource_estimator import ResourceEstimator
+
+
+base_vars = {"ecut": 10, "acell": (10, 10, 10), "natom": 2, "nkpt": 1,
+             "nband": 4, "nstep": 10}
+
+
+class TestResourceEstimator(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tempdir.name, "history.sqlite")
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+        del self.tempdir
+
+    def test_without_history(self):
+        estimator = ResourceEstimator(self.path, margin=0.0)
+        small = estimator.estimate(base_vars)
+        big = estimator.estimate(dict(base_vars, ecut=40, nkpt=10))
+        self.assertGreater(big.runtime, small.runtime)
+        self.assertGreater(big.memory, small.memory)
+        self.assertAlmostEqual(estimator.estimate(base_vars, ncores=4).runtime,
+                               small.runtime / 4)
+        with_margin = ResourceEstimator(self.path, margin=0.5)
+        self.assertAlmostEqual(with_margin.estimate(base_vars).runtime,
+                               small.runtime * 1.5)
+
+    def test_history(self):
+        estimator = ResourceEstimator(self.path, margin=0.0)
+        # runtimes proportional to nkpt
+        for nkpt in (1, 2, 4):
+            estimator.record(dict(base_vars, nkpt=nkpt), 1,
+                             walltime=100 * nkpt, memory=2 ** 20 * nkpt)
+        self.assertEqual(len(estimator), 3)
+        estimate = estimator.estimate(dict(base_vars, nkpt=8))
+        self.assertAlmostEqual(estimate.runtime, 800)
+        self.assertAlmostEqual(estimate.memory, 8 * 2 ** 20)
+        # the history is persistent and the estimator can be pickled
+        estimator = pickle.loads(pickle.dumps(ResourceEstimator(self.path)))
+        self.assertEqual(len(estimator), 3)
+        kwargs = estimator.jobfile_kwargs(dict(base_vars, nkpt=8), ncores=2)
+        # 800s * 1.5 / 2 = 10 minutes, 8mb * 1.5 for each of the 2 processes
+        self.assertEqual(kwargs, {"runtime": (0, 10, 0), "memory": "24mb"})
+
+    def test_record_output(self):
+        output = os.path.join(self.tempdir.name, "run.out")
+        with open(output, "w") as f:
+            f.write(" P This job should need less than                 "
+                    "2.5 Mbytes of memory.\n"
+                    "- Proc.   0 individual time (sec): cpu=          0.3"
+                    "  wall=          0.3\n"
+                    " Overall time at end (sec) : cpu=          0.4  "
+                    "wall=          12.5\n")
+        estimator = ResourceEstimator(self.path, margin=0.0)
+        estimator.record_output(base_vars, 1, output)
+        estimate = estimator.estimate(base_vars)
+        self.assertAlmostEqual(estimate.runtime, 12.5)
+        self.assertAlmostEqual(estimate.memory, 2.5 * 2 ** 20)
@@ -0,0 +1,126 @@
+import os
+import tempfile
+import time
+import unittest
+from abilaunch.hashing import calculation_hash, variables_hash
+from abilaunch.result_cache import ResultCache, _rename
+
+
+here = os.path.dirname(os.path.abspath(__file__))
+Hpseudo = os.path.join(here, "files", "01h.pspgth")
+
+
+class TestHashing(unittest.TestCase):
+    def test_variables_hash(self):
+        h1 = variables_hash({"ecut": 10.0, "acell": (10, 10, 10)})
+        h2 = variables_hash({"acell": [10, 10, 10], "ecut": 10})
+        h3 = variables_hash({"acell": [10, 10, 10], "ecut": 11})
+        self.assertEqual(h1, h2)
+        self.assertNotEqual(h1, h3)
+
+    def test_calculation_hash(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            wfk = os.path.join(tempdir, "odat_WFK")
+            with open(wfk, "w") as f:
+                f.write("wfk")
+            h1 = calculation_hash({"ecut": 10}, Hpseudo, wfk)
+            self.assertEqual(h1, calculation_hash({"ecut": 10}, [Hpseudo],
+                                                  [wfk]))
+            self.assertNotEqual(h1, calculation_hash({"ecut": 10}, Hpseudo))
+            with open(wfk, "w") as f:
+                f.write("other wfk")
+            self.assertNotEqual(h1, calculation_hash({"ecut": 10}, Hpseudo,
+                                                     wfk))
+            # whole input files (e.g.: with many datasets)
+            inputfile = os.path.join(tempdir, "calc.in")
+            with open(inputfile, "w") as f:
+                f.write("ndtset 2\necut1 10\necut2 20\n")
+            h2 = calculation_hash({"ecut": 10}, Hpseudo, input_file=inputfile)
+            self.assertNotEqual(h2, calculation_hash({"ecut": 10}, Hpseudo))
+            with open(inputfile, "w") as f:
+                f.write("ndtset 2\necut1 10\necut2 30\n")
+            self.assertNotEqual(h2, calculation_hash({"ecut": 10}, Hpseudo,
+                                                     input_file=inputfile))
+
+
+class TestResultCache(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.tempdir.name, "cache")
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+        del self.tempdir
+
+    def _make_calc(self, name, size=10):
+        workdir = os.path.join(self.tempdir.name, name)
+        files = [os.path.join(workdir, name + ".out"),
+                 os.path.join(workdir, "run", "out_data",
+                              "odat_" + name + "_WFK")]
+        for path in files:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as f:
+                f.write("x" * size)
+        return workdir, files
+
+    def test_store_and_restore(self):
+        cache = ResultCache(self.root)
+        workdir, files = self._make_calc("calc1")
+        self.assertFalse(cache.restore("key", workdir, "calc1"))
+        cache.store("key", workdir, "calc1", files)
+        # a new cache instance reads the same store
+        cache = ResultCache(self.root)
+        newdir = os.path.join(self.tempdir.name, "calc2")
+        self.assertTrue(cache.restore("key", newdir, "calc2"))
+        for path in ("calc2.out", "run/out_data/odat_calc2_WFK"):
+            path = os.path.join(newdir, path)
+            self.assertTrue(os.path.isfile(path))
+            # hard linked, not copied
+            self.assertGreater(os.stat(path).st_nlink, 1)
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(cache.stats()["misses"], 0)
+
+    def test_rename(self):
+        # rootnames contained in other parts of the file names
+        cache = ResultCache(self.root)
+        workdir, files = self._make_calc("d")
+        cache.store("key", workdir, "d", files)
+        newdir = os.path.join(self.tempdir.name, "ecut10")
+        self.assertTrue(cache.restore("key", newdir, "ecut10"))
+        self.assertEqual(sorted(os.listdir(newdir)), ["ecut10.out", "run"])
+        self.assertEqual(os.listdir(os.path.join(newdir, "run", "out_data")),
+                         ["odat_ecut10_WFK"])
+        self.assertEqual(_rename("calc.log", "calc", "new"), "new.log")
+        self.assertEqual(_rename("calc_DS1_EIG", "calc", "new"),
+                         "new_DS1_EIG")
+        self.assertEqual(_rename("calc2.out", "calc", "new"), "calc2.out")
+
+    def test_lru_eviction(self):
+        cache = ResultCache(self.root, max_size=45)
+        for i in range(3):
+            workdir, files = self._make_calc("calc%d" % i)
+            cache.store("key%d" % i, workdir, "calc%d" % i, files)
+            time.sleep(0.01)
+            if i == 1:
+                # key0 becomes more recent than key1
+                cache.restore("key0", workdir, "calc0")
+        self.assertIn("key0", cache)
+        self.assertNotIn("key1", cache)
+        self.assertIn("key2", cache)
+        self.assertEqual(cache.stats()["evictions"], 1)
+        self.assertFalse(os.path.exists(os.path.join(self.root, "key1")))
+
+    def test_shared_directory(self):
+        # caches on the same directory do not overwrite each other's index
+        first = ResultCache(self.root)
+        second = ResultCache(self.root, max_size=25)
+        workdir, files = self._make_calc("calc0")
+        first.store("key0", workdir, "calc0", files)
+        time.sleep(0.01)
+        workdir, files = self._make_calc("calc1")
+        second.store("key1", workdir, "calc1", files)
+        # key0 was evicted by the second cache although stored by the first
+        self.assertNotIn("key0", first)
+        self.assertIn("key1", first)
+        self.assertEqual(len(ResultCache(self.root)), 1)
+        self.assertFalse(os.path.exists(os.path.join(self.root, "key0")))
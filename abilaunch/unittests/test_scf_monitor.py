@@ -0,0 +1,141 @@
+import os
+import stat
+import tempfile
+import unittest
+from abilaunch.scf_monitor import (ScfMonitor, ScfStep, diverging,
+                                   oscillating, stagnating)
+from abilaunch.scheduler import PBSScheduler
+
+
+FAKE_QDEL = """#!/bin/bash
+echo "$@" >> {log}
+"""
+HEADER = ("     iter   Etot(hartree)      deltaE(h)  residm     vres2\n")
+STEP = " ETOT {:2d}  {:.13f}    {:.3E} 1.000E-08 {:.3E}\n"
+
+
+def _steps(residuals, deltas=None):
+    if deltas is None:
+        deltas = [-1e-3] * len(residuals)
+    return [ScfStep(i + 1, -1.0, d, 1e-8, r)
+            for i, (r, d) in enumerate(zip(residuals, deltas))]
+
+
+class TestRules(unittest.TestCase):
+    def test_diverging(self):
+        rule = diverging(factor=100)
+        self.assertIsNone(rule(_steps([1e-2, 1e-4, 1e-3])))
+        self.assertIn("diverging", rule(_steps([1e-2, 1e-4, 1e-1])))
+
+    def test_oscillating(self):
+        rule = oscillating(window=4)
+        deltas = [-1e-1, 1e-2, -1e-2, 1e-2, -1e-2]
+        self.assertIn("oscillating", rule(_steps([1e-3] * 5, deltas)))
+        deltas = [-1e-1, 1e-2, -1e-3, 1e-4, -1e-5]
+        self.assertIsNone(rule(_steps([1e-3] * 5, deltas)))
+
+    def test_stagnating(self):
+        rule = stagnating(window=3, reduction=10)
+        self.assertIn("stagnating", rule(_steps([1e-3, 8e-4, 6e-4, 5e-4])))
+        self.assertIsNone(rule(_steps([1e-3, 1e-4, 1e-5, 1e-6])))
+        self.assertIsNone(rule(_steps([1e-3, 1e-3, 1e-3])))
+
+
+class TestScfMonitor(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.cancellog = os.path.join(self.tempdir.name, "cancelled")
+        qdel = os.path.join(self.tempdir.name, "qdel")
+        with open(qdel, "w") as f:
+            f.write(FAKE_QDEL.format(log=self.cancellog))
+        os.chmod(qdel, os.stat(qdel).st_mode | stat.S_IEXEC)
+        self.scheduler = PBSScheduler(cancel_command=qdel)
+        self.logs = {}
+        for name in ("good", "bad"):
+            self.logs[name] = os.path.join(self.tempdir.name, name + ".log")
+            with open(self.logs[name], "w") as f:
+                f.write(HEADER)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+        del self.tempdir
+
+    def _append(self, name, text):
+        with open(self.logs[name], "a") as f:
+            f.write(text)
+
+    def test_monitor(self):
+        monitor = ScfMonitor(rules=[diverging(factor=100)], stop=True,
+                             scheduler=self.scheduler)
+        for name, path in self.logs.items():
+            monitor.watch(path, name=name, job_id=name + ".server")
+        for i, residual in enumerate((1e-2, 1e-4, 1e-6)):
+            self._append("good", STEP.format(i + 1, -1.1, -1e-3, residual))
+        for i, residual in enumerate((1e-2, 1e-4)):
+            self._append("bad", STEP.format(i + 1, -1.1, -1e-3, residual))
+        # a partially written line is kept for the next poll
+        self._append("bad", " ETOT  3  -1.1")
+        self.assertEqual(monitor.poll(), {})
+        self.assertEqual(len(monitor.steps("bad")), 2)
+        self._append("bad", "000000000000    1.000E-02 1.000E-08 1.000E-01\n")
+        matched = monitor.poll()
+        self.assertEqual(list(matched), ["bad"])
+        self.assertEqual(monitor.steps("bad")[-1].residual, 0.1)
+        self.assertEqual(monitor.stopped, matched)
+        with open(self.cancellog) as f:
+            self.assertEqual(f.read().split(), ["bad.server"])
+        with open(self.logs["bad"] + ".stopped") as f:
+            self.assertIn("diverging", f.read())
+        self.assertFalse(monitor.finished)
+        self._append("good", " Calculation completed.\n")
+        self.assertEqual(monitor.poll(), {})
+        self.assertTrue(monitor.finished)
+
+    def test_lost_job(self):
+        # qstat lists no job: the job was dropped by the scheduler
+        qstat = os.path.join(self.tempdir.name, "qstat")
+        calls = os.path.join(self.tempdir.name, "calls")
+        with open(qstat, "w") as f:
+            f.write("#!/bin/bash\necho $@ >> %s\n" % calls)
+        os.chmod(qstat, os.stat(qstat).st_mode | stat.S_IEXEC)
+        monitor = ScfMonitor(scheduler=PBSScheduler(status_command=qstat),
+                             max_unknown=2)
+        monitor.watch(self.logs["good"], job_id="1.server")
+        with self.assertLogs("ScfMonitor", level="WARNING"):
+            self.assertEqual(monitor.run(poll_interval=0), {})
+        self.assertTrue(monitor.finished)
+        with open(calls) as f:
+            self.assertEqual(len(f.readlines()), 2)
+
+    def test_report_only(self):
+        monitor = ScfMonitor(rules=[diverging(factor=10, min_steps=2)])
+        monitor.watch(self.logs["bad"], job_id="1.server")
+        self._append("bad", STEP.format(1, -1.1, -1e-3, 1e-4))
+        self._append("bad", STEP.format(2, -1.1, -1e-3, 1e-2))
+        self.assertEqual(list(monitor.poll()), [self.logs["bad"]])
+        self._append("bad", STEP.format(3, -1.1, -1e-3, 1e-1))
+        # reported once and not stopped
+        self.assertEqual(monitor.poll(), {})
+        self.assertEqual(monitor.stopped, {})
+        self.assertFalse(os.path.exists(self.cancellog))
+
+    def test_ionic_steps(self):
+        # each ionic step has its own SCF cycle: the residual going up
+        # from one cycle to the next is not a divergence
+        monitor = ScfMonitor(rules=[diverging(factor=100)])
+        monitor.watch(self.logs["good"], job_id="1.server")
+        for i, residual in enumerate((1e-2, 1e-4, 1e-8)):
+            self._append("good", STEP.format(i + 1, -1.1, -1e-3, residual))
+        self._append("good", "--- Iteration: ( 2/10) Internal Cycle: (1/1)\n")
+        self._append("good", HEADER)
+        self._append("good", STEP.format(1, -1.1, -1e-3, 1e-3))
+        self.assertEqual(monitor.poll(), {})
+        self.assertEqual(len(monitor.steps(self.logs["good"])), 1)
+        # without the ionic step line, the restarted iteration count
+        # starts a new cycle as well
+        for i, residual in enumerate((1e-5, 1e-8)):
+            self._append("good", STEP.format(i + 2, -1.1, -1e-3, residual))
+        self._append("good", STEP.format(1, -1.1, -1e-3, 1e-3))
+        self.assertEqual(monitor.poll(), {})
+        self.assertEqual(monitor.steps(self.logs["good"]),
+                         [ScfStep(1, -1.1, -1e-3, 1e-8, 1e-3)])
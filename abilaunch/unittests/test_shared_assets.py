@@ -0,0 +1,64 @@
+import os
+import tempfile
+import unittest
+from abilaunch.shared_assets import SharedAssets
+
+
+class TestSharedAssets(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.wfk = os.path.join(self.tempdir.name, "odat_WFK")
+        with open(self.wfk, "w") as f:
+            f.write("x" * 100)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+        del self.tempdir
+
+    def test_share(self):
+        for link in ("hardlink", "symlink"):
+            root = os.path.join(self.tempdir.name, link)
+            assets = SharedAssets(root, link=link)
+            staged = [assets.share(self.wfk) for i in range(3)]
+            self.assertEqual(set(staged),
+                             {os.path.join(root, "data", "odat_WFK")})
+            self.assertTrue(os.path.samefile(staged[0], self.wfk))
+            self.assertEqual(os.path.islink(staged[0]), link == "symlink")
+            self.assertEqual(assets.report(),
+                             {"assets": 1, "references": 3,
+                              "hardlinks": int(link == "hardlink"),
+                              "symlinks": int(link == "symlink"),
+                              "bytes": 100, "bytes_saved": 200})
+            # staging again (e.g.: in another sweep) reuses the file
+            self.assertEqual(SharedAssets(root, link=link).share(self.wfk),
+                             staged[0])
+
+    def test_changed_source(self):
+        root = os.path.join(self.tempdir.name, "shared")
+        staged = SharedAssets(root).share(self.wfk)
+        # the source is replaced by a new file (e.g.: computed again)
+        os.remove(self.wfk)
+        with open(self.wfk, "w") as f:
+            f.write("y" * 100)
+        self.assertEqual(SharedAssets(root).share(self.wfk), staged)
+        self.assertTrue(os.path.samefile(staged, self.wfk))
+        # a copy with the same content is reused
+        os.remove(self.wfk)
+        with open(self.wfk, "w") as f:
+            f.write("y" * 100)
+        self.assertEqual(SharedAssets(root).share(self.wfk), staged)
+        self.assertFalse(os.path.samefile(staged, self.wfk))
+
+    def test_errors(self):
+        assets = SharedAssets(os.path.join(self.tempdir.name, "shared"))
+        with self.assertRaises(FileNotFoundError):
+            assets.share(self.wfk + "_missing")
+        other = os.path.join(self.tempdir.name, "other")
+        os.mkdir(other)
+        with open(os.path.join(other, "odat_WFK"), "w") as f:
+            f.write("y")
+        assets.share(self.wfk)
+        with self.assertRaises(ValueError):
+            assets.share(os.path.join(other, "odat_WFK"))
+        with self.assertRaises(ValueError):
+            SharedAssets(self.tempdir.name, link="copy")
@@ -0,0 +1,176 @@
+import os
+import stat
+import tempfile
+import unittest
+from abilaunch.scheduler import PBSScheduler, SlurmScheduler
+from abilaunch.submission_controller import SubmissionController
+
+
+# fake PBS server: the jobs are lines 'id state' of a file. qsub refuses
+# scripts containing 'INVALID' and jobs above the site limit of queued or
+# running jobs. 'qstat -u' prints all the jobs.
+FAKE_QSUB = """#!/bin/bash
+touch {jobs}
+if grep -q INVALID "$1"; then
+    echo "qsub: invalid resources" >&2
+    exit 1
+fi
+if [ $(grep -c " [QR]$" {jobs}) -ge {limit} ]; then
+    echo "qsub: would exceed queue limit" >&2
+    exit 1
+fi
+id="$(( $(wc -l < {jobs}) + 1 )).fakeserver"
+echo "$id Q" >> {jobs}
+echo "$id"
+"""
+FAKE_QSTAT = """#!/bin/bash
+echo "fakeserver:"
+echo "Job ID  Username Queue Jobname SessID NDS TSK Memory Time  S Time"
+echo "------- -------- ----- ------- ------ --- --- ------ ----- - ----"
+touch {jobs}
+awk '{{print $1, "user batch name 1234 1 8 -- 01:00:00", $2, "00:10"}}' \\
+    {jobs}
+"""
+
+
+class TestUserJobs(unittest.TestCase):
+    def test_parse_user_status(self):
+        pbs = PBSScheduler()._parse_user_status(
+                "server:\n"
+                "Job ID   Username Queue Jobname SessID NDS TSK Memory "
+                "Time  S Time\n"
+                "-------- -------- ----- ------- ------ --- --- ------ "
+                "----- - ----\n"
+                "12.serv  user     batch scf     5678   1   8   --     "
+                "01:00 R 00:10\n")
+        self.assertEqual(pbs, {"12": "R"})
+        slurm = SlurmScheduler()._parse_user_status("12 PD\n13 R\n")
+        self.assertEqual(slurm, {"12": "PD", "13": "R"})
+
+
+class TestSubmissionController(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.jobs = os.path.join(self.tempdir.name, "jobs")
+        self.scripts = {}
+        for i in range(5):
+            name = "calc%d" % i
+            self.scripts[name] = os.path.join(self.tempdir.name, name + ".sh")
+            with open(self.scripts[name], "w") as f:
+                f.write("#!/bin/bash\n")
+        self.progress = os.path.join(self.tempdir.name, "progress.jsonl")
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+        del self.tempdir
+
+    def _scheduler(self, limit=100):
+        commands = {}
+        for name, content in (("qsub", FAKE_QSUB), ("qstat", FAKE_QSTAT)):
+            path = os.path.join(self.tempdir.name, name)
+            with open(path, "w") as f:
+                f.write(content.format(jobs=self.jobs, limit=limit))
+            os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+            commands[name] = path
+        return PBSScheduler(submit_command=commands["qsub"],
+                            status_command=commands["qstat"])
+
+    def _jobs(self):
+        with open(self.jobs) as f:
+            return [line.split() for line in f]
+
+    def _end_jobs(self, njobs):
+        # the first active jobs are completed
+        jobs = self._jobs()
+        for job in jobs:
+            if njobs and job[1] in ("Q", "R"):
+                job[1] = "C"
+                njobs -= 1
+        with open(self.jobs, "w") as f:
+            f.writelines(" ".join(job) + "\n" for job in jobs)
+
+    def test_throttled(self):
+        controller = SubmissionController(self.scripts, 2,
+                                          scheduler=self._scheduler())
+        self.assertEqual(controller.submit_available(),
+                         {"calc0": "1.fakeserver", "calc1": "2.fakeserver"})
+        # no free slot
+        self.assertEqual(controller.submit_available(), {})
+        self._end_jobs(1)
+        self.assertEqual(list(controller.submit_available()), ["calc2"])
+        self.assertEqual(controller.remaining, ["calc3", "calc4"])
+        self.assertEqual(controller.scheduler.user_jobs(),
+                         {"2": "queued", "3": "queued"})
+
+    def test_resume(self):
+        submitted = []
+        controller = SubmissionController(
+                self.scripts, 2, scheduler=self._scheduler(),
+                progress=self.progress,
+                on_submitted=lambda *args: submitted.append(args))
+        controller.submit_available()
+        self.assertEqual(submitted, [("calc0", "1.fakeserver"),
+                                     ("calc1", "2.fakeserver")])
+        # a new controller (e.g.: after a restart) only submits the others
+        controller = SubmissionController(self.scripts, 10,
+                                          scheduler=self._scheduler(),
+                                          progress=self.progress)
+        self.assertEqual(controller.remaining, ["calc2", "calc3", "calc4"])
+        job_ids = controller.run(poll_interval=0)
+        self.assertTrue(controller.finished)
+        self.assertEqual(len(self._jobs()), 5)
+        self.assertEqual(job_ids["calc0"], "1.fakeserver")
+        self.assertEqual(job_ids["calc4"], "5.fakeserver")
+
+    def test_backpressure(self):
+        # the site limit is reached before max_jobs: refused submissions
+        # are retried
+        controller = SubmissionController(self.scripts, 3,
+                                          scheduler=self._scheduler(limit=1))
+        with self.assertLogs("SubmissionController", level="WARNING"):
+            self.assertEqual(list(controller.submit_available()), ["calc0"])
+        self.assertEqual(len(controller.remaining), 4)
+        self._end_jobs(1)
+        with self.assertLogs("SubmissionController", level="WARNING"):
+            self.assertEqual(list(controller.submit_available()), ["calc1"])
+        self.assertEqual(controller.run(poll_interval=0, timeout=0)["calc1"],
+                         "2.fakeserver")
+        self.assertFalse(controller.finished)
+
+    def test_refused_script(self):
+        with open(self.scripts["calc1"], "a") as f:
+            f.write("#PBS -l INVALID\n")
+        controller = SubmissionController(self.scripts, 10,
+                                          scheduler=self._scheduler(),
+                                          progress=self.progress,
+                                          max_refusals=1)
+        # calc1 is refused while calc2 is not: given up
+        with self.assertLogs("SubmissionController", level="ERROR"):
+            submitted = controller.submit_available()
+        self.assertEqual(list(submitted), ["calc0", "calc2", "calc3",
+                                           "calc4"])
+        self.assertEqual(list(controller.failed), ["calc1"])
+        self.assertIn("invalid resources", controller.failed["calc1"])
+        self.assertTrue(controller.finished)
+        # given up scripts are not submitted again on resume
+        controller = SubmissionController(self.scripts, 10,
+                                          scheduler=self._scheduler(),
+                                          progress=self.progress)
+        self.assertEqual(controller.remaining, [])
+        self.assertEqual(list(controller.failed), ["calc1"])
+        self.assertEqual(len(self._jobs()), 4)
+
+    def test_refused_last_script(self):
+        # no script after calc4 tells whether the scheduler refuses it or
+        # any submission: the refusal is not counted
+        with open(self.scripts["calc4"], "a") as f:
+            f.write("#PBS -l INVALID\n")
+        controller = SubmissionController(self.scripts, 10,
+                                          scheduler=self._scheduler(),
+                                          max_refusals=1)
+        for i in range(2):
+            with self.assertLogs("SubmissionController", level="WARNING"):
+                controller.submit_available()
+            self.assertEqual(controller.remaining, ["calc4"])
+            self.assertEqual(controller.failed, {})
+        self.assertEqual(len(self._jobs()), 4)
@@ -0,0 +1,61 @@
+import os
+import tempfile
+import unittest
+from abilaunch.output_parser import parse_etotal
+from abilaunch.sweep import Axis, Nested, Product, Sweep, Zip
+
+
+class TestSweep(unittest.TestCase):
+    def test_axis(self):
+        sweep = Axis("ngkpt", [[2, 2, 2], [4, 4, 4]], label="k")
+        self.assertEqual(list(sweep), [("k2x2x2", {"ngkpt": [2, 2, 2]}),
+                                       ("k4x4x4", {"ngkpt": [4, 4, 4]})])
+
+    def test_product(self):
+        sweep = Axis("ecut", [10, 20]) * Axis("tsmear", [0.01, 0.02])
+        names = [name for name, _ in sweep]
+        self.assertEqual(names, ["ecut10_tsmear0.01", "ecut10_tsmear0.02",
+                                 "ecut20_tsmear0.01", "ecut20_tsmear0.02"])
+        self.assertEqual(list(sweep)[1][1], {"ecut": 10, "tsmear": 0.02})
+
+    def test_zip(self):
+        sweep = Zip(Axis("ecut", [10, 20]), Axis("pawecutdg", [20, 40]))
+        self.assertEqual(list(sweep),
+                         [("ecut10_pawecutdg20",
+                           {"ecut": 10, "pawecutdg": 20}),
+                          ("ecut20_pawecutdg40",
+                           {"ecut": 20, "pawecutdg": 40})])
+        with self.assertRaises(ValueError):
+            list(Zip(Axis("ecut", [10, 20]), Axis("pawecutdg", [20])))
+
+    def test_nested(self):
+        sweep = Nested(Axis("ecut", [10, 20]),
+                       lambda var: Axis("pawecutdg", [var["ecut"] * 2]))
+        self.assertEqual([name for name, _ in sweep],
+                         ["ecut10_pawecutdg20", "ecut20_pawecutdg40"])
+
+    def test_lazy(self):
+        def values():
+            yield 10
+            raise RuntimeError("should not be reached")
+        sweep = Product(Axis("ngkpt", [[1, 1, 1]]), Axis("ecut", values()))
+        self.assertEqual(next(iter(Axis("ecut", values())))[0], "ecut10")
+        with self.assertRaises(RuntimeError):
+            list(sweep)
+
+    def test_abstract(self):
+        with self.assertRaises(TypeError):
+            Sweep()
+
+
+class TestParseEtotal(unittest.TestCase):
+    def test_parse_etotal(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = os.path.join(tempdir, "run.out")
+            self.assertIsNone(parse_etotal(path))
+            with open(path, "w") as f:
+                f.write(" -outvars: echo values of variables after "
+                        "computation  --------\n"
+                        "            etotal1    -1.1034518296E+00\n"
+                        "            etotal2    -1.1043012345E+00\n")
+            self.assertAlmostEqual(parse_etotal(path), -1.1043012345)
@@ -0,0 +1,101 @@
+import abilaunch
+import json
+import os
+import stat
+import subprocess
+import tempfile
+import unittest
+from abilaunch.local_executor import LocalJob
+from abilaunch.scheduler import PBSScheduler
+from abilaunch.task_farm import TaskFarm, make_bundles, runtime_to_seconds
+
+
+FAKE_QSUB = """#!/bin/bash
+echo "$@" >> {log}
+echo "42.fakeserver"
+"""
+
+
+class TestTaskFarm(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        # fake jobfiles which only create a file in their directory
+        self.jobs = []
+        for i in range(3):
+            calcdir = os.path.join(self.tempdir.name, "calc%d" % i)
+            os.makedirs(calcdir)
+            jobfile = os.path.join(calcdir, "calc%d.sh" % i)
+            with open(jobfile, "w") as f:
+                f.write("#!/bin/bash\ntouch ran\n")
+            self.jobs.append(LocalJob("calc%d" % i, ("bash", jobfile),
+                                      workdir=calcdir, ncores=1 + i % 2))
+        self.submitlog = os.path.join(self.tempdir.name, "submitted")
+        self.qsub = os.path.join(self.tempdir.name, "qsub")
+        with open(self.qsub, "w") as f:
+            f.write(FAKE_QSUB.format(log=self.submitlog))
+        os.chmod(self.qsub, os.stat(self.qsub).st_mode | stat.S_IEXEC)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+        del self.tempdir
+
+    def test_task_farm(self):
+        path = os.path.join(self.tempdir.name, "bundle.sh")
+        farm = TaskFarm(path, self.jobs, 2,
+                        scheduler=PBSScheduler(submit_command=self.qsub),
+                        jobname="bundle", nodes=1, ppn=2, runtime=1)
+        self.assertEqual(farm.submit(), "42.fakeserver")
+        with open(path) as f:
+            script = f.read()
+        self.assertIn("#PBS -l nodes=1:ppn=2", script)
+        self.assertIn("-m abilaunch.task_farm", script)
+        # execute the job script as the scheduler would
+        env = os.environ.copy()
+        env["PYTHONPATH"] = os.path.dirname(os.path.dirname(
+            abilaunch.__file__))
+        subprocess.run(["bash", path], env=env, check=True)
+        for job in self.jobs:
+            self.assertTrue(os.path.exists(os.path.join(job.workdir, "ran")))
+        with open(farm.results_path) as f:
+            results = json.load(f)
+        self.assertEqual([r["name"] for r in results],
+                         ["calc0", "calc1", "calc2"])
+        self.assertTrue(all(r["returncode"] == 0 for r in results))
+
+    def test_too_many_cores(self):
+        with self.assertRaises(ValueError):
+            TaskFarm(os.path.join(self.tempdir.name, "bundle.sh"),
+                     self.jobs, 1)
+        # concurrent jobs are not given a host list
+        with self.assertRaises(ValueError):
+            TaskFarm(os.path.join(self.tempdir.name, "bundle.sh"),
+                     self.jobs, 4, nodes=2, ppn=2)
+
+    def test_make_bundles(self):
+        jobs = [LocalJob("job%d" % i, ("true", ), ncores=1)
+                for i in range(5)]
+        self.assertEqual(make_bundles(jobs, 4, bundle_size=2),
+                         [[0, 1], [2, 3], [4]])
+        # 4 cores during 100s: 400 core-seconds per bundle
+        bundles = make_bundles(jobs, 4, runtimes=[100, 100, 90, 80, 50],
+                               max_runtime=100)
+        self.assertEqual(bundles, [[0, 1, 2, 3], [4]])
+        with self.assertRaises(ValueError):
+            make_bundles(jobs, 4, runtimes=[200] * 5, max_runtime=100)
+        with self.assertRaises(ValueError):
+            make_bundles(jobs, 4)
+        # two 3-core jobs cannot share 4 cores: together they would run
+        # 200s, not 150s
+        jobs = [LocalJob("job%d" % i, ("true", ), ncores=3)
+                for i in range(2)]
+        self.assertEqual(make_bundles(jobs, 4, runtimes=[100, 100],
+                                      max_runtime=150), [[0], [1]])
+        self.assertEqual(make_bundles(jobs, 4, runtimes=[100, 100],
+                                      max_runtime=200), [[0, 1]])
+        with self.assertRaises(ValueError):
+            make_bundles(jobs, 2, runtimes=[100, 100], max_runtime=200)
+
+    def test_runtime_to_seconds(self):
+        self.assertEqual(runtime_to_seconds(2), 7200)
+        self.assertEqual(runtime_to_seconds((1, 30, 0)), 5400)
+        self.assertEqual(runtime_to_seconds("0:10:30"), 630)
@@ -0,0 +1,100 @@
+import os
+import stat
+import tempfile
+import unittest
+from abilaunch.scheduler import PBSScheduler, Scheduler, SlurmScheduler
+from abilaunch.workflow import Workflow
+from .test_launcher import Hpseudo, tbase1_1_vars
+
+
+# fake qsub logging its arguments and returning increasing job ids
+FAKE_QSUB = """#!/bin/bash
+echo "$@" >> {log}
+echo "$(wc -l < {log}).fakeserver"
+"""
+
+
+class TestDependencies(unittest.TestCase):
+    def test_dependency_options(self):
+        self.assertEqual(PBSScheduler().dependency_options(["1.a", "2.a"]),
+                         ["-W", "depend=afterok:1.a:2.a"])
+        self.assertEqual(SlurmScheduler().dependency_options(["3", None]),
+                         ["--dependency=afterok:3"])
+        self.assertEqual(SlurmScheduler().dependency_options([None]), [])
+
+    def test_abstract_scheduler(self):
+        with self.assertRaises(TypeError):
+            Scheduler()
+
+
+class TestWorkflowOrder(unittest.TestCase):
+    def setUp(self):
+        self.workflow = Workflow("workflow")
+
+    def test_order(self):
+        self.workflow.add_step("bands", {}, links={"nscf": "WFK"},
+                               depends_on="scf")
+        self.workflow.add_step("scf", {})
+        self.workflow.add_step("nscf", {}, links={"scf": ["DEN"]})
+        self.assertEqual(self.workflow.order(), ["scf", "nscf", "bands"])
+        self.assertEqual(self.workflow.parents("bands"), ["nscf", "scf"])
+
+    def test_errors(self):
+        self.workflow.add_step("scf", {})
+        with self.assertRaises(ValueError):
+            self.workflow.add_step("scf", {})
+        self.workflow.add_step("nscf", {}, links={"missing": "DEN"})
+        with self.assertRaises(ValueError):
+            self.workflow.order()
+
+    def test_cycle(self):
+        self.workflow.add_step("a", {}, depends_on="b")
+        self.workflow.add_step("b", {}, depends_on="a")
+        with self.assertRaises(ValueError):
+            self.workflow.order()
+
+
+class TestWorkflow(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.submitlog = os.path.join(self.tempdir.name, "submitted")
+        qsub = os.path.join(self.tempdir.name, "qsub")
+        with open(qsub, "w") as f:
+            f.write(FAKE_QSUB.format(log=self.submitlog))
+        os.chmod(qsub, os.stat(qsub).st_mode | stat.S_IEXEC)
+        self.scheduler = PBSScheduler(submit_command=qsub)
+        self.workflow = Workflow(self.tempdir.name, pseudos=Hpseudo)
+        self.workflow.add_step("scf", tbase1_1_vars)
+        nscf_vars = tbase1_1_vars.copy()
+        nscf_vars.update({"iscf": -2, "tolwfr": 1e-10})
+        del nscf_vars["toldfe"]
+        self.workflow.add_step("nscf", nscf_vars, links={"scf": "DEN"})
+        self.workflow.add_step("dos", nscf_vars, links={"scf": "DEN"},
+                               depends_on="nscf")
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+        del self.tempdir
+
+    def test_build(self):
+        launchers = self.workflow.build()
+        self.assertEqual(list(launchers), ["scf", "nscf", "dos"])
+        # the link to the (not yet computed) density of the scf step
+        link = launchers["nscf"]._abilauncher.get_idat("DEN")
+        self.assertTrue(os.path.islink(link))
+        self.assertEqual(os.path.realpath(link),
+                         os.path.realpath(launchers["scf"].odat_path("DEN")))
+
+    def test_submit(self):
+        job_ids = self.workflow.submit(self.scheduler)
+        self.assertEqual(job_ids, {"scf": "1.fakeserver",
+                                   "nscf": "2.fakeserver",
+                                   "dos": "3.fakeserver"})
+        with open(self.submitlog) as f:
+            submitted = [line.split() for line in f]
+        self.assertEqual(submitted[0],
+                         [self.workflow.launchers["scf"].jobfile_path])
+        self.assertEqual(submitted[1][:2],
+                         ["-W", "depend=afterok:1.fakeserver"])
+        self.assertEqual(submitted[2][:2],
+                         ["-W", "depend=afterok:1.fakeserver:2.fakeserver"])
@@ -0,0 +1,172 @@
+from .base import BaseUtility
+from .launcher import Launcher
+from .output_parser import is_completed
+from .scheduler import get_scheduler
+import logging
+import os
+
+
+# Workflows of dependent calculations (e.g.: SCF -> NSCF -> bands). All the
+# steps are written up front, each step linking the output data files of
+# its parents, and are submitted at once with scheduler dependencies such
+# that each step starts as soon as its parents succeeded:
+#
+#   workflow = Workflow("~/si", pseudos="Si.psp8")
+#   workflow.add_step("scf", scf_variables)
+#   workflow.add_step("nscf", nscf_variables, links={"scf": "DEN"})
+#   workflow.add_step("bands", bands_variables, links={"scf": "DEN"})
+#   workflow.submit()
+
+
+class Workflow(BaseUtility):
+    """Class that writes and submits a directed acyclic graph of
+    calculations. Each step is a Launcher written in its own directory
+    (workdir/name). A step starts only once all its parents ended
+    successfully (afterok dependencies when submitted).
+    """
+    _loggername = "Workflow"
+
+    def __init__(self, workdir, pseudos=None, loglevel=logging.INFO,
+                 **kwargs):
+        """
+        Parameters
+        ----------
+        workdir : str
+                  The directory where the steps are written.
+        pseudos : list, str, optional
+                  The pseudos used by the steps which do not give theirs.
+        kwargs : other arguments given to the Launcher of each step
+                 (unless overridden by the step).
+        """
+        super().__init__(loglevel=loglevel)
+        self.workdir = os.path.abspath(os.path.expanduser(workdir))
+        self.pseudos = pseudos
+        self.kwargs = kwargs
+        # name: step parameters (in insertion order)
+        self._steps = {}
+        # name: Launcher once built
+        self.launchers = {}
+
+    def __len__(self):
+        return len(self._steps)
+
+    def add_step(self, name, abinit_variables, links=None, depends_on=None,
+                 pseudos=None, **kwargs):
+        """Add a step to the workflow.
+
+        Parameters
+        ----------
+        name : str
+               The name of the step (and of its directory).
+        abinit_variables : dict
+                           The abinit variables of the step.
+        links : dict, optional
+                The output data files of the parents linked by this step:
+                {parent: datatypes}. Each datatype is a string (e.g.:
+                'DEN') or a (datatype, dtset) tuple.
+        depends_on : list, str, optional
+                     Other parents of this step whose files are not linked.
+        pseudos : list, str, optional
+                  The pseudos of the step. By default, those of the
+                  workflow.
+        kwargs : other arguments given to the Launcher of the step.
+        """
+        if name in self._steps:
+            raise ValueError(f"Step {name} already exists.")
+        if self.launchers:
+            raise ValueError("Steps cannot be added once built.")
+        links = {parent: _datatypes(datatypes)
+                 for parent, datatypes in (links or {}).items()}
+        if isinstance(depends_on, str):
+            depends_on = (depends_on, )
+        parents = list(links)
+        parents += [p for p in depends_on or () if p not in links]
+        self._steps[name] = {"abinit_variables": abinit_variables,
+                             "links": links, "parents": parents,
+                             "pseudos": pseudos, "kwargs": kwargs}
+
+    def parents(self, name):
+        """Return the names of the parents of a step."""
+        return list(self._steps[name]["parents"])
+
+    def order(self):
+        """Return the step names such that each step comes after its
+        parents (insertion order is kept otherwise).
+        """
+        for name, step in self._steps.items():
+            for parent in step["parents"]:
+                if parent not in self._steps:
+                    raise ValueError(f"Step {name} depends on unknown step"
+                                     f" {parent}.")
+        remaining = {name: set(step["parents"])
+                     for name, step in self._steps.items()}
+        order = []
+        while remaining:
+            ready = [name for name, parents in remaining.items()
+                     if not parents]
+            if not ready:
+                raise ValueError("Dependency cycle between steps: %s." %
+                                 ", ".join(remaining))
+            for name in ready:
+                del remaining[name]
+                for parents in remaining.values():
+                    parents.discard(name)
+            order += ready
+        return order
+
+    def build(self):
+        """Write all the steps. Returns the dict name: Launcher."""
+        if self.launchers:
+            return self.launchers
+        for name in self.order():
+            step = self._steps[name]
+            to_link = [self.launchers[parent].odat_path(datatype, dtset)
+                       for parent, datatypes in step["links"].items()
+                       for datatype, dtset in datatypes]
+            kwargs = self.kwargs.copy()
+            kwargs.update(step["kwargs"])
+            pseudos = step["pseudos"]
+            self.launchers[name] = Launcher(
+                    os.path.join(self.workdir, name),
+                    pseudos=self.pseudos if pseudos is None else pseudos,
+                    input_name=name,
+                    abinit_variables=step["abinit_variables"],
+                    to_link=to_link, allow_missing_links=True,
+                    loglevel=self._logger.level, **kwargs)
+        self._logger.debug(f"{len(self)} steps written in {self.workdir}.")
+        return self.launchers
+
+    def submit(self, scheduler=None):
+        """Write and submit all the steps, each one depending on its
+        parents. Returns the dict name: job id (None for steps restored
+        from the result cache).
+        """
+        scheduler = get_scheduler(scheduler)
+        launchers = self.build()
+        job_ids = {}
+        for name in self.order():
+            after = [job_ids[parent] for parent in self.parents(name)]
+            job_ids[name] = launchers[name].submit(scheduler, after=after)
+        self._logger.info(f"Workflow {self.workdir} submitted.")
+        return job_ids
+
+    def run(self):
+        """Write and run all the steps locally, one after the other. A
+        RuntimeError is raised if a step does not complete.
+        """
+        launchers = self.build()
+        for name in self.order():
+            launcher = launchers[name]
+            launcher.run(submit=False)
+            if not is_completed(launcher.output_path):
+                raise RuntimeError(f"Step {name} did not complete, see"
+                                   f" {launcher.output_path}.")
+
+
+def _datatypes(datatypes):
+    # list of (datatype, dtset)
+    if isinstance(datatypes, str) or (
+            isinstance(datatypes, tuple) and len(datatypes) == 2 and
+            isinstance(datatypes[1], int)):
+        datatypes = (datatypes, )
+    return [(d, 0) if isinstance(d, str) else tuple(d) for d in datatypes]
@@ -0,0 +1,264 @@
+"""Scalability benchmarks of the generation and submission of calculations.
+
+Each case writes and submits N calculations using a fake abinit executable
+and a fake qsub, in a fresh subprocess, and measures:
+
+- the wall time (imports excluded);
+- the peak resident memory of the process;
+- the memory per calculation: the resident memory still used once all the
+  calculations are submitted (imports excluded), divided by N;
+- the number of filesystem operations done from python (open, mkdir,
+  link, remove, listdir...), counted with an audit hook;
+- the number of read and write syscalls (from /proc/self/io, linux only);
+- the number of subprocesses spawned (e.g.: qsub calls).
+
+Results are appended to a JSON lines file along with the git commit such
+that they can be compared across commits:
+
+  $ python benchmarks/benchmark.py --sizes 1 100
+  $ python benchmarks/benchmark.py --compare 1b557fd
+"""
+from timeit import default_timer as timer
+import argparse
+import contextlib
+import datetime
+import json
+import logging
+import os
+import resource
+import shutil
+import stat
+import subprocess
+import sys
+import tempfile
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FILES = os.path.join(HERE, "..", "abilaunch", "unittests", "files")
+PSEUDO = os.path.join(FILES, "01h.pspgth")
+INPUT = os.path.join(FILES, "tbase1_1.in")
+CASES = ("launcher", "from_files", "from_inplace_input", "from_glob",
+         "mass_launcher", "compact_mass_launcher")
+SIZES = (1, 100, 1000, 10000)
+RESULTS = os.path.join(HERE, "results.jsonl")
+VARIABLES = {"acell": (10, 10, 10), "ntypat": 1, "znucl": 1, "natom": 2,
+             "typat": (1, 1), "xcart": ((-0.7, 0.0, 0.0), (0.7, 0.0, 0.0)),
+             "ecut": 10.0, "kptopt": 0, "nkpt": 1, "nstep": 10,
+             "toldfe": 1.0e-6, "diemac": 2.0, "optforces": 1}
+# abinit reads the files file from stdin: 1st line is the input, 2nd the
+# output
+FAKE_ABINIT = """#!/bin/bash
+read input
+read output
+echo " Calculation completed." > "$output"
+"""
+FAKE_QSUB = """#!/bin/bash
+echo "$$.fakeserver"
+"""
+# audit events of filesystem operations
+FS_EVENTS = {"open", "os.listdir", "os.scandir", "os.mkdir", "os.remove",
+             "os.rmdir", "os.rename", "os.symlink", "os.link", "os.chmod",
+             "os.truncate", "os.utime", "shutil.copyfile", "shutil.copymode",
+             "shutil.copystat", "shutil.copytree", "shutil.rmtree"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cases", nargs="+", default=CASES, choices=CASES)
+    parser.add_argument("--sizes", nargs="+", type=int, default=SIZES)
+    parser.add_argument("--output", default=RESULTS,
+                        help="JSON lines file where results are appended.")
+    parser.add_argument("--compare", metavar="COMMIT",
+                        help="Compare the results of the current commit "
+                             "to those of another one instead of running.")
+    parser.add_argument("--worker", nargs=3,
+                        metavar=("CASE", "SIZE", "ROOT"),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker is not None:
+        case, size, root = args.worker
+        print(json.dumps(run_case(case, int(size), root)))
+    elif args.compare is not None:
+        compare(args.output, args.compare, git_commit())
+    else:
+        run_all(args.cases, args.sizes, args.output)
+
+
+def run_all(cases, sizes, output):
+    commit = git_commit()
+    date = datetime.datetime.now().isoformat(timespec="seconds")
+    for case in cases:
+        for size in sizes:
+            with tempfile.TemporaryDirectory() as root:
+                process = subprocess.run(
+                        [sys.executable, os.path.abspath(__file__),
+                         "--worker", case, str(size), root],
+                        stdout=subprocess.PIPE, check=True)
+            result = json.loads(process.stdout.decode().splitlines()[-1])
+            result.update({"commit": commit, "date": date,
+                           "python": sys.version.split()[0]})
+            print(f"{case:>21} {size:>6}: {result['wall_time']:9.3f}s "
+                  f"{result['peak_rss_kb'] / 1024:8.1f}MB "
+                  f"{result.get('kb_per_calc', float('nan')):8.1f}kB/calc "
+                  f"{result['fs_calls']:>9} fs calls")
+            with open(output, "a") as f:
+                f.write(json.dumps(result) + "\n")
+
+
+def compare(output, reference, commit):
+    # last result of each (case, size) for both commits
+    results = {reference: {}, commit: {}}
+    with open(output) as f:
+        for line in f:
+            result = json.loads(line)
+            if result["commit"] in results:
+                key = (result["case"], result["size"])
+                results[result["commit"]][key] = result
+    print(f"{'case':>21} {'size':>6} {'wall time':>10} {'peak rss':>10}"
+          f" {'fs calls':>10}  ({commit} / {reference})")
+    for key in sorted(results[commit]):
+        if key not in results[reference]:
+            continue
+        new, old = results[commit][key], results[reference][key]
+        ratios = [_ratio(new[name], old[name])
+                  for name in ("wall_time", "peak_rss_kb", "fs_calls")]
+        print(f"{key[0]:>21} {key[1]:>6} " +
+              " ".join(f"{ratio:>9.2f}x" for ratio in ratios))
+
+
+def run_case(case, size, root):
+    # executed in a fresh process such that the peak memory is its own
+    bindir = os.path.join(root, "bin")
+    os.mkdir(bindir)
+    abinit = _script(os.path.join(bindir, "abinit"), FAKE_ABINIT)
+    qsub = _script(os.path.join(bindir, "qsub"), FAKE_QSUB)
+    calcdir = os.path.join(root, "calcs")
+    os.mkdir(calcdir)
+    # benchmark the checkout containing this script, then import
+    # everything before timing
+    sys.path.insert(0, os.path.dirname(HERE))
+    import abilaunch
+    from abilaunch.scheduler import PBSScheduler
+    import abipy.htc.launcher  # noqa
+    scheduler = PBSScheduler(submit_command=qsub)
+    inputs = _prepare(case, size, calcdir)
+    counts = {"fs_calls": 0, "processes": 0}
+
+    def audit(event, args):
+        if event in FS_EVENTS:
+            counts["fs_calls"] += 1
+        elif event == "subprocess.Popen":
+            counts["processes"] += 1
+
+    io_start = _io_syscalls()
+    rss_start = _rss_kb()
+    sys.addaudithook(audit)
+    kwargs = {"abinit_path": abinit, "loglevel": logging.WARNING}
+    start = timer()
+    # abipy prints each file it writes
+    with open(os.devnull, "w") as devnull, \
+            contextlib.redirect_stdout(devnull):
+        if case in ("mass_launcher", "compact_mass_launcher"):
+            ml = abilaunch.MassLauncher(calcdir, PSEUDO, inputs, VARIABLES,
+                                        [{"ecut": 10 + i % 10}
+                                         for i in range(size)],
+                                        compact=case.startswith("compact"),
+                                        **kwargs)
+            ml.submit(scheduler)
+        elif case == "from_glob":
+            for launcher in abilaunch.Launcher.from_glob(
+                    os.path.join(calcdir, "*", "*.in"), PSEUDO, **kwargs):
+                launcher.submit(scheduler)
+        bulk = ("mass_launcher", "compact_mass_launcher", "from_glob")
+        for i, name in enumerate(inputs if case not in bulk else ()):
+            workdir = os.path.join(calcdir, "calc%d" % i)
+            if case == "launcher":
+                variables = dict(VARIABLES, ecut=10 + i % 10)
+                launcher = abilaunch.Launcher(workdir, PSEUDO,
+                                              abinit_variables=variables,
+                                              **kwargs)
+            elif case == "from_files":
+                launcher = abilaunch.Launcher.from_files(name, workdir,
+                                                         PSEUDO, **kwargs)
+            else:
+                launcher = abilaunch.Launcher.from_inplace_input(
+                        name, workdir, PSEUDO, **kwargs)
+            launcher.submit(scheduler)
+    wall_time = timer() - start
+    io_end = _io_syscalls()
+    rss_end = _rss_kb()
+    result = {"case": case, "size": size, "wall_time": wall_time,
+              "peak_rss_kb":
+                  resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+    result.update(counts)
+    if io_start is not None and io_end is not None:
+        result["read_syscalls"] = io_end[0] - io_start[0]
+        result["write_syscalls"] = io_end[1] - io_start[1]
+    if rss_start is not None and rss_end is not None:
+        result["kb_per_calc"] = (rss_end - rss_start) / size
+    return result
+
+
+def _prepare(case, size, calcdir):
+    # returns the input names or the input files to use
+    if case in ("launcher", "mass_launcher", "compact_mass_launcher"):
+        return ["calc%d" % i for i in range(size)]
+    paths = []
+    for i in range(size):
+        if case == "from_files":
+            path = os.path.join(os.path.dirname(calcdir),
+                                "inputs", "calc%d.in" % i)
+        else:
+            path = os.path.join(calcdir, "calc%d" % i, "calc%d.in" % i)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copy(INPUT, path)
+        paths.append(path)
+    return paths
+
+
+def _script(path, content):
+    with open(path, "w") as f:
+        f.write(content)
+    os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+    return path
+
+
+def _io_syscalls():
+    # (read, write) syscalls of this process
+    try:
+        with open("/proc/self/io") as f:
+            io = dict(line.split(": ") for line in f.read().splitlines())
+    except OSError:
+        return None
+    return int(io["syscr"]), int(io["syscw"])
+
+
+def _rss_kb():
+    # current resident memory of this process (linux only)
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except OSError:
+        return None
+    return pages * resource.getpagesize() / 1024
+
+
+def _ratio(new, old):
+    return new / old if old else float("nan")
+
+
+def git_commit():
+    try:
+        commit = subprocess.check_output(
+                ["git", "rev-parse", "--short", "HEAD"], cwd=HERE,
+                stderr=subprocess.DEVNULL).decode().strip()
+        dirty = subprocess.check_output(
+                ["git", "status", "--porcelain", "--untracked-files=no"],
+                cwd=HERE).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return commit + "-dirty" if dirty else commit
+
+
+if __name__ == "__main__":
+    main()
@@ -40,7 +40,9 @@ if not os.path.isfile(CONFIG_PATH):
     # assume it is in the PATH variable
     config["DEFAULT"] = {"abinit_path": "abinit",
                          "default_pseudos_dir": "none",
-                         "qsub": "False"}
+                         "pseudos_index": "none",
+                         "qsub": "False",
+                         "scheduler": "pbs"}
     # write file
     with open(CONFIG_PATH, "w") as f:
         config.write(f)